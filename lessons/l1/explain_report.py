@@ -0,0 +1,349 @@
+#!/usr/bin/env python3
+# explain_report.py
+# Offline reader for the EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) files that
+# compare_perf_json.sh and query_bench.py --plans write to results/. For each plan: per-node
+# self time, rows and buffers, the hot node, chunk exclusion on hypertables, sequential scans,
+# sorts that spill to disk and row misestimates; then the same query side by side across the
+# narrow (sensor_readings), plain (sensor_plain) and wide (sensor_wide) layouts.
+#
+#   python3 explain_report.py                        # every results/*.json
+#   python3 explain_report.py results/range_1h_*.json --nodes 5
+#   python3 explain_report.py --json report.json
+
+import argparse
+import glob
+import json
+import os
+import re
+import sys
+
+LAYOUTS = {"sensor_readings": "narrow", "sensor_plain": "plain", "sensor_wide": "wide"}
+CHUNK_RE = re.compile(r"^_hyper_(\d+)_\d+_chunk$")
+BUFFER_KEYS = {
+    "shared_hit": "Shared Hit Blocks",
+    "shared_read": "Shared Read Blocks",
+    "temp_read": "Temp Read Blocks",
+    "temp_written": "Temp Written Blocks",
+}
+SEQ_SCAN_MIN_ROWS = 10000
+MISESTIMATE_FACTOR = 10
+MISESTIMATE_MIN_ROWS = 100
+
+
+def parse_args():
+    p = argparse.ArgumentParser()
+    p.add_argument("paths", nargs="*", help="plan files (default: results/*.json next to this script)")
+    p.add_argument("--nodes", type=int, default=3, help="slowest nodes listed per plan")
+    p.add_argument("--seq-min-rows", type=int, default=SEQ_SCAN_MIN_ROWS, help="smaller seq scans are not flagged")
+    p.add_argument(
+        "--misestimate", type=float, default=MISESTIMATE_FACTOR, help="flag row estimates off by this factor or more"
+    )
+    p.add_argument("--json", metavar="PATH", help="also write the full report as JSON")
+    return p.parse_args()
+
+
+def load_plan(path):
+    """The top-level object of a saved plan (psql -A -t output or query_bench.py --plans)"""
+    with open(path) as f:
+        data = json.load(f)
+    if isinstance(data, list):
+        data = data[0]
+    if "Plan" not in data:
+        raise ValueError(f"{path}: not an EXPLAIN (FORMAT JSON) plan")
+    if "Actual Total Time" not in data["Plan"] and "Actual Loops" not in data["Plan"]:
+        raise ValueError(f"{path}: plan was not run with ANALYZE")
+    return data
+
+
+def label(node):
+    name = node["Node Type"]
+    if node.get("Custom Plan Provider"):
+        name = f"{name} ({node['Custom Plan Provider']})"
+    if node.get("Relation Name"):
+        name += f" on {node['Relation Name']}"
+    elif node.get("Index Name"):
+        name += f" using {node['Index Name']}"
+    return name
+
+
+def inclusive_ms(node, workers):
+    # Actual Total Time is the per-loop average; loops run in parallel workers overlap in time
+    return node.get("Actual Total Time", 0.0) * node.get("Actual Loops", 0) / workers
+
+
+def flatten(node, depth=0, workers=1, out=None, bounded=False):
+    """Depth-first list of nodes with self time, total rows and self buffers.
+
+    Buffer counters are inclusive of children (and summed over parallel workers), so a
+    node's own share is its counter minus its children's. ``bounded`` marks nodes below a
+    Limit or SkipScan, which stop their input early and so return fewer rows than estimated.
+    """
+    if out is None:
+        out = []
+    children = node.get("Plans", [])
+    child_workers = workers
+    if node["Node Type"] in ("Gather", "Gather Merge"):
+        child_workers = node.get("Workers Launched", 0) + 1
+    child_bounded = bounded or node["Node Type"] == "Limit" or node.get("Custom Plan Provider") == "SkipScan"
+
+    total = inclusive_ms(node, workers)
+    self_ms = total - sum(inclusive_ms(c, child_workers) for c in children)
+    entry = {
+        "depth": depth,
+        "label": label(node),
+        "node_type": node["Node Type"],
+        "relation": node.get("Relation Name"),
+        "total_ms": round(total, 3),
+        "self_ms": round(max(self_ms, 0.0), 3),
+        "rows": round(node.get("Actual Rows", 0) * node.get("Actual Loops", 0)),
+        "loops": node.get("Actual Loops", 0),
+        "plan_rows": node.get("Plan Rows", 0),
+        "bounded": bounded,
+        "rows_removed": round(
+            (node.get("Rows Removed by Filter", 0) + node.get("Rows Removed by Index Recheck", 0))
+            * node.get("Actual Loops", 0)
+        ),
+    }
+    for key, field in BUFFER_KEYS.items():
+        own = node.get(field, 0) - sum(c.get(field, 0) for c in children)
+        entry[key] = max(own, 0)
+    entry["node"] = node
+    out.append(entry)
+
+    for child in children:
+        flatten(child, depth + 1, child_workers, out, child_bounded)
+    return out
+
+
+def chunk_exclusion(nodes):
+    """Chunks each hypertable's scans touched versus chunks that returned anything.
+
+    A chunk that was scanned (loops > 0) but produced no rows held nothing the query needed:
+    the time predicate didn't let the planner or executor exclude it. Chunks that were planned
+    but never executed (ChunkAppend stopping early under a LIMIT) count as excluded.
+    """
+    hypertables = {}
+    for n in nodes:
+        node = n["node"]
+        parent = node.get("Relation Name")
+        if node.get("Custom Plan Provider") == "ChunkAppend" and parent:
+            h = hypertables.setdefault(parent, {"chunks": {}, "excluded_startup": 0, "excluded_runtime": 0})
+            h["excluded_startup"] += node.get("Chunks excluded during startup", 0)
+            h["excluded_runtime"] += node.get("Chunks excluded during runtime", 0)
+
+    by_id = {}
+    for n in nodes:
+        match = CHUNK_RE.match(n["relation"] or "")
+        if not match:
+            continue
+        chunk = by_id.setdefault(match.group(1), {}).setdefault(n["relation"], {"loops": 0, "rows": 0})
+        chunk["loops"] = max(chunk["loops"], n["loops"])
+        chunk["rows"] = max(chunk["rows"], n["rows"])
+
+    # Chunk names only carry the hypertable id; match them to a ChunkAppend parent when there
+    # is exactly one, otherwise report them under the id
+    parents = list(hypertables)
+    for hyper_id, chunks in by_id.items():
+        name = parents[0] if len(parents) == 1 and len(by_id) == 1 else f"hypertable {hyper_id}"
+        hypertables.setdefault(name, {"chunks": {}, "excluded_startup": 0, "excluded_runtime": 0})
+        hypertables[name]["chunks"].update(chunks)
+
+    result = {}
+    for name, h in hypertables.items():
+        planned = len(h["chunks"])
+        scanned = sum(1 for c in h["chunks"].values() if c["loops"] > 0)
+        needed = sum(1 for c in h["chunks"].values() if c["rows"] > 0)
+        result[name] = {
+            "planned": planned,
+            "scanned": scanned,
+            "needed": needed,
+            "excluded_startup": h["excluded_startup"],
+            "excluded_runtime": h["excluded_runtime"],
+            "missing_exclusion": scanned > needed,
+        }
+    return result
+
+
+def findings(nodes, seq_min_rows, misestimate_factor=MISESTIMATE_FACTOR):
+    found = []
+    for n in nodes:
+        node = n["node"]
+        if n["loops"]:
+            # Both counts are per loop; an early-stopped input returning less is not a misestimate
+            estimated, actual = n["plan_rows"], node.get("Actual Rows", 0)
+            high, low = max(estimated, actual), max(min(estimated, actual), 1)
+            if (
+                high >= MISESTIMATE_MIN_ROWS
+                and high / low >= misestimate_factor
+                and not (n["bounded"] and actual < estimated)
+            ):
+                found.append(
+                    {
+                        "kind": "misestimate",
+                        "node": n["label"],
+                        "detail": f"estimated {estimated} rows, got {actual} ({high / low:.0f}x "
+                        f"{'over' if estimated > actual else 'under'})",
+                    }
+                )
+        if n["node_type"] == "Seq Scan" and n["rows"] + n["rows_removed"] >= seq_min_rows:
+            read = n["rows"] + n["rows_removed"]
+            found.append(
+                {
+                    "kind": "seq_scan",
+                    "node": n["label"],
+                    "detail": f"read {read} rows, kept {n['rows']} ({n['rows'] / read:.1%}), {n['self_ms']:.2f} ms self",
+                }
+            )
+        if n["node_type"] in ("Sort", "Incremental Sort"):
+            method = node.get("Sort Method", "")
+            if node.get("Sort Space Type") == "Disk" or "external" in method:
+                found.append(
+                    {
+                        "kind": "sort_spill",
+                        "node": n["label"],
+                        "detail": f"{method or 'sort'} used {node.get('Sort Space Used', '?')} kB on disk",
+                    }
+                )
+                continue
+        if n["temp_written"]:
+            found.append(
+                {
+                    "kind": "spill",
+                    "node": n["label"],
+                    "detail": f"wrote {n['temp_written']} temp blocks",
+                }
+            )
+    return found
+
+
+def analyze(path, seq_min_rows=SEQ_SCAN_MIN_ROWS, misestimate_factor=MISESTIMATE_FACTOR):
+    top = load_plan(path)
+    nodes = flatten(top["Plan"])
+    root = top["Plan"]
+    hot = max(nodes, key=lambda n: n["self_ms"])
+    exclusion = chunk_exclusion(nodes)
+    issues = findings(nodes, seq_min_rows, misestimate_factor)
+    for name, ex in exclusion.items():
+        if ex["missing_exclusion"]:
+            issues.append(
+                {
+                    "kind": "chunk_exclusion",
+                    "node": name,
+                    "detail": f"scanned {ex['scanned']} chunks, {ex['needed']} returned rows",
+                }
+            )
+    return {
+        "file": os.path.basename(path),
+        "execution_ms": top.get("Execution Time"),
+        "planning_ms": top.get("Planning Time"),
+        "planning_hit": top.get("Planning", {}).get("Shared Hit Blocks", 0),
+        "planning_read": top.get("Planning", {}).get("Shared Read Blocks", 0),
+        "rows": nodes[0]["rows"],
+        **{key: root.get(field, 0) for key, field in BUFFER_KEYS.items()},
+        "hot_node": {k: hot[k] for k in ("label", "self_ms", "rows")},
+        "nodes": [{k: v for k, v in n.items() if k != "node"} for n in nodes],
+        "chunks": exclusion,
+        "findings": issues,
+    }
+
+
+def layout_of(filename):
+    """(query key, layout) from a results/ file name, e.g. range_1h_{table}_cpu_device1"""
+    stem = os.path.splitext(filename)[0]
+    for table, layout in LAYOUTS.items():
+        if table in stem:
+            return stem.replace(table, "{table}"), layout
+    return stem, None
+
+
+def fmt_ms(value):
+    # EXPLAIN (ANALYZE, SUMMARY OFF) leaves out Execution Time and Planning Time
+    return "n/a" if value is None else f"{value:.3f}"
+
+
+def print_plan(a, count):
+    print(f"\n=== {a['file']} ===")
+    print(
+        f"  execution {fmt_ms(a['execution_ms'])} ms, planning {fmt_ms(a['planning_ms'])} ms | "
+        f"rows {a['rows']} | buffers hit {a['shared_hit']} read {a['shared_read']} "
+        f"temp {a['temp_read'] + a['temp_written']}"
+    )
+    total = a["execution_ms"] or 0.0
+    slowest = sorted(a["nodes"], key=lambda n: n["self_ms"], reverse=True)[:count]
+    for n in slowest:
+        share = n["self_ms"] / total if total else 0.0
+        print(
+            f"  {n['self_ms']:>9.3f} ms {share:>6.1%}  rows {n['rows']:>8}  "
+            f"hit {n['shared_hit']:>6} read {n['shared_read']:>6}  {'  ' * n['depth']}{n['label']}"
+        )
+    for name, ex in a["chunks"].items():
+        print(
+            f"  chunks on {name}: {ex['scanned']}/{ex['planned']} scanned, {ex['needed']} needed, "
+            f"excluded at startup {ex['excluded_startup']}, at runtime {ex['excluded_runtime']}"
+        )
+    for f in a["findings"]:
+        print(f"  ❌ {f['kind']}: {f['node']} - {f['detail']}")
+
+
+def print_comparison(reports):
+    groups = {}
+    for a in reports:
+        query, layout = layout_of(a["file"])
+        if layout:
+            groups.setdefault(query, {})[layout] = a
+
+    layouts = list(LAYOUTS.values())
+    rows = [
+        ("execution ms", lambda a: fmt_ms(a["execution_ms"])),
+        ("planning ms", lambda a: fmt_ms(a["planning_ms"])),
+        ("rows", lambda a: str(a["rows"])),
+        ("shared hit", lambda a: str(a["shared_hit"])),
+        ("shared read", lambda a: str(a["shared_read"])),
+        ("temp blocks", lambda a: str(a["temp_read"] + a["temp_written"])),
+        ("hot node", lambda a: a["hot_node"]["label"].split(" on ")[0]),
+        ("hot self ms", lambda a: f"{a['hot_node']['self_ms']:.3f}"),
+        (
+            "chunks scanned",
+            lambda a: ", ".join(f"{c['scanned']}/{c['needed']}" for c in a["chunks"].values()) or "-",
+        ),
+        ("findings", lambda a: ", ".join(sorted({f["kind"] for f in a["findings"]})) or "-"),
+    ]
+    for query, by_layout in sorted(groups.items()):
+        if len(by_layout) < 2:
+            continue
+        print(f"\n=== {query} ===")
+        print(f"  {'':<15}" + "".join(f"{layout:>24}" for layout in layouts))
+        for name, value in rows:
+            cells = [value(by_layout[layout]) if layout in by_layout else "-" for layout in layouts]
+            print(f"  {name:<15}" + "".join(f"{cell[:23]:>24}" for cell in cells))
+        timed = {k: v["execution_ms"] for k, v in by_layout.items() if v["execution_ms"] is not None}
+        print(f"  fastest: {min(timed, key=timed.get) if timed else 'n/a'}")
+
+
+def main():
+    args = parse_args()
+    paths = args.paths or sorted(glob.glob(os.path.join(os.path.dirname(os.path.abspath(__file__)), "results", "*.json")))
+    if not paths:
+        print("No plan files found")
+        return 1
+
+    reports = []
+    for path in paths:
+        try:
+            reports.append(analyze(path, args.seq_min_rows, args.misestimate))
+        except (ValueError, KeyError, IndexError, OSError) as e:
+            print(f"❌ Skipping {path}: {e}")
+
+    for a in reports:
+        print_plan(a, args.nodes)
+    print_comparison(reports)
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(reports, f, indent=2)
+        print(f"\nSaved: {args.json}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,335 @@
+#!/usr/bin/env python3
+# query_bench.py
+# Repeatable version of compare_perf_json.sh: the same range / aggregate / latest-per-device
+# queries against sensor_readings (hypertable), sensor_plain and sensor_wide, run N times
+# with cold-cache and warm-cache runs kept apart. Each run is an
+# EXPLAIN (ANALYZE, BUFFERS, TIMING OFF, FORMAT JSON), so server execution time and buffer
+# hits/reads come from Postgres itself; client round-trip time is recorded alongside.
+#
+#   python3 query_bench.py --iterations 20
+#   python3 query_bench.py --save-baseline            # after a known-good run
+#   python3 query_bench.py --threshold 0.15           # exits 1 if anything regressed
+#   python3 query_bench.py --cold-runs 3              # also measure cold-cache runs
+#
+# Cold runs are opt-in: each one calls --cold-cmd first (default: restart the container,
+# which empties shared_buffers but not the host page cache; point it at a script that also
+# drops /proc/sys/vm/drop_caches for truly cold reads). That is one restart per run and per
+# query/table pair, so only ask for them on a server nobody else is using.
+
+import argparse
+import json
+import math
+import os
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+
+import psycopg2
+
+TABLES = ["sensor_readings", "sensor_plain", "sensor_wide"]
+
+# name -> (results/ file name for --plans, {table: sql}); file names match compare_perf_json.sh
+QUERIES = {
+    "range_1h": (
+        "range_1h_{table}_cpu_device1",
+        {
+            "sensor_readings": "SELECT time, value FROM sensor_readings WHERE device_id = 1 AND metric = 'cpu' "
+            "AND time > NOW() - INTERVAL '1 hour' ORDER BY time DESC LIMIT 100",
+            "sensor_plain": "SELECT time, value FROM sensor_plain WHERE device_id = 1 AND metric = 'cpu' "
+            "AND time > NOW() - INTERVAL '1 hour' ORDER BY time DESC LIMIT 100",
+            "sensor_wide": "SELECT time, cpu_percent FROM sensor_wide WHERE device_id = 1 "
+            "AND time > NOW() - INTERVAL '1 hour' ORDER BY time DESC LIMIT 100",
+        },
+    ),
+    "agg_6h_avg_per_min": (
+        "agg_6h_avg_per_min_{table}_cpu",
+        {
+            "sensor_readings": "SELECT time_bucket('1 minute', time) AS minute, avg(value) FROM sensor_readings "
+            "WHERE metric='cpu' AND time > NOW() - INTERVAL '6 hours' GROUP BY minute",
+            "sensor_plain": "SELECT time_bucket('1 minute', time) AS minute, avg(value) FROM sensor_plain "
+            "WHERE metric='cpu' AND time > NOW() - INTERVAL '6 hours' GROUP BY minute",
+            "sensor_wide": "SELECT time_bucket('1 minute', time) AS minute, avg(cpu_percent) FROM sensor_wide "
+            "WHERE time > NOW() - INTERVAL '6 hours' GROUP BY minute",
+        },
+    ),
+    "latest_per_device": (
+        "latest_per_device_{table}_cpu",
+        {
+            "sensor_readings": "SELECT DISTINCT ON (device_id) device_id, time, value FROM sensor_readings "
+            "WHERE metric='cpu' ORDER BY device_id, time DESC",
+            "sensor_plain": "SELECT DISTINCT ON (device_id) device_id, time, value FROM sensor_plain "
+            "WHERE metric='cpu' ORDER BY device_id, time DESC",
+            "sensor_wide": "SELECT DISTINCT ON (device_id) device_id, time, cpu_percent FROM sensor_wide "
+            "ORDER BY device_id, time DESC",
+        },
+    ),
+}
+
+METRICS = ["p50_ms", "p95_ms", "p99_ms", "mean_ms"]
+
+
+def parse_args():
+    p = argparse.ArgumentParser()
+    p.add_argument(
+        "--dsn",
+        default=os.getenv(
+            "BENCH_DSN", "dbname=metricsdb user=admin password=admin123 host=localhost port=5432"
+        ),
+    )
+    p.add_argument("--iterations", type=int, default=20, help="warm runs per query and table")
+    p.add_argument("--warmup", type=int, default=2, help="untimed runs before the warm runs")
+    p.add_argument("--cold-runs", type=int, default=0, help="runs after --cold-cmd per pair (default: none)")
+    p.add_argument("--cold-cmd", default="docker restart timescaledb")
+    p.add_argument("--cold-wait", type=float, default=60.0, help="seconds to wait for the server after --cold-cmd")
+    p.add_argument("--queries", default=",".join(QUERIES))
+    p.add_argument("--tables", default=",".join(TABLES))
+    p.add_argument("--out", default="bench/latest.json")
+    p.add_argument("--baseline", default="bench/baseline.json")
+    p.add_argument("--save-baseline", action="store_true", help="also write this run as the baseline")
+    p.add_argument("--threshold", type=float, default=0.20, help="relative slowdown that counts as a regression")
+    p.add_argument("--min-delta-ms", type=float, default=0.5, help="ignore slowdowns smaller than this")
+    p.add_argument("--metric", choices=METRICS, default="p50_ms", help="latency compared against the baseline")
+    p.add_argument("--plans", metavar="DIR", help="also save one full EXPLAIN ANALYZE plan per query here (e.g. results)")
+    return p.parse_args()
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile; with few runs p99 is simply the slowest one"""
+    ordered = sorted(values)
+    rank = max(1, math.ceil(pct / 100 * len(ordered)))
+    return ordered[min(rank, len(ordered)) - 1]
+
+
+def connect(dsn, wait=0.0):
+    deadline = time.monotonic() + wait
+    while True:
+        try:
+            conn = psycopg2.connect(dsn)
+            conn.autocommit = True
+            return conn
+        except psycopg2.OperationalError:
+            if time.monotonic() >= deadline:
+                raise
+            time.sleep(1)
+
+
+def explain(cur, sql, timing=False):
+    """Run sql under EXPLAIN ANALYZE; returns (plan json, client seconds)"""
+    options = "ANALYZE, BUFFERS, FORMAT JSON" + ("" if timing else ", TIMING OFF")
+    t0 = time.perf_counter()
+    cur.execute(f"EXPLAIN ({options}) {sql}")
+    plan = cur.fetchone()[0]
+    elapsed = time.perf_counter() - t0
+    # psycopg2 decodes the json column already unless the server hands back text
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return plan, elapsed
+
+
+def measure(cur, sql):
+    """One timed run: execution time and buffers as Postgres reports them"""
+    plan, elapsed = explain(cur, sql)
+    top = plan[0]
+    node = top["Plan"]
+    planning = top.get("Planning", {})
+    return {
+        "execution_ms": top["Execution Time"],
+        "planning_ms": top.get("Planning Time", 0.0),
+        "client_ms": elapsed * 1000,
+        # The root node's counters include every node below it
+        "shared_hit": node.get("Shared Hit Blocks", 0),
+        "shared_read": node.get("Shared Read Blocks", 0),
+        "temp_read": node.get("Temp Read Blocks", 0),
+        "temp_written": node.get("Temp Written Blocks", 0),
+        "planning_hit": planning.get("Shared Hit Blocks", 0),
+        "planning_read": planning.get("Shared Read Blocks", 0),
+        "rows": node.get("Actual Rows", 0),
+    }
+
+
+def summarize(runs):
+    if not runs:
+        return None
+    latency = [r["execution_ms"] for r in runs]
+    client = [r["client_ms"] for r in runs]
+    return {
+        "runs": len(runs),
+        "p50_ms": round(percentile(latency, 50), 3),
+        "p95_ms": round(percentile(latency, 95), 3),
+        "p99_ms": round(percentile(latency, 99), 3),
+        "mean_ms": round(statistics.fmean(latency), 3),
+        "min_ms": round(min(latency), 3),
+        "max_ms": round(max(latency), 3),
+        "client_p50_ms": round(percentile(client, 50), 3),
+        "planning_p50_ms": round(percentile([r["planning_ms"] for r in runs], 50), 3),
+        "shared_hit": statistics.median(r["shared_hit"] for r in runs),
+        "shared_read": statistics.median(r["shared_read"] for r in runs),
+        "temp_blocks": statistics.median(r["temp_read"] + r["temp_written"] for r in runs),
+        "rows": runs[-1]["rows"],
+    }
+
+
+def cold_runs(args, matrix):
+    """One run per (query, table) after each cache flush, so every run starts cold"""
+    results = {key: [] for key in matrix}
+    for i in range(args.cold_runs):
+        for key, sql in matrix.items():
+            subprocess.run(args.cold_cmd, shell=True, check=True, capture_output=True)
+            conn = connect(args.dsn, wait=args.cold_wait)
+            try:
+                results[key].append(measure(conn.cursor(), sql))
+            finally:
+                conn.close()
+        print(f"  cold pass {i + 1}/{args.cold_runs} done")
+    return results
+
+
+def warm_runs(args, matrix):
+    results = {}
+    conn = connect(args.dsn)
+    try:
+        cur = conn.cursor()
+        for key, sql in matrix.items():
+            for _ in range(args.warmup):
+                measure(cur, sql)
+            results[key] = [measure(cur, sql) for _ in range(args.iterations)]
+            if args.plans:
+                save_plan(cur, args.plans, key, sql)
+    finally:
+        conn.close()
+    return results
+
+
+def save_plan(cur, directory, key, sql):
+    query, table = key
+    os.makedirs(directory, exist_ok=True)
+    plan, _ = explain(cur, sql, timing=True)
+    path = os.path.join(directory, QUERIES[query][0].format(table=table) + ".json")
+    with open(path, "w") as f:
+        json.dump(plan, f, indent=2)
+
+
+def server_info(dsn):
+    conn = connect(dsn)
+    try:
+        cur = conn.cursor()
+        cur.execute("SHOW server_version")
+        version = cur.fetchone()[0]
+        cur.execute("SELECT extversion FROM pg_extension WHERE extname = 'timescaledb'")
+        row = cur.fetchone()
+        cur.execute("SHOW shared_buffers")
+        shared_buffers = cur.fetchone()[0]
+    finally:
+        conn.close()
+    return {"server_version": version, "timescaledb": row[0] if row else None, "shared_buffers": shared_buffers}
+
+
+def compare(current, baseline, args):
+    """(query, table, phase, baseline value, current value, change) for every slowdown past the threshold"""
+    regressions = []
+    for query, tables in current["results"].items():
+        for table, phases in tables.items():
+            for phase, stats in phases.items():
+                before = baseline["results"].get(query, {}).get(table, {}).get(phase)
+                if not stats or not before:
+                    continue
+                old, new = before[args.metric], stats[args.metric]
+                if new - old > args.min_delta_ms and new > old * (1 + args.threshold):
+                    regressions.append((query, table, phase, old, new, new / old - 1 if old else float("inf")))
+    return regressions
+
+
+def write_json(path, data):
+    if os.path.dirname(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path + ".tmp", "w") as f:
+        json.dump(data, f, indent=2)
+    os.replace(path + ".tmp", path)
+
+
+def main():
+    args = parse_args()
+    queries = [q for q in args.queries.split(",") if q]
+    tables = [t for t in args.tables.split(",") if t]
+    unknown = [q for q in queries if q not in QUERIES] + [t for t in tables if t not in TABLES]
+    if unknown:
+        print(f"Unknown query or table: {', '.join(unknown)}")
+        return 2
+
+    matrix = {(q, t): QUERIES[q][1][t] for q in queries for t in tables}
+    info = server_info(args.dsn)
+    print(
+        f"PostgreSQL {info['server_version']}, timescaledb {info['timescaledb'] or '-'}, "
+        f"shared_buffers {info['shared_buffers']}; {len(matrix)} query/table pairs"
+    )
+
+    cold = {}
+    if args.cold_runs > 0:
+        print(f"=== Cold runs ({args.cold_runs} per pair, flushing with: {args.cold_cmd}) ===")
+        try:
+            cold = cold_runs(args, matrix)
+        except (subprocess.CalledProcessError, psycopg2.OperationalError) as e:
+            print(f"❌ Cold runs skipped: {e}")
+            cold = {}
+    print(f"=== Warm runs ({args.warmup} warm-up + {args.iterations} per pair) ===")
+    warm = warm_runs(args, matrix)
+
+    results = {}
+    for (query, table) in matrix:
+        results.setdefault(query, {})[table] = {
+            "cold": summarize(cold.get((query, table), [])),
+            "warm": summarize(warm[(query, table)]),
+        }
+    current = {
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "server": info,
+        "iterations": args.iterations,
+        "cold_runs": args.cold_runs if cold else 0,
+        "results": results,
+    }
+
+    print(
+        f"\n{'query':<20} {'table':<16} {'phase':<5} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} "
+        f"{'hit':>8} {'read':>8} {'rows':>7}"
+    )
+    for query, tables_ in results.items():
+        for table, phases in tables_.items():
+            for phase, s in phases.items():
+                if not s:
+                    continue
+                print(
+                    f"{query:<20} {table:<16} {phase:<5} {s['p50_ms']:>9.2f} {s['p95_ms']:>9.2f} "
+                    f"{s['p99_ms']:>9.2f} {s['shared_hit']:>8.0f} {s['shared_read']:>8.0f} {s['rows']:>7}"
+                )
+
+    write_json(args.out, current)
+    print(f"\nSaved: {args.out}")
+    if args.save_baseline:
+        write_json(args.baseline, current)
+        print(f"Saved baseline: {args.baseline}")
+        return 0
+
+    try:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    except FileNotFoundError:
+        print(f"No baseline at {args.baseline}; rerun with --save-baseline to create one")
+        return 0
+
+    regressions = compare(current, baseline, args)
+    print(
+        f"Compared {args.metric} against baseline from {baseline.get('created_at', '?')} "
+        f"(threshold {args.threshold:.0%}, min delta {args.min_delta_ms} ms)"
+    )
+    if not regressions:
+        print("✅ No regressions")
+        return 0
+    for query, table, phase, old, new, change in regressions:
+        print(f"❌ {query} on {table} ({phase}): {old:.2f} ms -> {new:.2f} ms (+{change:.0%})")
+    return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,288 @@
+import glob
+import json
+import os
+import sys
+
+import pytest
+
+import explain_report
+
+RESULTS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+
+
+def fixture(name):
+    return os.path.join(RESULTS, name + ".json")
+
+
+@pytest.mark.parametrize(
+    "name, hot_label, hot_self_ms",
+    [
+        ("agg_6h_avg_per_min_sensor_plain_cpu", "Seq Scan on sensor_plain", 113.053),
+        ("agg_6h_avg_per_min_sensor_readings_cpu", "Index Scan on _hyper_1_24_chunk", 9.114),
+        ("agg_6h_avg_per_min_sensor_wide_cpu", "Index Scan on _hyper_2_12_chunk", 5.932),
+        ("latest_per_device_sensor_plain_cpu", "Index Scan on sensor_plain", 0.293),
+        ("latest_per_device_sensor_readings_cpu", "Index Scan on _hyper_1_15_chunk", 0.221),
+        ("latest_per_device_sensor_wide_cpu", "Index Scan on _hyper_2_5_chunk", 0.145),
+        ("range_1h_sensor_plain_cpu_device1", "Index Scan on sensor_plain", 0.199),
+        ("range_1h_sensor_readings_cpu_device1", "Index Scan on _hyper_1_24_chunk", 0.123),
+        ("range_1h_sensor_wide_cpu_device1", "Index Scan on _hyper_2_12_chunk", 0.235),
+    ],
+)
+def test_hot_node(name, hot_label, hot_self_ms):
+    report = explain_report.analyze(fixture(name))
+    assert report["hot_node"]["label"] == hot_label
+    assert report["hot_node"]["self_ms"] == pytest.approx(hot_self_ms, abs=1e-3)
+
+
+def test_self_time_accounts_for_parallel_workers():
+    report = explain_report.analyze(fixture("agg_6h_avg_per_min_sensor_plain_cpu"))
+    by_type = {n["node_type"]: n for n in report["nodes"]}
+    # 3 workers + leader: the scan's 4 loops overlap, so its wall time is 113 ms, not 452 ms
+    assert by_type["Seq Scan"]["total_ms"] == pytest.approx(113.053, abs=1e-3)
+    assert by_type["Gather"]["self_ms"] == pytest.approx(130.446 - 113.053, abs=1e-3)
+    assert by_type["Aggregate"]["self_ms"] == pytest.approx(134.206 - 130.446, abs=1e-3)
+    assert by_type["Seq Scan"]["rows"] == 19036
+    assert by_type["Seq Scan"]["rows_removed"] == 745241 * 4
+    # Buffers are inclusive of children; all 21076 hits belong to the scan itself
+    assert by_type["Seq Scan"]["shared_hit"] == 21076
+    assert by_type["Gather"]["shared_hit"] == 0
+
+
+@pytest.mark.parametrize(
+    "name, kinds",
+    [
+        ("agg_6h_avg_per_min_sensor_plain_cpu", {"misestimate", "seq_scan"}),
+        ("agg_6h_avg_per_min_sensor_readings_cpu", {"misestimate"}),
+        ("agg_6h_avg_per_min_sensor_wide_cpu", {"misestimate"}),
+        ("latest_per_device_sensor_plain_cpu", set()),
+        ("latest_per_device_sensor_readings_cpu", set()),
+        ("latest_per_device_sensor_wide_cpu", set()),
+        ("range_1h_sensor_plain_cpu_device1", set()),
+        ("range_1h_sensor_readings_cpu_device1", set()),
+        ("range_1h_sensor_wide_cpu_device1", set()),
+    ],
+)
+def test_findings(name, kinds):
+    report = explain_report.analyze(fixture(name))
+    assert {f["kind"] for f in report["findings"]} == kinds
+
+
+def test_seq_scan_and_misestimate_details():
+    report = explain_report.analyze(fixture("agg_6h_avg_per_min_sensor_plain_cpu"))
+    found = {f["kind"]: f for f in report["findings"]}
+    assert found["seq_scan"]["node"] == "Seq Scan on sensor_plain"
+    assert found["seq_scan"]["detail"].startswith("read 3000000 rows, kept 19036 (0.6%)")
+    assert found["misestimate"]["node"] == "Aggregate"
+    assert found["misestimate"]["detail"] == "estimated 19746 rows, got 318 (62x over)"
+
+    # Raising the thresholds silences both
+    quiet = explain_report.analyze(
+        fixture("agg_6h_avg_per_min_sensor_plain_cpu"), seq_min_rows=10_000_000, misestimate_factor=100
+    )
+    assert quiet["findings"] == []
+
+
+def test_skipscan_children_are_not_misestimates():
+    # The index scans under SkipScan are estimated at ~86k rows but stop after one row per device
+    report = explain_report.analyze(fixture("latest_per_device_sensor_wide_cpu"))
+    bounded = [n for n in report["nodes"] if n["node_type"] == "Index Scan"]
+    assert len(bounded) == 12
+    assert all(n["bounded"] and n["plan_rows"] > 10000 and n["rows"] == 5 for n in bounded)
+
+
+@pytest.mark.parametrize(
+    "name, chunks",
+    [
+        ("agg_6h_avg_per_min_sensor_plain_cpu", {}),
+        ("agg_6h_avg_per_min_sensor_readings_cpu", {"sensor_readings": (1, 1, 1)}),
+        ("agg_6h_avg_per_min_sensor_wide_cpu", {"sensor_wide": (1, 1, 1)}),
+        ("latest_per_device_sensor_plain_cpu", {}),
+        ("latest_per_device_sensor_readings_cpu", {"hypertable 1": (12, 12, 12)}),
+        ("latest_per_device_sensor_wide_cpu", {"hypertable 2": (12, 12, 12)}),
+        ("range_1h_sensor_plain_cpu_device1", {}),
+        ("range_1h_sensor_readings_cpu_device1", {"sensor_readings": (1, 1, 1)}),
+        ("range_1h_sensor_wide_cpu_device1", {"sensor_wide": (1, 1, 1)}),
+    ],
+)
+def test_chunk_counts(name, chunks):
+    report = explain_report.analyze(fixture(name))
+    assert {k: (c["planned"], c["scanned"], c["needed"]) for k, c in report["chunks"].items()} == chunks
+    assert not any(c["missing_exclusion"] for c in report["chunks"].values())
+
+
+def test_missing_chunk_exclusion_and_sort_spill(tmp_path):
+    def scan(chunk, rows, loops=1):
+        return {
+            "Node Type": "Seq Scan",
+            "Relation Name": chunk,
+            "Plan Rows": rows,
+            "Actual Total Time": 1.0,
+            "Actual Rows": rows,
+            "Actual Loops": loops,
+            "Rows Removed by Filter": 20000,
+        }
+
+    plan = [
+        {
+            "Plan": {
+                "Node Type": "Sort",
+                "Sort Method": "external merge",
+                "Sort Space Type": "Disk",
+                "Sort Space Used": 4000,
+                "Plan Rows": 5,
+                "Actual Total Time": 10.0,
+                "Actual Rows": 5,
+                "Actual Loops": 1,
+                "Temp Written Blocks": 500,
+                "Plans": [
+                    {
+                        "Node Type": "Custom Scan",
+                        "Custom Plan Provider": "ChunkAppend",
+                        "Relation Name": "sensor_readings",
+                        "Plan Rows": 5,
+                        "Actual Total Time": 5.0,
+                        "Actual Rows": 5,
+                        "Actual Loops": 1,
+                        "Chunks excluded during startup": 1,
+                        "Plans": [
+                            scan("_hyper_1_1_chunk", 0),
+                            scan("_hyper_1_2_chunk", 5),
+                            scan("_hyper_1_3_chunk", 0, loops=0),
+                        ],
+                    }
+                ],
+            },
+            "Planning Time": 1.0,
+            "Execution Time": 10.5,
+        }
+    ]
+    path = tmp_path / "spill_sensor_readings.json"
+    path.write_text(json.dumps(plan))
+
+    report = explain_report.analyze(str(path))
+    assert report["chunks"]["sensor_readings"] == {
+        "planned": 3,
+        "scanned": 2,
+        "needed": 1,
+        "excluded_startup": 1,
+        "excluded_runtime": 0,
+        "missing_exclusion": True,
+    }
+    kinds = [f["kind"] for f in report["findings"]]
+    assert kinds.count("sort_spill") == 1
+    assert "chunk_exclusion" in kinds
+    # The chunk that never ran is not reported as a seq scan
+    assert [f["node"] for f in report["findings"] if f["kind"] == "seq_scan"] == [
+        "Seq Scan on _hyper_1_1_chunk",
+        "Seq Scan on _hyper_1_2_chunk",
+    ]
+
+
+def test_layout_comparison(capsys):
+    reports = [explain_report.analyze(p) for p in sorted(glob.glob(os.path.join(RESULTS, "*.json")))]
+    assert explain_report.layout_of("range_1h_sensor_wide_cpu_device1.json") == ("range_1h_{table}_cpu_device1", "wide")
+
+    explain_report.print_comparison(reports)
+    out = capsys.readouterr().out
+    sections = out.split("=== ")[1:]
+    fastest = {s.split(" ===")[0]: s.strip().splitlines()[-1].strip() for s in sections}
+    assert fastest == {
+        "agg_6h_avg_per_min_{table}_cpu": "fastest: wide",
+        "latest_per_device_{table}_cpu": "fastest: plain",
+        "range_1h_{table}_cpu_device1": "fastest: narrow",
+    }
+
+
+def test_json_output_shape(tmp_path, monkeypatch, capsys):
+    out = tmp_path / "report.json"
+    monkeypatch.setattr(sys, "argv", ["explain_report.py", "--json", str(out)])
+    assert explain_report.main() == 0
+    capsys.readouterr()
+
+    reports = json.loads(out.read_text())
+    assert len(reports) == len(glob.glob(os.path.join(RESULTS, "*.json")))
+    assert [r["file"] for r in reports] == sorted(r["file"] for r in reports)
+    for r in reports:
+        assert set(r) == {
+            "file",
+            "execution_ms",
+            "planning_ms",
+            "planning_hit",
+            "planning_read",
+            "rows",
+            "shared_hit",
+            "shared_read",
+            "temp_read",
+            "temp_written",
+            "hot_node",
+            "nodes",
+            "chunks",
+            "findings",
+        }
+        assert set(r["hot_node"]) == {"label", "self_ms", "rows"}
+        for n in r["nodes"]:
+            assert set(n) == {
+                "depth",
+                "label",
+                "node_type",
+                "relation",
+                "total_ms",
+                "self_ms",
+                "rows",
+                "loops",
+                "plan_rows",
+                "bounded",
+                "rows_removed",
+                "shared_hit",
+                "shared_read",
+                "temp_read",
+                "temp_written",
+            }
+        for c in r["chunks"].values():
+            assert set(c) == {"planned", "scanned", "needed", "excluded_startup", "excluded_runtime", "missing_exclusion"}
+        for f in r["findings"]:
+            assert set(f) == {"kind", "node", "detail"}
+
+    first = reports[0]
+    assert first["file"] == "agg_6h_avg_per_min_sensor_plain_cpu.json"
+    assert first["execution_ms"] == 134.637
+    assert first["shared_hit"] == 21076
+
+
+def test_plan_without_summary_timings(tmp_path, capsys):
+    # EXPLAIN (ANALYZE, SUMMARY OFF): node timings but no Execution Time / Planning Time
+    with open(fixture("range_1h_sensor_wide_cpu_device1")) as f:
+        plan = json.load(f)
+    for key in ("Execution Time", "Planning Time", "Planning"):
+        plan[0].pop(key, None)
+    path = tmp_path / "range_1h_sensor_wide_cpu_device1.json"
+    path.write_text(json.dumps(plan))
+
+    report = explain_report.analyze(str(path))
+    assert report["execution_ms"] is None
+    assert report["planning_ms"] is None
+    assert report["hot_node"]["label"] == "Index Scan on _hyper_2_12_chunk"
+
+    explain_report.print_plan(report, 3)
+    assert "execution n/a ms, planning n/a ms" in capsys.readouterr().out
+
+    # Compared with a timed plan of another layout, the timed one is the fastest
+    explain_report.print_comparison([report, explain_report.analyze(fixture("range_1h_sensor_plain_cpu_device1"))])
+    out = capsys.readouterr().out
+    assert "n/a" in out.split("execution ms")[1].splitlines()[0]
+    assert out.strip().splitlines()[-1].strip() == "fastest: plain"
+
+
+def test_plain_explain_is_skipped(tmp_path, monkeypatch, capsys):
+    plan = [{"Plan": {"Node Type": "Seq Scan", "Relation Name": "sensor_plain", "Plan Rows": 100}}]
+    path = tmp_path / "plain_explain.json"
+    path.write_text(json.dumps(plan))
+
+    with pytest.raises(ValueError, match="not run with ANALYZE"):
+        explain_report.analyze(str(path))
+
+    monkeypatch.setattr(sys, "argv", ["explain_report.py", str(path), fixture("range_1h_sensor_plain_cpu_device1")])
+    assert explain_report.main() == 0
+    out = capsys.readouterr().out
+    assert "Skipping" in out and "plain_explain.json" in out
+    assert "=== range_1h_sensor_plain_cpu_device1.json ===" in out
@@ -0,0 +1,121 @@
+from argparse import Namespace
+
+import pytest
+
+import query_bench
+
+
+def test_percentile_is_nearest_rank():
+    values = [5.0, 1.0, 4.0, 2.0, 3.0]
+    assert query_bench.percentile(values, 50) == 3.0
+    assert query_bench.percentile(values, 95) == 5.0
+    assert query_bench.percentile(values, 0) == 1.0
+    assert query_bench.percentile(values, 100) == 5.0
+    # With few runs the high percentiles are the slowest run
+    assert query_bench.percentile([2.0, 1.0, 3.0], 99) == 3.0
+    assert query_bench.percentile([7.0], 50) == 7.0
+
+    ranked = list(range(1, 101))
+    assert query_bench.percentile(ranked, 50) == 50
+    assert query_bench.percentile(ranked, 95) == 95
+    assert query_bench.percentile(ranked, 99) == 99
+
+
+def run(execution_ms, client_ms=None, planning_ms=0.1, hit=100, read=0, temp=(0, 0), rows=10):
+    return {
+        "execution_ms": execution_ms,
+        "planning_ms": planning_ms,
+        "client_ms": execution_ms + 0.5 if client_ms is None else client_ms,
+        "shared_hit": hit,
+        "shared_read": read,
+        "temp_read": temp[0],
+        "temp_written": temp[1],
+        "planning_hit": 0,
+        "planning_read": 0,
+        "rows": rows,
+    }
+
+
+def test_summarize():
+    assert query_bench.summarize([]) is None
+
+    runs = [run(float(ms), hit=100 + ms, read=ms % 2, temp=(ms, 1), rows=ms) for ms in range(1, 21)]
+    s = query_bench.summarize(runs)
+    assert s == {
+        "runs": 20,
+        "p50_ms": 10.0,
+        "p95_ms": 19.0,
+        "p99_ms": 20.0,
+        "mean_ms": 10.5,
+        "min_ms": 1.0,
+        "max_ms": 20.0,
+        "client_p50_ms": 10.5,
+        "planning_p50_ms": 0.1,
+        "shared_hit": 110.5,
+        "shared_read": 0.5,
+        "temp_blocks": 11.5,
+        "rows": 20,
+    }
+
+
+def report(**cells):
+    """{"query/table/phase": stats} -> the results layout query_bench writes"""
+    results = {}
+    for path, stats in cells.items():
+        query, table, phase = path.split("/")
+        results.setdefault(query, {}).setdefault(table, {})[phase] = stats
+    return {"results": results}
+
+
+def stats(p50, p95=None):
+    return {"p50_ms": p50, "p95_ms": p50 if p95 is None else p95}
+
+
+def compare_args(**overrides):
+    return Namespace(**dict({"threshold": 0.20, "min_delta_ms": 0.5, "metric": "p50_ms"}, **overrides))
+
+
+def test_compare_flags_slowdowns_past_threshold_and_min_delta():
+    baseline = report(**{
+        "range_1h/sensor_plain/warm": stats(10.0),
+        "range_1h/sensor_wide/warm": stats(10.0),
+        "range_1h/sensor_readings/warm": stats(1.0),
+        "latest/sensor_plain/warm": stats(4.0),
+    })
+    current = report(**{
+        "range_1h/sensor_plain/warm": stats(12.5),  # +25%, +2.5 ms: regression
+        "range_1h/sensor_wide/warm": stats(11.5),  # +15%: under the threshold
+        "range_1h/sensor_readings/warm": stats(1.4),  # +40% but only 0.4 ms: noise
+        "latest/sensor_plain/warm": stats(2.0),  # faster
+    })
+
+    regressions = query_bench.compare(current, baseline, compare_args())
+    assert len(regressions) == 1
+    query, table, phase, old, new, change = regressions[0]
+    assert (query, table, phase, old, new) == ("range_1h", "sensor_plain", "warm", 10.0, 12.5)
+    assert change == pytest.approx(0.25)
+
+    assert query_bench.compare(current, baseline, compare_args(threshold=0.30)) == []
+    assert len(query_bench.compare(current, baseline, compare_args(threshold=0.10))) == 2
+    assert len(query_bench.compare(current, baseline, compare_args(min_delta_ms=0.1))) == 2
+
+
+def test_compare_uses_the_chosen_metric_and_skips_missing_cells():
+    baseline = report(**{
+        "agg/sensor_plain/warm": stats(10.0, p95=10.0),
+        "agg/sensor_plain/cold": None,
+    })
+    current = report(**{
+        "agg/sensor_plain/warm": stats(10.0, p95=20.0),
+        "agg/sensor_plain/cold": stats(50.0),  # no cold baseline to compare with
+        "agg/sensor_wide/warm": stats(99.0),  # not in the baseline at all
+    })
+
+    assert query_bench.compare(current, baseline, compare_args()) == []
+    regressions = query_bench.compare(current, baseline, compare_args(metric="p95_ms"))
+    assert [r[:5] for r in regressions] == [("agg", "sensor_plain", "warm", 10.0, 20.0)]
+
+
+def test_cold_runs_are_opt_in(monkeypatch):
+    monkeypatch.setattr("sys.argv", ["query_bench.py"])
+    assert query_bench.parse_args().cold_runs == 0
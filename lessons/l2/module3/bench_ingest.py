@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+# bench_ingest.py
+# Ingestion benchmark matrix: method x batch size x table x row count.
+#
+# Every cell truncates the target table and runs stream_insert.py's batch loader
+# in-process (no docker exec in the timing): --warmup untimed runs to open connections and
+# warm caches, then --repeat timed runs. Results are written as JSON with the median and the
+# slow tail (p5 rows/s) per cell so runs can be compared across versions.
+#
+#   python3 bench_ingest.py --methods insert,copy-binary --batches 1000,10000 --rows 100000
+
+import argparse
+import json
+import math
+import platform
+import statistics
+import time
+from argparse import Namespace
+from datetime import datetime, timezone
+
+import psycopg2
+
+from stream_insert import WRITERS, stream_rows
+
+TABLES = ["sensor_plain_ingest", "sensor_ingest", "sensor_stream"]
+
+
+def csv_list(cast=str):
+    return lambda s: [cast(v) for v in s.split(",") if v]
+
+
+def parse_args():
+    p = argparse.ArgumentParser()
+    p.add_argument(
+        "--dsn",
+        default="dbname=metricsdb user=admin password=admin123 host=localhost port=5432",
+    )
+    p.add_argument("--methods", type=csv_list(), default=sorted(WRITERS))
+    p.add_argument("--batches", type=csv_list(int), default=[1000, 10000])
+    p.add_argument("--tables", type=csv_list(), default=TABLES)
+    p.add_argument("--rows", type=csv_list(int), default=[100000])
+    p.add_argument("--repeat", type=int, default=3)
+    p.add_argument("--warmup", type=int, default=1, help="untimed runs per cell before --repeat")
+    p.add_argument("--label", default="", help="free-form tag stored with the results")
+    p.add_argument("--out", default=None, help="default: ingest_<timestamp>.json")
+    args = p.parse_args()
+    unknown = set(args.methods) - set(WRITERS)
+    if unknown:
+        p.error(f"unknown method(s): {', '.join(sorted(unknown))}")
+    if args.repeat < 1:
+        p.error("--repeat must be >= 1")
+    if args.warmup < 0:
+        p.error("--warmup must be >= 0")
+    return args
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile"""
+    ordered = sorted(values)
+    k = max(1, math.ceil(pct / 100 * len(ordered)))
+    return ordered[k - 1]
+
+
+def server_info(dsn):
+    conn = psycopg2.connect(dsn)
+    try:
+        cur = conn.cursor()
+        cur.execute("SHOW server_version")
+        pg_version = cur.fetchone()[0]
+        cur.execute("SELECT extversion FROM pg_extension WHERE extname = 'timescaledb'")
+        row = cur.fetchone()
+        return {"postgres": pg_version, "timescaledb": row[0] if row else None}
+    finally:
+        conn.close()
+
+
+def truncate(dsn, table):
+    conn = psycopg2.connect(dsn)
+    try:
+        conn.cursor().execute(f"TRUNCATE {table}")
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def run_cell(args, method, batch, table, rows):
+    cell_args = Namespace(
+        dsn=args.dsn,
+        table=table,
+        rows=rows,
+        batch=batch,
+        method=method,
+        workers=1,
+        split="time",
+        pipeline=False,
+        queue_depth=1,
+        commit_every=1,
+    )
+
+    rates = []
+    for run in range(args.warmup + args.repeat):
+        truncate(args.dsn, table)
+        start_time = datetime.now(timezone.utc)
+        inserted, elapsed, _ = stream_rows(cell_args, 0, start_time)
+        if run >= args.warmup:
+            rates.append(inserted / elapsed)
+
+    return {
+        "method": method,
+        "batch": batch,
+        "table": table,
+        "rows": rows,
+        "runs": [round(r, 2) for r in rates],
+        "median_rows_s": round(statistics.median(rates), 2),
+        # Throughput's slow tail is its low end: p5 rows/s is the run that 95% of runs beat
+        "p5_rows_s": round(percentile(rates, 5), 2),
+        "min_rows_s": round(min(rates), 2),
+        "max_rows_s": round(max(rates), 2),
+        "stdev_rows_s": round(statistics.stdev(rates), 2) if len(rates) > 1 else 0.0,
+    }
+
+
+def main():
+    args = parse_args()
+
+    cells = [
+        (m, b, t, n)
+        for n in args.rows
+        for t in args.tables
+        for b in args.batches
+        for m in args.methods
+    ]
+    print(f"Running {len(cells)} cells x {args.repeat} runs (+{args.warmup} warm-up)")
+
+    started_at = datetime.now(timezone.utc)
+    results = []
+    t0 = time.time()
+    for i, (method, batch, table, rows) in enumerate(cells, 1):
+        cell = run_cell(args, method, batch, table, rows)
+        results.append(cell)
+        print(
+            f"[{i}/{len(cells)}] {table:<20} {method:<15} batch={batch:<6} rows={rows}: "
+            f"median {cell['median_rows_s']:.2f} rows/s, p5 {cell['p5_rows_s']:.2f} rows/s"
+        )
+
+    for table in args.tables:
+        truncate(args.dsn, table)
+
+    report = {
+        "label": args.label,
+        "started_at": started_at.isoformat(),
+        "elapsed_s": round(time.time() - t0, 2),
+        "repeat": args.repeat,
+        "warmup": args.warmup,
+        "server": server_info(args.dsn),
+        "client": {
+            "python": platform.python_version(),
+            "psycopg2": psycopg2.__version__.split()[0],
+            "host": platform.node(),
+        },
+        "results": results,
+    }
+
+    out = args.out or f"ingest_{started_at:%Y%m%d_%H%M%S}.json"
+    with open(out, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Saved: {out}")
+
+
+if __name__ == "__main__":
+    main()
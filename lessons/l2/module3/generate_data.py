@@ -1,33 +1,170 @@
 #!/usr/bin/env python3
+# generate_data.py
+# Vectorized generator for cpu_data.csv (COPY) and cpu.lp (InfluxDB line protocol).
+#
+# Rows are built as NumPy arrays and formatted --block rows at a time.
+# --shards N writes N files in parallel processes (cpu_data_000.csv, cpu_000.lp, ...).
+#
+# --stream csv|lp writes a single format to stdout (or --output, e.g. a named pipe) block by
+# block, so it can feed a loader directly without staging files:
+#   python3 generate_data.py --stream csv | docker exec -i timescaledb psql -U admin -d metricsdb \
+#     -c "\COPY sensor_ingest(time, device_id, value) FROM STDIN CSV"
+#   python3 generate_data.py --stream lp | docker exec -i influxdb influx write \
+#     --org example-org --bucket example-bucket --precision ns -
+# --gzip compresses the stream on the fly (pipe through gunzip, or influx write --compression gzip).
 
-from datetime import datetime, timezone, timedelta
-import random
+import argparse
+import gzip
+import multiprocessing as mp
+import os
+import sys
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
 
 ROW_COUNT = 1000000
 CSV_PATH = "cpu_data.csv"
 LP_PATH = "cpu.lp"
+DEVICES = 10
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+# Values are whole cents in [10.00, 90.00]; str() of each is what round(x, 2) prints
+VALUE_CENTS = (1000, 9000)
+VALUE_STRS = np.array([str(c / 100) for c in range(VALUE_CENTS[0], VALUE_CENTS[1] + 1)])
+DEVICE_STRS = np.array([str(d) for d in range(DEVICES + 1)])
+
+
+def parse_args():
+    p = argparse.ArgumentParser()
+    p.add_argument("--rows", type=int, default=ROW_COUNT)
+    p.add_argument("--shards", type=int, default=1)
+    p.add_argument("--block", type=int, default=200000, help="rows formatted per write")
+    p.add_argument("--seed", type=int, default=None)
+    p.add_argument("--csv", default=CSV_PATH)
+    p.add_argument("--lp", default=LP_PATH)
+    p.add_argument("--stream", choices=["csv", "lp"], default=None)
+    p.add_argument("--output", default="-", help="stream target: '-' for stdout or a path/FIFO")
+    p.add_argument("--gzip", action="store_true", help="gzip the stream")
+    args = p.parse_args()
+    if args.shards < 1:
+        p.error("--shards must be >= 1")
+    if args.stream and args.shards != 1:
+        p.error("--stream writes a single stream; use --shards 1")
+    if args.gzip and not args.stream:
+        p.error("--gzip only applies to --stream")
+    return args
+
+
+def shard_path(path, shard, shards):
+    if shards == 1:
+        return path
+    stem, dot, ext = path.rpartition(".")
+    return f"{stem}_{shard:03d}.{ext}" if dot else f"{path}_{shard:03d}"
+
+
+def format_block(start_us, lo, hi, rng, us_unit, kinds=("csv", "lp")):
+    """Format rows lo..hi (one second apart from start_us) as CSV and/or line-protocol text"""
+    idx = np.arange(lo, hi, dtype=np.int64)
+    ts_us = start_us + idx * 1_000_000
+    device_ids = rng.integers(1, DEVICES + 1, size=len(idx))
+    cents = rng.integers(VALUE_CENTS[0], VALUE_CENTS[1] + 1, size=len(idx))
+
+    devices = DEVICE_STRS[device_ids]
+    values = VALUE_STRS[cents - VALUE_CENTS[0]]
+
+    texts = []
+    for kind in kinds:
+        if kind == "csv":
+            iso = np.datetime_as_string(ts_us.astype("datetime64[us]"), unit=us_unit)
+            iso = np.char.add(iso, "+00:00")
+            lines = np.char.add(np.char.add(np.char.add(np.char.add(iso, ","), devices), ","), values)
+        else:
+            # Same float arithmetic as int(dt.timestamp() * 1_000_000_000)
+            ns = ((ts_us.astype(np.float64) / 1e6) * 1e9).astype(np.int64).astype(str)
+            lines = np.char.add(
+                np.char.add(np.char.add(np.char.add("cpu,device_id=", devices), " value="), values),
+                np.char.add(" ", ns),
+            )
+        texts.append("\n".join(lines.tolist()) + "\n")
+    return texts
+
 
-def iso_ts(dt):
-    return dt.isoformat()
+def write_shard(args, shard, start_us, us_unit, seed_seq):
+    lo = args.rows * shard // args.shards
+    hi = args.rows * (shard + 1) // args.shards
+    rng = np.random.default_rng(seed_seq)
+
+    csv_path = shard_path(args.csv, shard, args.shards)
+    lp_path = shard_path(args.lp, shard, args.shards)
+
+    with open(csv_path, "w") as csvf, open(lp_path, "w") as lpf:
+        for block_lo in range(lo, hi, args.block):
+            csv_text, lp_text = format_block(
+                start_us, block_lo, min(block_lo + args.block, hi), rng, us_unit
+            )
+            csvf.write(csv_text)
+            lpf.write(lp_text)
+
+    return csv_path, lp_path, hi - lo
+
+
+def stream_data(args, start_us, us_unit):
+    """Write one format block by block; memory is bounded by --block"""
+    rng = np.random.default_rng(np.random.SeedSequence(args.seed).spawn(1)[0])
+    to_stdout = args.output == "-"
+    # Opening a FIFO blocks until the loader opens the read end
+    raw = sys.stdout.buffer if to_stdout else open(args.output, "wb")
+    out = gzip.GzipFile(fileobj=raw, mode="wb", compresslevel=1) if args.gzip else raw
+
+    try:
+        for block_lo in range(0, args.rows, args.block):
+            (text,) = format_block(
+                start_us, block_lo, min(block_lo + args.block, args.rows), rng, us_unit,
+                kinds=(args.stream,),
+            )
+            out.write(text.encode())
+        if args.gzip:
+            out.close()
+        raw.flush()
+    except BrokenPipeError:
+        # Loader went away; silence the interpreter's final flush of stdout
+        os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+        sys.exit(1)
+    finally:
+        if not to_stdout:
+            raw.close()
 
-def ns_epoch(dt):
-    return int(dt.timestamp() * 1_000_000_000)
 
 def main():
+    args = parse_args()
+
     start = datetime.now(timezone.utc)
+    start_us = (start - EPOCH) // timedelta(microseconds=1)
+    # datetime.isoformat() drops the fraction when microsecond == 0
+    us_unit = "us" if start.microsecond else "s"
+
+    if args.stream:
+        print(f"Streaming {args.rows} rows as {args.stream} to {args.output}...", file=sys.stderr)
+        stream_data(args, start_us, us_unit)
+        print("Done streaming data.", file=sys.stderr)
+        return
 
-    print(f"Generating {ROW_COUNT} rows...")
+    print(f"Generating {args.rows} rows in {args.shards} shard(s)...")
 
-    with open(CSV_PATH, "w") as csvf, open(LP_PATH, "w") as lpf:
-        for i in range(ROW_COUNT):
-            ts = start + timedelta(seconds=i)
-            device_id = random.randint(1, 10)
-            value = round(random.uniform(10.0, 90.0), 2)
+    seeds = np.random.SeedSequence(args.seed).spawn(args.shards)
+    jobs = [(args, k, start_us, us_unit, seeds[k]) for k in range(args.shards)]
 
-            csvf.write(f"{iso_ts(ts)},{device_id},{value}\n")
-            lpf.write(f"cpu,device_id={device_id} value={value} {ns_epoch(ts)}\n")
+    if args.shards == 1:
+        results = [write_shard(*jobs[0])]
+    else:
+        with mp.Pool(args.shards) as pool:
+            results = pool.starmap(write_shard, jobs)
+
+    for csv_path, lp_path, rows in results:
+        print(f"  {csv_path}, {lp_path}: {rows} rows")
 
     print("Done generating data.")
 
+
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,215 @@
+#!/usr/bin/env python3
+# influx_write.py
+# Batched line-protocol writer for the InfluxDB v2 /api/v2/write endpoint.
+#
+# Streams cpu.lp (or points generated on the fly with --generate N) in size-bounded batches
+# over persistent HTTP connections, one per --concurrency worker. Batches can be gzipped and
+# are retried with exponential backoff on 429/503 (honouring Retry-After).
+#
+#   python3 influx_write.py --file cpu.lp --token "$INFLUX_TOKEN" --gzip --concurrency 4
+#
+# --url can point at any HTTP server that speaks the write API, e.g. a local stub.
+
+import argparse
+import gzip
+import http.client
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from urllib.parse import urlencode, urlsplit
+
+RETRY_STATUSES = {429, 503}
+
+
+def parse_args():
+    p = argparse.ArgumentParser()
+    p.add_argument("--url", default="http://localhost:8086")
+    p.add_argument("--org", default="example-org")
+    p.add_argument("--bucket", default="example-bucket")
+    p.add_argument("--token", default=os.getenv("INFLUX_TOKEN", ""))
+    p.add_argument("--precision", default="ns")
+    p.add_argument("--file", default="cpu.lp")
+    p.add_argument("--generate", type=int, default=None, help="generate N points instead of --file")
+    p.add_argument("--batch-lines", type=int, default=5000)
+    p.add_argument("--batch-bytes", type=int, default=1 << 20)
+    p.add_argument("--concurrency", type=int, default=1)
+    p.add_argument("--gzip", action="store_true")
+    p.add_argument("--retries", type=int, default=5)
+    p.add_argument("--backoff", type=float, default=0.5, help="initial retry delay in seconds")
+    p.add_argument("--timeout", type=float, default=30.0)
+    args = p.parse_args()
+    if args.concurrency < 1:
+        p.error("--concurrency must be >= 1")
+    return args
+
+
+def file_lines(path):
+    with open(path, "rb") as f:
+        for line in f:
+            if line.strip():
+                yield line if line.endswith(b"\n") else line + b"\n"
+
+
+def generated_lines(rows):
+    start = datetime.now(timezone.utc)
+    for i in range(rows):
+        ts = start + timedelta(seconds=i)
+        device_id = random.randint(1, 10)
+        value = round(random.uniform(10.0, 90.0), 2)
+        ns = int(ts.timestamp() * 1_000_000_000)
+        yield f"cpu,device_id={device_id} value={value} {ns}\n".encode()
+
+
+def batches(lines, max_lines, max_bytes):
+    """Group lines into batches bounded by line count and payload size"""
+    batch = []
+    size = 0
+    for line in lines:
+        if batch and (len(batch) >= max_lines or size + len(line) > max_bytes):
+            yield batch
+            batch = []
+            size = 0
+        batch.append(line)
+        size += len(line)
+    if batch:
+        yield batch
+
+
+class InfluxWriter:
+    def __init__(self, args):
+        self.args = args
+        url = urlsplit(args.url)
+        self.conn_class = (
+            http.client.HTTPSConnection if url.scheme == "https" else http.client.HTTPConnection
+        )
+        self.netloc = url.netloc
+        self.path = (
+            url.path.rstrip("/")
+            + "/api/v2/write?"
+            + urlencode({"org": args.org, "bucket": args.bucket, "precision": args.precision})
+        )
+        self.headers = {"Content-Type": "text/plain; charset=utf-8"}
+        if args.token:
+            self.headers["Authorization"] = f"Token {args.token}"
+        if args.gzip:
+            self.headers["Content-Encoding"] = "gzip"
+
+        self.local = threading.local()
+        self.lock = threading.Lock()
+        self.stats = {"points": 0, "batches": 0, "bytes": 0, "retries": 0, "failed": 0}
+
+    def connection(self):
+        conn = getattr(self.local, "conn", None)
+        if conn is None:
+            conn = self.conn_class(self.netloc, timeout=self.args.timeout)
+            self.local.conn = conn
+        return conn
+
+    def reset_connection(self):
+        conn = getattr(self.local, "conn", None)
+        if conn is not None:
+            conn.close()
+        self.local.conn = None
+
+    def post(self, body):
+        """POST one payload, reusing this thread's keep-alive connection; returns (status, response, text)"""
+        conn = self.connection()
+        try:
+            conn.request("POST", self.path, body=body, headers=self.headers)
+            resp = conn.getresponse()
+            text = resp.read()
+        except (http.client.HTTPException, OSError):
+            # Server closed the idle connection (or it broke); retry once on a fresh one
+            self.reset_connection()
+            conn = self.connection()
+            conn.request("POST", self.path, body=body, headers=self.headers)
+            resp = conn.getresponse()
+            text = resp.read()
+        if resp.getheader("Connection", "").lower() == "close":
+            self.reset_connection()
+        return resp.status, resp, text.decode(errors="replace")
+
+    def write_batch(self, lines):
+        body = b"".join(lines)
+        if self.args.gzip:
+            body = gzip.compress(body, compresslevel=1)
+
+        delay = self.args.backoff
+        for attempt in range(self.args.retries + 1):
+            try:
+                status, resp, text = self.post(body)
+            except (http.client.HTTPException, OSError) as e:
+                status, resp, text = None, None, str(e)
+
+            if status is not None and 200 <= status < 300:
+                with self.lock:
+                    self.stats["points"] += len(lines)
+                    self.stats["batches"] += 1
+                    self.stats["bytes"] += len(body)
+                return True
+
+            if (status is None or status in RETRY_STATUSES) and attempt < self.args.retries:
+                retry_after = resp.getheader("Retry-After") if resp is not None else None
+                wait = float(retry_after) if retry_after and retry_after.isdigit() else delay
+                with self.lock:
+                    self.stats["retries"] += 1
+                time.sleep(wait)
+                delay *= 2
+                continue
+
+            print(f"Write failed ({status}): {text.strip()[:200]}")
+            break
+
+        with self.lock:
+            self.stats["failed"] += len(lines)
+        return False
+
+    def run(self, lines):
+        # Bound in-flight batches so reading never runs far ahead of the writers
+        slots = threading.BoundedSemaphore(self.args.concurrency * 2)
+
+        with ThreadPoolExecutor(max_workers=self.args.concurrency) as pool:
+            for batch in batches(lines, self.args.batch_lines, self.args.batch_bytes):
+                slots.acquire()
+                future = pool.submit(self.write_batch, batch)
+                future.add_done_callback(lambda _: slots.release())
+
+        return self.stats
+
+
+def main():
+    args = parse_args()
+
+    if args.generate is not None:
+        source = f"{args.generate} generated points"
+        lines = generated_lines(args.generate)
+    else:
+        source = args.file
+        lines = file_lines(args.file)
+
+    print(
+        f"Writing {source} to {args.url} bucket={args.bucket} "
+        f"(concurrency={args.concurrency}, gzip={args.gzip})"
+    )
+
+    writer = InfluxWriter(args)
+    t0 = time.time()
+    stats = writer.run(lines)
+    elapsed = time.time() - t0
+
+    print(
+        f"Wrote {stats['points']} points to {args.bucket} in {elapsed:.2f} s "
+        f"({stats['points']/elapsed:.2f} rows/s)"
+    )
+    print(
+        f"  batches {stats['batches']} | sent {stats['bytes'] / 1e6:.2f} MB "
+        f"({stats['bytes'] / 1e6 / elapsed:.2f} MB/s) | retries {stats['retries']} "
+        f"| failed points {stats['failed']}"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -65,3 +65,4 @@ docker exec -i ${PG_CONTAINER} psql -U ${PG_USER} -d ${PG_DB} \
   -c "SELECT 'sensor_stream' AS table, count(*) FROM sensor_stream;"
 
 echo "Benchmark run complete."
+echo "For repeated in-process timings (median/p5 rows/s per method, batch and table) run: python3 bench_ingest.py"
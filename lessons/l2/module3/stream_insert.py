@@ -1,13 +1,42 @@
 #!/usr/bin/env python3
 # stream_insert.py
 # Batched streaming insert into a table (sensor_stream or sensor_ingest).
+#
+# --method insert          one multi-row INSERT ... VALUES statement per batch
+# --method executemany     cursor.executemany() of a single-row INSERT per batch
+# --method execute-values  psycopg2.extras.execute_values() per batch
+# --method copy-text       COPY ... FROM STDIN (text format) per batch
+# --method copy-binary     COPY ... FROM STDIN (binary format) per batch
+#
+# copy-binary expects the benchmark schema types:
+#   time TIMESTAMPTZ, device_id INT, metric TEXT, value DOUBLE PRECISION
+#
+# --workers N splits the row range across N processes, each with its own connection:
+#   --split time    contiguous time ranges per worker (chunk locality)
+#   --split device  disjoint device sets per worker over the full time range (chunk contention)
+#
+# --pipeline builds the next batch in a producer thread while the current one is in flight
+# (bounded by --queue-depth); --commit-every K commits once per K batches instead of every batch.
 
 import argparse
+import io
+import itertools
+import multiprocessing as mp
+import queue
+import struct
+import threading
 import time
 import random
 import psycopg2
+import psycopg2.extras
 from datetime import datetime, timedelta, timezone
 
+PG_EPOCH = datetime(2000, 1, 1, tzinfo=timezone.utc)
+PG_COPY_HEADER = b"PGCOPY\n\xff\r\n\x00" + struct.pack("!ii", 0, 0)
+PG_COPY_TRAILER = struct.pack("!h", -1)
+METRIC = "cpu"
+DEVICES = 10
+
 
 def parse_args():
     p = argparse.ArgumentParser()
@@ -18,72 +47,285 @@ def parse_args():
     p.add_argument("--table", default="sensor_stream")
     p.add_argument("--rows", type=int, default=1000000)
     p.add_argument("--batch", type=int, default=1000)
-    return p.parse_args()
+    p.add_argument("--method", choices=sorted(WRITERS), default="insert")
+    p.add_argument("--workers", type=int, default=1)
+    p.add_argument("--split", choices=["time", "device"], default="time")
+    p.add_argument("--pipeline", action="store_true")
+    p.add_argument("--queue-depth", type=int, default=4)
+    p.add_argument("--commit-every", type=int, default=1, help="batches per transaction")
+    args = p.parse_args()
+    if args.workers < 1:
+        p.error("--workers must be >= 1")
+    if args.queue_depth < 1:
+        p.error("--queue-depth must be >= 1")
+    if args.commit_every < 1:
+        p.error("--commit-every must be >= 1")
+    if args.split == "device" and args.workers > DEVICES:
+        p.error(f"--split device supports at most {DEVICES} workers")
+    return args
 
 
-def main():
-    args = parse_args()
+def table_columns(table):
+    if table == "sensor_stream":
+        return ("time", "device_id", "metric", "value")
+    return ("time", "device_id", "value")
+
+
+def make_row(table, ts, device_id, value):
+    if table == "sensor_stream":
+        return (ts, device_id, METRIC, value)
+    return (ts, device_id, value)
+
+
+def write_insert(cur, table, rows):
+    cols = table_columns(table)
+    row_tpl = "(" + ",".join(["%s"] * len(cols)) + ")"
+    vals = ",".join(cur.mogrify(row_tpl, r).decode() for r in rows)
+    cur.execute(f"INSERT INTO {table}({', '.join(cols)}) VALUES " + vals)
+
+
+def write_executemany(cur, table, rows):
+    cols = table_columns(table)
+    row_tpl = "(" + ",".join(["%s"] * len(cols)) + ")"
+    cur.executemany(f"INSERT INTO {table}({', '.join(cols)}) VALUES {row_tpl}", rows)
+
+
+def write_execute_values(cur, table, rows):
+    cols = table_columns(table)
+    psycopg2.extras.execute_values(
+        cur, f"INSERT INTO {table}({', '.join(cols)}) VALUES %s", rows, page_size=len(rows)
+    )
+
+
+def write_copy_text(cur, table, rows):
+    buf = io.StringIO()
+    for r in rows:
+        buf.write(r[0].isoformat())
+        for v in r[1:]:
+            buf.write("\t")
+            buf.write(str(v))
+        buf.write("\n")
+    buf.seek(0)
+    cur.copy_expert(f"COPY {table}({', '.join(table_columns(table))}) FROM STDIN", buf)
+
+
+def binary_row_struct(table):
+    # Field count, then (length, value) per field: int8 time, int4 device, [text metric], float8 value
+    if table == "sensor_stream":
+        n = len(METRIC.encode())
+        return struct.Struct(f"!hiqiii{n}sid")
+    return struct.Struct("!hiqiiid")
+
+
+def write_copy_binary(cur, table, rows):
+    row_struct = binary_row_struct(table)
+    pack = row_struct.pack
+    one_us = timedelta(microseconds=1)
+
+    buf = io.BytesIO()
+    buf.write(PG_COPY_HEADER)
+    if table == "sensor_stream":
+        metric = METRIC.encode()
+        for ts, device_id, _, value in rows:
+            buf.write(
+                pack(4, 8, (ts - PG_EPOCH) // one_us, 4, device_id, len(metric), metric, 8, value)
+            )
+    else:
+        for ts, device_id, value in rows:
+            buf.write(pack(3, 8, (ts - PG_EPOCH) // one_us, 4, device_id, 8, value))
+    buf.write(PG_COPY_TRAILER)
+    buf.seek(0)
+    cur.copy_expert(
+        f"COPY {table}({', '.join(table_columns(table))}) FROM STDIN WITH (FORMAT binary)", buf
+    )
+
+
+WRITERS = {
+    "insert": write_insert,
+    "executemany": write_executemany,
+    "execute-values": write_execute_values,
+    "copy-text": write_copy_text,
+    "copy-binary": write_copy_binary,
+}
+
+
+def worker_rows(args, worker_id, start_time):
+    """Yield the rows owned by one worker"""
+    if args.split == "time":
+        lo = args.rows * worker_id // args.workers
+        hi = args.rows * (worker_id + 1) // args.workers
+        indexes = range(lo, hi)
+        devices = range(1, DEVICES + 1)
+    else:
+        indexes = range(worker_id, args.rows, args.workers)
+        devices = range(worker_id + 1, DEVICES + 1, args.workers)
+
+    for i in indexes:
+        ts = start_time + timedelta(seconds=i)
+        device_id = random.choice(devices)
+        value = round(random.uniform(10.0, 90.0), 2)
+        yield make_row(args.table, ts, device_id, value)
+
+
+def produce_batches(args, worker_id, start_time, timings):
+    """Yield lists of --batch rows, timing how long it takes to build them"""
+    rows = worker_rows(args, worker_id, start_time)
+    while True:
+        t0 = time.perf_counter()
+        batch = list(itertools.islice(rows, args.batch))
+        timings["generate"] += time.perf_counter() - t0
+        if not batch:
+            return
+        yield batch
+
+
+def pipelined(batches, depth, timings):
+    """Run a batch generator in a producer thread, handing batches over a bounded queue"""
+    q = queue.Queue(maxsize=depth)
+    done = object()
+    errors = []
+
+    def producer():
+        try:
+            for batch in batches:
+                q.put(batch)
+        except Exception as e:
+            errors.append(e)
+        finally:
+            q.put(done)
+
+    threading.Thread(target=producer, daemon=True).start()
+
+    while True:
+        t0 = time.perf_counter()
+        batch = q.get()
+        timings["wait"] += time.perf_counter() - t0
+        if batch is done:
+            break
+        yield batch
+
+    if errors:
+        raise errors[0]
+
+
+def format_timings(timings):
+    parts = [f"{name} {secs:.2f} s" for name, secs in timings.items()]
+    return " | ".join(parts)
+
+
+def stream_rows(args, worker_id, start_time, barrier=None):
+    """Stream one worker's rows in batches; returns (inserted, elapsed, timings)"""
+    write_batch = WRITERS[args.method]
 
     conn = psycopg2.connect(args.dsn)
     cur = conn.cursor()
 
-    start_time = datetime.now(timezone.utc).replace(tzinfo=timezone.utc)
-    
+    if barrier is not None:
+        barrier.wait()
+
+    timings = {"generate": 0.0, "send": 0.0, "commit": 0.0}
+    if args.pipeline:
+        # Time the consumer spent starved for batches
+        timings["wait"] = 0.0
+
     t0 = time.time()
 
-    buffer = []
-    inserted = 0
+    batches = produce_batches(args, worker_id, start_time, timings)
+    if args.pipeline:
+        batches = pipelined(batches, args.queue_depth, timings)
 
-    for i in range(args.rows):
-        ts = start_time + timedelta(seconds=i)
-        device_id = random.randint(1, 10)
-        value = round(random.uniform(10.0, 90.0), 2)
+    inserted = 0
+    pending = 0
 
-        if args.table == "sensor_stream":
-            buffer.append((ts, device_id, "cpu", value))
-        else:
-            buffer.append((ts, device_id, value))
-
-        if len(buffer) >= args.batch:
-            if args.table == "sensor_stream":
-                vals = ",".join(cur.mogrify("(%s,%s,%s,%s)", r).decode() for r in buffer)
-                cur.execute(
-                    "INSERT INTO sensor_stream(time, device_id, metric, value) VALUES "
-                    + vals
-                )
-            else:
-                vals = ",".join(cur.mogrify("(%s,%s,%s)", r).decode() for r in buffer)
-                cur.execute(
-                    "INSERT INTO sensor_ingest(time, device_id, value) VALUES " + vals
-                )
+    for batch in batches:
+        ts = time.perf_counter()
+        write_batch(cur, args.table, batch)
+        timings["send"] += time.perf_counter() - ts
+        inserted += len(batch)
+        pending += 1
 
+        if pending >= args.commit_every:
+            tc = time.perf_counter()
             conn.commit()
-            inserted += len(buffer)
-            buffer.clear()
-
-    if buffer:
-        if args.table == "sensor_stream":
-            vals = ",".join(cur.mogrify("(%s,%s,%s,%s)", r).decode() for r in buffer)
-            cur.execute(
-                "INSERT INTO sensor_stream(time, device_id, metric, value) VALUES "
-                + vals
-            )
-        else:
-            vals = ",".join(cur.mogrify("(%s,%s,%s)", r).decode() for r in buffer)
-            cur.execute("INSERT INTO sensor_ingest(time, device_id, value) VALUES " + vals)
+            timings["commit"] += time.perf_counter() - tc
+            pending = 0
 
+    if pending:
+        tc = time.perf_counter()
         conn.commit()
-        inserted += len(buffer)
+        timings["commit"] += time.perf_counter() - tc
 
     t1 = time.time()
 
     cur.close()
     conn.close()
 
-    elapsed = t1 - t0
+    return inserted, t1 - t0, timings
+
+
+def run_worker(args, worker_id, start_time, barrier, results):
+    try:
+        inserted, elapsed, timings = stream_rows(args, worker_id, start_time, barrier)
+    except Exception as e:
+        print(f"  worker {worker_id} failed: {e}")
+        # Release the other workers and the parent instead of leaving them at the barrier
+        barrier.abort()
+        inserted, elapsed, timings = 0, 0.0, {}
+    results.put((worker_id, inserted, elapsed, timings))
+
+
+def run_parallel(args, start_time):
+    barrier = mp.Barrier(args.workers + 1)
+    results = mp.Queue()
+    procs = [
+        mp.Process(target=run_worker, args=(args, w, start_time, barrier, results))
+        for w in range(args.workers)
+    ]
+    for proc in procs:
+        proc.start()
+
+    # All workers are connected before the clock starts
+    try:
+        barrier.wait()
+    except threading.BrokenBarrierError:
+        pass
+    t0 = time.time()
+    stats = sorted(results.get() for _ in procs)
+    t1 = time.time()
+
+    for proc in procs:
+        proc.join()
+
+    for worker_id, inserted, elapsed, timings in stats:
+        print(
+            f"  worker {worker_id}: {inserted} rows in {elapsed:.2f} s "
+            f"({inserted/elapsed if elapsed else 0:.2f} rows/s)"
+        )
+        if timings:
+            print(f"    {format_timings(timings)}")
+
+    return sum(s[1] for s in stats), t1 - t0
+
+
+def main():
+    args = parse_args()
+
+    start_time = datetime.now(timezone.utc).replace(tzinfo=timezone.utc)
+
+    if args.workers == 1:
+        inserted, elapsed, timings = stream_rows(args, 0, start_time)
+        print(
+            f"Inserted {inserted} rows into {args.table} via {args.method} in {elapsed:.2f} s "
+            f"({inserted/elapsed:.2f} rows/s)"
+        )
+        print(f"  {format_timings(timings)}")
+        return
+
+    print(f"Streaming {args.rows} rows into {args.table} with {args.workers} workers (split by {args.split})")
+    inserted, elapsed = run_parallel(args, start_time)
     print(
-        f"Inserted {inserted} rows into {args.table} in {elapsed:.2f} s "
-        f"({inserted/elapsed:.2f} rows/s)"
+        f"Inserted {inserted} rows into {args.table} via {args.method} in {elapsed:.2f} s wall-clock "
+        f"({inserted/elapsed:.2f} rows/s aggregate)"
     )
 
 
@@ -0,0 +1,128 @@
+import argparse
+import gzip
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+import pytest
+
+from influx_write import InfluxWriter, batches
+
+
+class WriteStub(BaseHTTPRequestHandler):
+    """Minimal /api/v2/write endpoint; answers 503 to the first `unavailable` requests"""
+
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):
+        server = self.server
+        body = self.rfile.read(int(self.headers["Content-Length"]))
+        with server.lock:
+            server.requests.append((self.path, dict(self.headers), body))
+            server.clients.add(self.client_address)
+            unavailable = len(server.requests) <= server.unavailable
+
+        if unavailable:
+            self.send_response(503)
+            self.send_header("Retry-After", "0")
+        else:
+            self.send_response(204)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def stub():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), WriteStub)
+    server.lock = threading.Lock()
+    server.requests = []
+    server.clients = set()
+    server.unavailable = 0
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def writer_args(server, **overrides):
+    args = argparse.Namespace(
+        url=f"http://127.0.0.1:{server.server_address[1]}",
+        org="example-org",
+        bucket="example-bucket",
+        token="secret",
+        precision="ns",
+        batch_lines=3,
+        batch_bytes=1 << 20,
+        concurrency=1,
+        gzip=False,
+        retries=3,
+        backoff=0.0,
+        timeout=5.0,
+    )
+    vars(args).update(overrides)
+    return args
+
+
+def make_lines(count):
+    return [f"cpu,device_id={i % 3} value={i}.5 {i}\n".encode() for i in range(count)]
+
+
+def test_batches_respect_line_and_byte_limits():
+    lines = make_lines(7)
+    assert [len(b) for b in batches(lines, 3, 1 << 20)] == [3, 3, 1]
+    # Byte limit closes a batch early; a single oversized line still goes out on its own
+    assert [len(b) for b in batches(lines, 100, 2 * len(lines[0]))] == [2, 2, 2, 1]
+    assert list(batches([], 3, 1 << 20)) == []
+
+
+def test_writes_batches_over_one_connection(stub):
+    lines = make_lines(7)
+    stats = InfluxWriter(writer_args(stub)).run(lines)
+
+    assert stats == {"points": 7, "batches": 3, "bytes": len(b"".join(lines)), "retries": 0, "failed": 0}
+    assert b"".join(body for _, _, body in stub.requests) == b"".join(lines)
+    assert len(stub.clients) == 1  # keep-alive: every batch went over the same socket
+
+    path, headers, _ = stub.requests[0]
+    url = urlsplit(path)
+    assert url.path == "/api/v2/write"
+    assert parse_qs(url.query) == {"org": ["example-org"], "bucket": ["example-bucket"], "precision": ["ns"]}
+    assert headers["Authorization"] == "Token secret"
+    assert "Content-Encoding" not in headers
+
+
+def test_retries_503_then_succeeds(stub):
+    stub.unavailable = 2
+    lines = make_lines(3)
+    stats = InfluxWriter(writer_args(stub)).run(lines)
+
+    assert stats["retries"] == 2
+    assert stats["points"] == 3
+    assert stats["failed"] == 0
+    assert len(stub.requests) == 3
+    assert all(body == b"".join(lines) for _, _, body in stub.requests)
+
+
+def test_gives_up_after_retries(stub, capsys):
+    stub.unavailable = 100
+    stats = InfluxWriter(writer_args(stub, retries=2)).run(make_lines(3))
+
+    assert len(stub.requests) == 3
+    assert stats["retries"] == 2
+    assert stats["points"] == 0
+    assert stats["failed"] == 3
+    assert "Write failed (503)" in capsys.readouterr().out
+
+
+def test_gzip_bodies(stub):
+    lines = make_lines(5)
+    stats = InfluxWriter(writer_args(stub, gzip=True)).run(lines)
+
+    assert stats["points"] == 5
+    assert all(headers["Content-Encoding"] == "gzip" for _, headers, _ in stub.requests)
+    assert b"".join(gzip.decompress(body) for _, _, body in stub.requests) == b"".join(lines)
+    assert stats["bytes"] == sum(len(body) for _, _, body in stub.requests)
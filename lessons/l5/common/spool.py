@@ -0,0 +1,279 @@
+#!/usr/bin/env python3
+import csv
+import io
+import itertools
+import json
+import os
+import threading
+import time
+
+import psycopg2
+
+# Errors that mean the database (or the connection to it) is gone; anything else from
+# psycopg2 is a problem with the rows themselves and retrying them will not help
+CONNECTION_ERRORS = (psycopg2.OperationalError, psycopg2.InterfaceError)
+
+
+def _encode(value):
+    # datetimes (and anything else json can't write) go in as text PostgreSQL can parse
+    return value.isoformat() if hasattr(value, "isoformat") else str(value)
+
+
+def spool_directory(script, database, table):
+    """Spool path for ``table`` in ``database``, kept next to the script that writes it.
+
+    SPOOL_DIR moves the root; the database name stays in the path so projects that share a
+    root (or a working directory) never replay each other's rows.
+    """
+    root = os.getenv("SPOOL_DIR") or os.path.join(os.path.dirname(os.path.abspath(script)), "spool")
+    return os.path.join(root, database, table)
+
+
+class WriteAheadSpool:
+    """Disk-backed append-only spool for rows that could not be written to TimescaleDB.
+
+    Rows are appended as JSON lines to segment files while the database is unreachable.
+    A background replayer reconnects with backoff and drains the segments oldest-first
+    with COPY in batches of ``batch_rows``, deleting each segment once it is fully written.
+    Delivery is at-least-once: a crash between a COPY commit and its offset update can
+    replay that one batch again. A batch the database rejects for its contents (bad data,
+    a constraint violation) is moved to ``rejected.jsonl`` in the spool directory and
+    skipped, so it cannot hold up the rows behind it. With ``skip_conflicts`` each batch is copied into a temp
+    table and inserted with ON CONFLICT DO NOTHING, so replays into a table with a unique
+    key neither fail nor duplicate.
+    """
+
+    def __init__(self, directory, table, columns, batch_rows=10000, segment_bytes=8 << 20,
+                 skip_conflicts=False):
+        self.directory = directory
+        self.table = table
+        self.columns = columns
+        self.skip_conflicts = skip_conflicts
+        self.batch_rows = batch_rows
+        self.segment_bytes = segment_bytes
+
+        os.makedirs(directory, exist_ok=True)
+        self.rejected_path = os.path.join(directory, "rejected.jsonl")
+        self.lock = threading.Lock()
+        self.current = None
+
+        # Set when a write fails; writers then go straight to the spool until the replayer reconnects
+        self.outage = False
+
+        self.depth = self._count_pending()
+        self.spooled_total = 0
+        self.replayed_total = 0
+        self.rejected_total = 0
+        self.replay_rate = 0.0
+        self.last_error = None
+
+        self.replayer = None
+        self.stopping = threading.Event()
+
+    def _segments(self):
+        return sorted(
+            os.path.join(self.directory, name)
+            for name in os.listdir(self.directory)
+            if name.endswith(".jsonl") and name != "rejected.jsonl"
+        )
+
+    def _read_offset(self, segment):
+        try:
+            with open(segment + ".offset") as f:
+                return int(f.read().strip() or 0)
+        except FileNotFoundError:
+            return 0
+
+    def _write_offset(self, segment, offset):
+        tmp = segment + ".offset.tmp"
+        with open(tmp, "w") as f:
+            f.write(str(offset))
+        os.replace(tmp, segment + ".offset")
+
+    def _count_pending(self):
+        pending = 0
+        for segment in self._segments():
+            with open(segment) as f:
+                pending += sum(1 for line in f if line.endswith("\n"))
+            pending -= self._read_offset(segment)
+        return pending
+
+    def _seal(self):
+        """Close the segment being appended to so the replayer can take it (call with lock held)"""
+        if self.current is not None:
+            self.current.close()
+            self.current = None
+
+    def append(self, rows):
+        """Durably append rows (tuples in ``columns`` order) to the spool"""
+        if not rows:
+            return
+        data = "".join(json.dumps(list(row), default=_encode) + "\n" for row in rows)
+
+        with self.lock:
+            if self.current is not None and self.current.tell() >= self.segment_bytes:
+                self._seal()
+            if self.current is None:
+                path = os.path.join(self.directory, f"{time.time_ns():020d}.jsonl")
+                self.current = open(path, "a")
+            self.current.write(data)
+            self.current.flush()
+            os.fsync(self.current.fileno())
+
+            self.outage = True
+            self.depth += len(rows)
+            self.spooled_total += len(rows)
+
+    def _copy(self, conn, rows):
+        buf = io.StringIO()
+        csv.writer(buf).writerows(rows)
+        buf.seek(0)
+
+        columns = ", ".join(self.columns)
+        cursor = conn.cursor()
+        if self.skip_conflicts:
+            cursor.execute(
+                f"CREATE TEMP TABLE IF NOT EXISTS spool_stage (LIKE {self.table}) ON COMMIT DELETE ROWS"
+            )
+            cursor.copy_expert(f"COPY spool_stage ({columns}) FROM STDIN WITH (FORMAT csv)", buf)
+            cursor.execute(
+                f"INSERT INTO {self.table} ({columns}) SELECT {columns} FROM spool_stage "
+                f"ON CONFLICT DO NOTHING"
+            )
+        else:
+            cursor.copy_expert(f"COPY {self.table} ({columns}) FROM STDIN WITH (FORMAT csv)", buf)
+        conn.commit()
+        cursor.close()
+
+        with self.lock:
+            self.depth -= len(rows)
+            self.replayed_total += len(rows)
+
+    def reject(self, rows, error):
+        """Set aside rows the database refused (bad data, a constraint violation) in the rejected file"""
+        reason = str(error).strip().splitlines()[0] if str(error).strip() else type(error).__name__
+        data = "".join(
+            json.dumps({"table": self.table, "error": reason, "row": list(row)}, default=_encode) + "\n"
+            for row in rows
+        )
+
+        with self.lock:
+            with open(self.rejected_path, "a") as f:
+                f.write(data)
+                f.flush()
+                os.fsync(f.fileno())
+            self.rejected_total += len(rows)
+        print(f"⚠️  Rejected {len(rows)} rows for {self.table} ({reason}); kept in {self.rejected_path}")
+
+    def _write_batch(self, conn, rows):
+        """COPY one spooled batch; returns rows written (0 if the database rejected the batch)"""
+        try:
+            self._copy(conn, rows)
+            return len(rows)
+        except CONNECTION_ERRORS:
+            raise
+        except psycopg2.Error as e:
+            conn.rollback()
+            self.reject(rows, e)
+            with self.lock:
+                self.depth -= len(rows)
+            return 0
+
+    def _replay_segment(self, conn, segment):
+        offset = self._read_offset(segment)
+        written = 0
+
+        with open(segment) as f:
+            batch = []
+            for line in itertools.islice(f, offset, None):
+                if not line.endswith("\n"):
+                    break  # torn final write; nothing after it was acknowledged
+                batch.append(json.loads(line))
+                if len(batch) >= self.batch_rows:
+                    written += self._write_batch(conn, batch)
+                    offset += len(batch)
+                    self._write_offset(segment, offset)
+                    batch = []
+            if batch:
+                written += self._write_batch(conn, batch)
+
+        os.remove(segment)
+        if os.path.exists(segment + ".offset"):
+            os.remove(segment + ".offset")
+        return written
+
+    def replay(self, connect):
+        """Drain every sealed segment through one connection; returns rows written"""
+        # Seal and list under one lock: the list then holds only closed segments, and an
+        # append() after the lock is released opens a new segment that this pass never sees
+        # (deleting a live segment would lose whatever is written to it after it was read)
+        with self.lock:
+            self._seal()
+            segments = self._segments()
+
+        conn = connect()
+        # The database is reachable again: let writers go direct while we drain the backlog
+        self.outage = False
+
+        t0 = time.time()
+        written = 0
+        try:
+            for segment in segments:
+                written += self._replay_segment(conn, segment)
+        except CONNECTION_ERRORS:
+            self.outage = True
+            raise
+        finally:
+            conn.close()
+
+        elapsed = time.time() - t0
+        if written:
+            self.replay_rate = written / elapsed if elapsed else 0.0
+        return written
+
+    def run_replayer(self, connect, interval, max_backoff):
+        delay = interval
+        while not self.stopping.wait(delay):
+            if self.depth <= 0:
+                delay = interval
+                continue
+            try:
+                written = self.replay(connect)
+                if written:
+                    print(f"♻️  Replayed {written} spooled rows into {self.table} ({self.replay_rate:.0f} rows/s)")
+                self.last_error = None
+                delay = interval
+            except Exception as e:
+                self.last_error = str(e)
+                delay = min(delay * 2, max_backoff)
+
+    def start_replayer(self, connect, interval=5.0, max_backoff=60.0):
+        """Drain the spool in the background; ``connect`` returns a new psycopg2 connection"""
+        self.stopping.clear()
+        self.replayer = threading.Thread(
+            target=self.run_replayer,
+            args=(connect, interval, max_backoff),
+            daemon=True,
+        )
+        self.replayer.start()
+
+    def stop_replayer(self):
+        self.stopping.set()
+        if self.replayer is not None:
+            self.replayer.join()
+            self.replayer = None
+        with self.lock:
+            self._seal()
+
+    def metrics(self):
+        with self.lock:
+            return {
+                "depth": self.depth,
+                "segments": len(self._segments()),
+                "spooled_total": self.spooled_total,
+                "replayed_total": self.replayed_total,
+                "rejected_total": self.rejected_total,
+                "replay_rate": round(self.replay_rate, 2),
+                "outage": self.outage,
+                "last_error": self.last_error,
+            }
@@ -0,0 +1,271 @@
+import csv
+import io
+import json
+import os
+import threading
+import time
+
+import psycopg2
+import pytest
+
+from spool import WriteAheadSpool, spool_directory
+
+COLUMNS = ("time", "device_id", "value")
+
+
+class FakeCursor:
+    def __init__(self, conn):
+        self.conn = conn
+
+    def copy_expert(self, sql, buf):
+        if self.conn.fail_after is not None and len(self.conn.copies) >= self.conn.fail_after:
+            raise psycopg2.OperationalError("server closed the connection unexpectedly")
+        rows = list(csv.reader(io.StringIO(buf.read())))
+        if any(self.conn.reject in row for row in rows):
+            raise psycopg2.DataError(f'invalid input syntax for type double precision: "{self.conn.reject}"')
+        self.conn.copies.append((sql, rows))
+
+    def execute(self, sql, params=None):
+        self.conn.statements.append(sql)
+
+    def close(self):
+        pass
+
+
+class FakeConnection:
+    """Stands in for a psycopg2 connection; records every COPY payload"""
+
+    def __init__(self, copies, fail_after=None, reject=None):
+        self.copies = copies
+        self.statements = []
+        self.fail_after = fail_after
+        self.reject = reject
+        self.rollbacks = 0
+        self.closed = False
+
+    def cursor(self):
+        return FakeCursor(self)
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        self.rollbacks += 1
+
+    def close(self):
+        self.closed = True
+
+
+class FlakyDatabase:
+    """connect() raises for the first `down` calls (the database is gone), then succeeds.
+
+    COPY batches containing the value `reject` fail with a DataError, like a malformed row.
+    """
+
+    def __init__(self, down=0, fail_after=None, reject=None):
+        self.down = down
+        self.fail_after = fail_after
+        self.reject = reject
+        self.attempts = 0
+        self.copies = []
+
+    def connect(self):
+        self.attempts += 1
+        if self.attempts <= self.down:
+            raise psycopg2.OperationalError("could not connect to server: Connection refused")
+        return FakeConnection(self.copies, self.fail_after, self.reject)
+
+    @property
+    def rows(self):
+        return [row for _, batch in self.copies for row in batch]
+
+
+def make_rows(start, count):
+    return [(f"2024-01-01T00:00:{i:02d}+00:00", f"dev-{i}", str(i * 1.5)) for i in range(start, start + count)]
+
+
+@pytest.fixture
+def spool(tmp_path):
+    return WriteAheadSpool(str(tmp_path / "sensor_readings"), "sensor_readings", COLUMNS, batch_rows=2)
+
+
+def test_append_during_outage_is_durable(spool, tmp_path):
+    spool.append(make_rows(0, 3))
+    spool.append(make_rows(3, 2))
+
+    assert spool.outage
+    assert spool.depth == 5
+    assert spool.spooled_total == 5
+    # A fresh spool over the same directory (a restart) sees the same backlog
+    restarted = WriteAheadSpool(spool.directory, "sensor_readings", COLUMNS)
+    assert restarted.depth == 5
+
+
+def test_replay_fails_while_database_is_down_then_copies_in_order(spool):
+    db = FlakyDatabase(down=2)
+    spool.append(make_rows(0, 3))
+    spool.append(make_rows(3, 2))
+
+    for _ in range(2):
+        with pytest.raises(psycopg2.OperationalError):
+            spool.replay(db.connect)
+        assert spool.depth == 5
+        assert spool.outage
+
+    assert spool.replay(db.connect) == 5
+    assert [tuple(r) for r in db.rows] == make_rows(0, 5)
+    assert all(sql.startswith("COPY sensor_readings (time, device_id, value)") for sql, _ in db.copies)
+    assert max(len(batch) for _, batch in db.copies) <= 2
+    assert spool.depth == 0
+    assert not spool.outage
+    assert [n for n in os.listdir(spool.directory) if n.endswith(".jsonl")] == []
+
+
+def test_replay_resumes_from_saved_offset_after_partial_failure(spool):
+    spool.append(make_rows(0, 5))
+
+    # Connection drops after the first batch of two has been committed
+    first = FlakyDatabase(fail_after=1)
+    with pytest.raises(psycopg2.OperationalError):
+        spool.replay(first.connect)
+    assert [tuple(r) for r in first.rows] == make_rows(0, 2)
+    assert spool.depth == 3
+    assert spool.outage
+
+    # A restart reads the offset file, so nothing is counted or copied twice
+    restarted = WriteAheadSpool(spool.directory, "sensor_readings", COLUMNS, batch_rows=2)
+    assert restarted.depth == 3
+    second = FlakyDatabase()
+    assert restarted.replay(second.connect) == 3
+    assert [tuple(r) for r in first.rows + second.rows] == make_rows(0, 5)
+    assert restarted.depth == 0
+
+
+class HookLock:
+    """Lock that runs a callback once, right after the next release"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.after_release = None
+
+    def __enter__(self):
+        self.lock.acquire()
+
+    def __exit__(self, *exc):
+        self.lock.release()
+        hook, self.after_release = self.after_release, None
+        if hook:
+            hook()
+
+
+def test_append_during_replay_is_not_lost(spool):
+    spool.append(make_rows(0, 2))
+    spool.lock = HookLock()
+    db = FlakyDatabase()
+
+    # Another writer appends the moment replay() releases the lock after sealing
+    spool.lock.after_release = lambda: spool.append(make_rows(2, 3))
+    assert spool.replay(db.connect) == 2
+    assert spool.depth == 3
+    assert spool.replay(db.connect) == 3
+    assert [tuple(r) for r in db.rows] == make_rows(0, 5)
+    assert spool.depth == 0
+
+
+def test_rejected_batch_is_set_aside_without_an_outage(spool):
+    spool.append(make_rows(0, 2))
+    spool.append([("2024-01-01T00:00:02+00:00", "dev-2", "not-a-number"), make_rows(3, 1)[0]])
+    spool.append(make_rows(4, 2))
+    db = FlakyDatabase(reject="not-a-number")
+
+    # The bad batch is skipped (offset advanced); the batches on either side still go in
+    assert spool.replay(db.connect) == 4
+    assert [tuple(r) for r in db.rows] == make_rows(0, 2) + make_rows(4, 2)
+    assert spool.depth == 0
+    assert not spool.outage
+    assert spool.metrics()["rejected_total"] == 2
+
+    with open(spool.rejected_path) as f:
+        rejected = [json.loads(line) for line in f]
+    assert [r["row"] for r in rejected] == [
+        ["2024-01-01T00:00:02+00:00", "dev-2", "not-a-number"],
+        list(make_rows(3, 1)[0]),
+    ]
+    assert rejected[0]["table"] == "sensor_readings"
+    assert rejected[0]["error"].startswith("invalid input syntax")
+
+    # The rejected file is not a segment: a restart neither counts nor replays it
+    restarted = WriteAheadSpool(spool.directory, "sensor_readings", COLUMNS)
+    assert restarted.depth == 0
+    assert restarted.replay(db.connect) == 0
+
+
+def test_skip_conflicts_stages_through_temp_table(tmp_path):
+    spool = WriteAheadSpool(str(tmp_path / "weather"), "weather_data", COLUMNS, skip_conflicts=True)
+    spool.append(make_rows(0, 2))
+    db = FlakyDatabase()
+    conn = None
+
+    def connect():
+        nonlocal conn
+        conn = db.connect()
+        return conn
+
+    spool.replay(connect)
+    assert db.copies[0][0].startswith("COPY spool_stage")
+    assert any("ON CONFLICT DO NOTHING" in sql for sql in conn.statements)
+
+
+def test_metrics_track_depth_and_replay_rate(spool):
+    spool.append(make_rows(0, 4))
+    m = spool.metrics()
+    assert m["depth"] == 4
+    assert m["segments"] == 1
+    assert m["spooled_total"] == 4
+    assert m["replayed_total"] == 0
+    assert m["replay_rate"] == 0.0
+    assert m["outage"]
+
+    spool.replay(FlakyDatabase().connect)
+    m = spool.metrics()
+    assert m["depth"] == 0
+    assert m["segments"] == 0
+    assert m["replayed_total"] == 4
+    assert m["replay_rate"] > 0
+    assert not m["outage"]
+
+
+def test_background_replayer_backs_off_until_database_returns(spool):
+    db = FlakyDatabase(down=2)
+    spool.append(make_rows(0, 3))
+
+    spool.start_replayer(db.connect, interval=0.01, max_backoff=0.05)
+    try:
+        deadline = time.monotonic() + 5
+        while spool.depth and time.monotonic() < deadline:
+            time.sleep(0.01)
+    finally:
+        spool.stop_replayer()
+
+    assert db.attempts == 3
+    assert spool.depth == 0
+    assert spool.last_error is None
+    assert [tuple(r) for r in db.rows] == make_rows(0, 3)
+
+
+def test_spool_directory_is_per_project_and_database(tmp_path, monkeypatch):
+    monkeypatch.delenv("SPOOL_DIR", raising=False)
+    module8 = str(tmp_path / "module8" / "sensor_ingestion.py")
+    module9 = str(tmp_path / "module9" / "iot_simulator.py")
+    assert spool_directory(module8, "integrations_db", "sensor_readings") == str(
+        tmp_path / "module8" / "spool" / "integrations_db" / "sensor_readings"
+    )
+    assert spool_directory(module9, "iot_monitoring", "sensor_readings") == str(
+        tmp_path / "module9" / "spool" / "iot_monitoring" / "sensor_readings"
+    )
+
+    # A shared SPOOL_DIR still keeps each database's table apart
+    monkeypatch.setenv("SPOOL_DIR", str(tmp_path / "shared"))
+    assert spool_directory(module8, "integrations_db", "sensor_readings") != spool_directory(
+        module9, "iot_monitoring", "sensor_readings"
+    )
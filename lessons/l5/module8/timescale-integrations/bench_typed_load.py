@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+# bench_typed_load.py
+# Load time and memory of analyzer queries with the default load path versus the typed one
+# (datetime64 decoded once, categoricals, float32, JSON left as text).
+#
+#   python3 bench_typed_load.py --hours 24 --repeat 3
+
+import argparse
+import statistics
+import time
+import tracemalloc
+
+import pandas as pd
+
+from data_analysis import TimescaleAnalyzer
+
+QUERIES = {
+    "weather_data": """
+        SELECT time, city, temperature, humidity, pressure, wind_speed
+        FROM weather_data
+        WHERE time >= NOW() - %(window)s::interval
+    """,
+    "sensor_readings": """
+        SELECT time, device_id, sensor_type, value, unit, location, metadata
+        FROM sensor_readings
+        WHERE time >= NOW() - %(window)s::interval
+    """,
+}
+
+
+def parse_args():
+    p = argparse.ArgumentParser()
+    p.add_argument("--hours", type=float, default=2.0, help="look-back window")
+    p.add_argument("--repeat", type=int, default=3)
+    p.add_argument("--tables", default=",".join(QUERIES))
+    return p.parse_args()
+
+
+def load(analyzer, query, params, typed):
+    """One load as the analysis methods do it: fetch, then make sure time is datetime64"""
+    tracemalloc.start()
+    t0 = time.perf_counter()
+    df = analyzer.query_to_dataframe(query, params, typed=typed)
+    if df is not None and not pd.api.types.is_datetime64_any_dtype(df["time"]):
+        df["time"] = pd.to_datetime(df["time"])
+    elapsed = time.perf_counter() - t0
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return df, elapsed, peak
+
+
+def main():
+    args = parse_args()
+    analyzer = TimescaleAnalyzer()
+    params = {"window": f"{args.hours} hours"}
+
+    try:
+        for table in [t for t in args.tables.split(",") if t]:
+            print(f"\n📊 {table} (last {args.hours:g} h, {args.repeat} runs)")
+            frames = {}
+            for label, typed in (("default", False), ("typed", True)):
+                times = []
+                peaks = []
+                for _ in range(args.repeat):
+                    df, elapsed, peak = load(analyzer, QUERIES[table], params, typed)
+                    times.append(elapsed)
+                    peaks.append(peak)
+                if df is None:
+                    print(f"❌ {label} load failed")
+                    return
+                frames[label] = df
+                print(
+                    f"  {label:<8} {len(df):>9} rows | load {statistics.median(times) * 1000:8.1f} ms | "
+                    f"frame {df.memory_usage(deep=True).sum() / 1e6:8.2f} MB | "
+                    f"peak alloc {statistics.median(peaks) / 1e6:8.2f} MB"
+                )
+
+            print(f"  {'column':<14} {'default':>14} {'typed':>14}  dtype")
+            before = frames["default"].memory_usage(deep=True, index=False)
+            after = frames["typed"].memory_usage(deep=True, index=False)
+            for column in frames["typed"].columns:
+                print(
+                    f"  {column:<14} {before[column] / 1e6:>11.2f} MB {after[column] / 1e6:>11.2f} MB  "
+                    f"{frames['default'][column].dtype} -> {frames['typed'][column].dtype}"
+                )
+    finally:
+        analyzer.close()
+
+
+if __name__ == "__main__":
+    main()
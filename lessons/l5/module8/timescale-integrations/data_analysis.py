@@ -1,19 +1,383 @@
 #!/usr/bin/env python3
+import argparse
+import gzip
+import itertools
+import json
 import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, wait
 from datetime import datetime, timedelta
 
 import numpy as np
 import pandas as pd
 import psycopg2
+from psycopg2.extras import register_default_json, register_default_jsonb
+from psycopg2.pool import ThreadedConnectionPool
 import matplotlib.pyplot as plt
 import seaborn as sns
 from dotenv import load_dotenv
+from result_cache import ResultCache
 
 load_dotenv()
 
+# Tables export_data_samples knows about, with the column that identifies a device/site
+EXPORT_TABLES = {"weather_data": "city", "sensor_readings": "device_id"}
+
+TIMESTAMPTZ_OID = 1184
+
+# Low-cardinality text columns loaded as categoricals by the typed load path
+CATEGORY_COLUMNS = ("city", "device_id", "sensor_type", "unit", "location", "api_source")
+# JSON/JSONB columns, kept as text by the typed load path and parsed via the .json accessor
+JSON_COLUMNS = ("metadata",)
+
+
+@pd.api.extensions.register_series_accessor("json")
+class JSONAccessor:
+    """Parse a JSON text column only when it is read: df["metadata"].json.get("battery_level")"""
+
+    def __init__(self, series):
+        self.series = series
+
+    @property
+    def parsed(self):
+        return self.series.map(lambda v: json.loads(v) if isinstance(v, str) else v)
+
+    def get(self, key):
+        return self.parsed.map(lambda d: d.get(key) if isinstance(d, dict) else None)
+
+
+def apply_types(df, float_tolerance=1e-3):
+    """Shrink a query result in place: datetime64 timestamps, categoricals, float32 where exact enough.
+
+    A float64 column becomes float32 only if no value moves by more than float_tolerance.
+    """
+    for column in df.columns:
+        series = df[column]
+        if column == "time" or column.endswith("_time") or column == "bucket":
+            if not pd.api.types.is_datetime64_any_dtype(series):
+                df[column] = pd.to_datetime(series, utc=True)
+        elif column in CATEGORY_COLUMNS and series.dtype != "category":
+            df[column] = series.astype("category")
+        elif series.dtype == np.float64:
+            narrow = series.astype(np.float32)
+            if (narrow.astype(np.float64) - series).abs().max(skipna=True) <= float_tolerance or series.isna().all():
+                df[column] = narrow
+    return df
+
+
+def widen_floats(df):
+    """float32 aggregates back to float64 so rounding prints the same as an untyped load"""
+    return df.astype({c: np.float64 for c in df.columns if df[c].dtype == np.float32})
+
+
+def _arrow_type(type_oid):
+    import pyarrow as pa
+
+    return {
+        16: pa.bool_(),
+        20: pa.int64(),
+        21: pa.int16(),
+        23: pa.int32(),
+        700: pa.float32(),
+        701: pa.float64(),
+        1114: pa.timestamp("us"),
+        TIMESTAMPTZ_OID: pa.timestamp("us"),  # exported AT TIME ZONE 'UTC', tagged UTC afterwards
+    }.get(type_oid, pa.string())
+
+
+class CountingWriter:
+    """File wrapper that counts the bytes COPY writes through it"""
+
+    def __init__(self, raw):
+        self.raw = raw
+        self.bytes = 0
+
+    def write(self, data):
+        if isinstance(data, str):
+            data = data.encode()
+        self.bytes += len(data)
+        return self.raw.write(data)
+
+
+def set_plot_style():
+    plt.style.use("seaborn-v0_8")
+    sns.set_palette("husl")
+
+
+def lttb(x, y, threshold):
+    """Largest-Triangle-Three-Buckets: indices of `threshold` points that keep the shape of (x, y).
+
+    x must be increasing. The first and last points are always kept; from each bucket in between
+    the point forming the largest triangle with the previous pick and the next bucket's mean wins.
+    """
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    edges = np.linspace(1, n - 1, threshold - 1).astype(np.int64)
+
+    picked = np.empty(threshold, dtype=np.int64)
+    picked[0] = 0
+    picked[-1] = n - 1
+    a = 0
+    for i in range(threshold - 2):
+        lo, hi = edges[i], edges[i + 1]
+        if i + 2 < len(edges):
+            next_lo, next_hi = edges[i + 1], edges[i + 2]
+        else:
+            next_lo, next_hi = n - 1, n
+        cx = x[next_lo:next_hi].mean()
+        cy = y[next_lo:next_hi].mean()
+
+        area = np.abs((x[a] - cx) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (cy - y[a]))
+        a = lo + int(np.argmax(area))
+        picked[i + 1] = a
+    return picked
+
+
+def downsample(df, x, y, max_points):
+    """df sorted by x and reduced to at most max_points rows with LTTB on (x, y)"""
+    if max_points is None or len(df) <= max_points:
+        return df
+
+    df = df.dropna(subset=[y]).sort_values(x)
+    xs = df[x]
+    if pd.api.types.is_datetime64_any_dtype(xs):
+        xs = (xs - xs.iloc[0]).dt.total_seconds()
+    return df.iloc[lttb(xs.to_numpy(), df[y].to_numpy(), max_points)]
+
+
+def plot_weather(summary, path, dpi=300, max_points=None):
+    """Draw and save the weather figure; max_points caps each time series via LTTB"""
+    df = summary["series"]
+    cities = summary["cities"]
+
+    fig, axes = plt.subplots(2, 2, figsize=(15, 12))
+    fig.suptitle("Weather Data Analysis", fontsize=16, fontweight="bold")
+
+    # Temperature by city over time
+    for city in cities:
+        city_data = downsample(df[df["city"] == city], "time", "temperature", max_points)
+        axes[0, 0].plot(
+            city_data["time"],
+            city_data["temperature"],
+            marker="o",
+            label=city,
+            linewidth=2,
+        )
+
+    axes[0, 0].set_title("Temperature Over Time by City")
+    axes[0, 0].set_xlabel("Time")
+    axes[0, 0].set_ylabel("Temperature (°C)")
+    axes[0, 0].legend()
+    axes[0, 0].grid(True, alpha=0.3)
+    axes[0, 0].tick_params(axis="x", rotation=45)
+
+    # Current temperature comparison
+    latest_data = summary["latest"]
+    bars = axes[0, 1].bar(latest_data.index, latest_data.values)
+    axes[0, 1].set_title("Current Temperature by City")
+    axes[0, 1].set_ylabel("Temperature (°C)")
+    axes[0, 1].tick_params(axis="x", rotation=45)
+
+    for bar in bars:
+        height = bar.get_height()
+        axes[0, 1].text(
+            bar.get_x() + bar.get_width() / 2.0,
+            height,
+            f"{height:.1f}°C",
+            ha="center",
+            va="bottom",
+        )
+
+    # Humidity vs Temperature scatter
+    colors = plt.cm.viridis(np.linspace(0, 1, len(cities)))
+    for i, city in enumerate(cities):
+        city_data = downsample(df[df["city"] == city], "time", "temperature", max_points)
+        axes[1, 0].scatter(
+            city_data["temperature"],
+            city_data["humidity"],
+            label=city,
+            alpha=0.7,
+            s=60,
+            color=colors[i],
+        )
+
+    axes[1, 0].set_title("Humidity vs Temperature")
+    axes[1, 0].set_xlabel("Temperature (°C)")
+    axes[1, 0].set_ylabel("Humidity (%)")
+    axes[1, 0].legend()
+    axes[1, 0].grid(True, alpha=0.3)
+
+    # Heatmap of average values
+    heatmap_data = summary["heatmap_data"]
+    im = axes[1, 1].imshow(heatmap_data.T, cmap="YlOrRd", aspect="auto")
+    axes[1, 1].set_title("Average Weather Metrics Heatmap")
+    axes[1, 1].set_xticks(range(len(heatmap_data.index)))
+    axes[1, 1].set_xticklabels(heatmap_data.index, rotation=45)
+    axes[1, 1].set_yticks(range(len(heatmap_data.columns)))
+    axes[1, 1].set_yticklabels(heatmap_data.columns)
+
+    plt.colorbar(im, ax=axes[1, 1])
+
+    for i in range(len(heatmap_data.index)):
+        for j in range(len(heatmap_data.columns)):
+            axes[1, 1].text(
+                i,
+                j,
+                f"{heatmap_data.iloc[i, j]:.1f}",
+                ha="center",
+                va="center",
+                color="black",
+            )
+
+    plt.tight_layout()
+    plt.savefig(path, dpi=dpi, bbox_inches="tight")
+    return fig
+
+
+def plot_sensors(summary, path, dpi=300, max_points=None):
+    """Draw and save the sensor figure; max_points caps each time series via LTTB"""
+    df = summary["series"]
+
+    fig, axes = plt.subplots(2, 2, figsize=(15, 12))
+    fig.suptitle("IoT Sensor Data Analysis", fontsize=16, fontweight="bold")
+
+    # Temperature sensors over time
+    temp_data = df[df["sensor_type"] == "temperature"]
+    if not temp_data.empty:
+        for device in temp_data["device_id"].unique():
+            device_data = downsample(temp_data[temp_data["device_id"] == device], "time", "value", max_points)
+            axes[0, 0].plot(
+                device_data["time"],
+                device_data["value"],
+                marker="o",
+                label=device,
+                linewidth=2,
+            )
+
+        axes[0, 0].set_title("Temperature Sensors Over Time")
+        axes[0, 0].set_xlabel("Time")
+        axes[0, 0].set_ylabel("Temperature (°C)")
+        axes[0, 0].legend()
+        axes[0, 0].grid(True, alpha=0.3)
+        axes[0, 0].tick_params(axis="x", rotation=45)
+
+    # Sensor type distribution
+    sensor_counts = summary["sensor_counts"]
+    bars = axes[0, 1].bar(sensor_counts.index, sensor_counts.values)
+    axes[0, 1].set_title("Sensor Reading Count by Type")
+    axes[0, 1].set_ylabel("Number of Readings")
+    axes[0, 1].tick_params(axis="x", rotation=45)
+
+    for bar in bars:
+        height = bar.get_height()
+        axes[0, 1].text(
+            bar.get_x() + bar.get_width() / 2.0,
+            height,
+            f"{int(height)}",
+            ha="center",
+            va="bottom",
+        )
+
+    # Humidity sensor readings
+    humidity_data = downsample(df[df["sensor_type"] == "humidity"], "time", "value", max_points)
+    if not humidity_data.empty:
+        axes[1, 0].plot(humidity_data["time"], humidity_data["value"], "g-o", linewidth=2)
+        axes[1, 0].set_title("Humidity Sensor Readings")
+        axes[1, 0].set_xlabel("Time")
+        axes[1, 0].set_ylabel("Humidity (%)")
+        axes[1, 0].grid(True, alpha=0.3)
+        axes[1, 0].tick_params(axis="x", rotation=45)
+    else:
+        axes[1, 0].text(
+            0.5,
+            0.5,
+            "No humidity data available",
+            ha="center",
+            va="center",
+            transform=axes[1, 0].transAxes,
+        )
+
+    # Latest sensor values by location heatmap
+    latest_readings = summary["latest_readings"]
+    pivot_data = latest_readings.pivot_table(
+        index="location",
+        columns="sensor_type",
+        values="value",
+        aggfunc="mean",
+        observed=True,
+    )
+
+    if not pivot_data.empty:
+        sns.heatmap(pivot_data, annot=True, fmt=".1f", cmap="viridis", ax=axes[1, 1])
+        axes[1, 1].set_title("Latest Sensor Values by Location")
+    else:
+        axes[1, 1].text(
+            0.5,
+            0.5,
+            "Insufficient data for heatmap",
+            ha="center",
+            va="center",
+            transform=axes[1, 1].transAxes,
+        )
+
+    plt.tight_layout()
+    plt.savefig(path, dpi=dpi, bbox_inches="tight")
+    return fig
+
+
+def plot_dashboard(data, path, dpi=300, max_points=None):
+    """Draw and save the combined dashboard from create_combined_dashboard's bucketed queries"""
+    fig, axes = plt.subplots(1, 2, figsize=(18, 6))
+    fig.suptitle("Combined Data Dashboard", fontsize=16, fontweight="bold")
+
+    weather = data.get("weather")
+    if weather is not None:
+        for city in weather["city"].unique():
+            city_data = downsample(weather[weather["city"] == city], "bucket", "avg_temp", max_points)
+            axes[0].plot(city_data["bucket"], city_data["avg_temp"], marker="o", label=city, linewidth=2)
+        axes[0].legend()
+    axes[0].set_title("Hourly Average Temperature by City")
+    axes[0].set_xlabel("Time")
+    axes[0].set_ylabel("Temperature (°C)")
+    axes[0].grid(True, alpha=0.3)
+    axes[0].tick_params(axis="x", rotation=45)
+
+    sensors = data.get("sensors")
+    if sensors is not None:
+        for (sensor_type, location), group in sensors.groupby(["sensor_type", "location"], observed=True):
+            group = downsample(group, "bucket", "avg_value", max_points)
+            axes[1].plot(group["bucket"], group["avg_value"], marker="o", label=f"{sensor_type} @ {location}")
+        axes[1].legend()
+    axes[1].set_title("15-Minute Average Sensor Values")
+    axes[1].set_xlabel("Time")
+    axes[1].set_ylabel("Value")
+    axes[1].grid(True, alpha=0.3)
+    axes[1].tick_params(axis="x", rotation=45)
+
+    plt.tight_layout()
+    plt.savefig(path, dpi=dpi, bbox_inches="tight")
+    return fig
+
+
+def render_headless(plot, payload, path, dpi, max_points):
+    """Worker-process entry point: draw one figure off-screen and return (path, seconds)"""
+    plt.switch_backend("Agg")
+    set_plot_style()
+    t0 = time.perf_counter()
+    fig = plot(payload, path, dpi=dpi, max_points=max_points)
+    plt.close(fig)
+    return path, time.perf_counter() - t0
+
 
 class TimescaleAnalyzer:
-    def __init__(self):
+    def __init__(self, pool_size=4, chunk_rows=50000, max_chunk_mb=256, server_side=False, plot_points=500,
+                 use_cache=False, cache_dir=None, typed=False, headless=False, render_workers=None,
+                 render_dpi=100, max_plot_points=None, query_timeout=30.0):
         self.db_config = {
             "host": os.getenv("DB_HOST", "localhost"),
             "port": int(os.getenv("DB_PORT", "5432")),
@@ -22,9 +386,46 @@ class TimescaleAnalyzer:
             "password": os.getenv("DB_PASSWORD", "admin123"),
         }
 
+        # Connections are reused across queries instead of opened per call
+        self.pool_size = pool_size
+        self.pool = None
+        self.pool_lock = threading.Lock()
+
+        # Streaming reads fetch chunk_rows at a time, shrunk so one chunk stays under max_chunk_mb
+        self.chunk_rows = chunk_rows
+        self.max_chunk_mb = max_chunk_mb
+        self.cursor_ids = itertools.count()
+
+        # server_side: summaries are computed in the database and plots get at most
+        # plot_points time buckets per series instead of every raw row
+        self.server_side = server_side
+        self.plot_points = plot_points
+
+        # use_cache: raw look-back queries are served from a local Parquet cache and only rows
+        # newer than its high-water mark are fetched
+        self.use_cache = use_cache
+        self.cache = ResultCache(cache_dir or os.getenv("ANALYZER_CACHE_DIR", ".analyzer_cache"))
+
+        # typed: results come back with datetime64 timestamps, categorical text, float32 values
+        # and JSON left as text (see apply_types / JSONAccessor)
+        self.typed = typed
+
+        # headless: figures are queued and drawn off-screen in worker processes by flush_renders(),
+        # at render_dpi, with each series cut to about one point per horizontal pixel via LTTB
+        self.headless = headless
+        self.render_workers = render_workers or min(3, os.cpu_count() or 1)
+        self.render_dpi = render_dpi
+        self.max_plot_points = max_plot_points
+        self.pending_renders = []
+        if headless:
+            plt.switch_backend("Agg")
+
+        # Per-query statement timeout (seconds) for run_queries; the latest run's report is kept
+        self.query_timeout = query_timeout
+        self.query_report = {}
+
         # Plot style
-        plt.style.use("seaborn-v0_8")
-        sns.set_palette("husl")
+        set_plot_style()
 
     def connect_db(self):
         """Create database connection"""
@@ -34,24 +435,275 @@ class TimescaleAnalyzer:
             print(f"❌ Database connection failed: {e}")
             return None
 
-    def query_to_dataframe(self, query, params=None):
+    def get_pool(self):
+        """Create the shared connection pool on first use"""
+        with self.pool_lock:
+            if self.pool is None:
+                try:
+                    self.pool = ThreadedConnectionPool(1, self.pool_size, **self.db_config)
+                except Exception as e:
+                    print(f"❌ Database connection failed: {e}")
+            return self.pool
+
+    def close(self):
+        with self.pool_lock:
+            if self.pool is not None:
+                self.pool.closeall()
+                self.pool = None
+
+    def query_to_dataframe(self, query, params=None, typed=None, timeout=None):
         """Execute query and return pandas DataFrame"""
-        conn = self.connect_db()
-        if not conn:
+        if self.get_pool() is None:
             return None
 
         try:
-            return pd.read_sql_query(query, conn, params=params)
+            return self.read_dataframe(query, params, typed, timeout)
         except Exception as e:
             print(f"❌ Query failed: {e}")
             return None
+
+    def read_dataframe(self, query, params=None, typed=None, timeout=None, on_connection=None):
+        """query_to_dataframe that raises instead of printing; timeout is in seconds.
+
+        on_connection is called with the pooled connection once it is taken and with None just
+        before it goes back, so a caller can cancel the running query from another thread.
+        """
+        pool = self.get_pool()
+        if pool is None:
+            raise psycopg2.OperationalError("database connection unavailable")
+
+        typed = self.typed if typed is None else typed
+        conn = pool.getconn()
+        broken = False
+        if on_connection:
+            on_connection(conn)
+        try:
+            if timeout:
+                # SET LOCAL lasts until the rollback below returns the connection to the pool
+                conn.cursor().execute("SET LOCAL statement_timeout = %s", (int(timeout * 1000),))
+
+            if not typed:
+                return pd.read_sql_query(query, conn, params=params)
+
+            cursor = conn.cursor()
+            # Leave JSON as text on this cursor; it is parsed on demand through .json
+            register_default_json(cursor, loads=lambda text: text)
+            register_default_jsonb(cursor, loads=lambda text: text)
+            cursor.execute(query, params)
+            df = pd.DataFrame.from_records(cursor.fetchall(), columns=[c.name for c in cursor.description])
+            cursor.close()
+            return apply_types(df)
+        except Exception:
+            broken = conn.closed != 0
+            raise
         finally:
-            conn.close()
+            if on_connection:
+                on_connection(None)
+            if not broken:
+                conn.rollback()
+            pool.putconn(conn, close=broken)
 
-    def analyze_weather_data(self):
-        """Analyze weather data and create visualizations"""
-        print("🌤️  Analyzing weather data...")
+    def run_queries(self, queries, timeout=None, max_workers=None):
+        """Run named queries concurrently on pooled connections.
+
+        queries maps a name to SQL or (SQL, params). Returns (frames, report): frames holds the
+        DataFrames of the queries that succeeded, report the status ("ok", "timeout", "error"),
+        latency and row count or error of every query. A failed query never holds back the rest.
+        """
+        timeout = self.query_timeout if timeout is None else timeout
+        if self.get_pool() is None:
+            return {}, {name: {"status": "error", "latency_s": 0.0, "error": "no database connection"} for name in queries}
+
+        # Connections currently running a query, so the deadline below can cancel them
+        inflight = {}
+        inflight_lock = threading.Lock()
+
+        def run(name):
+            query = queries[name]
+            sql, params = query if isinstance(query, tuple) else (query, None)
+
+            def track(conn):
+                with inflight_lock:
+                    if conn is None:
+                        inflight.pop(name, None)
+                    else:
+                        inflight[name] = conn
+
+            t0 = time.perf_counter()
+            try:
+                df = self.read_dataframe(sql, params, timeout=timeout, on_connection=track)
+                return df, {"status": "ok", "latency_s": time.perf_counter() - t0, "rows": len(df)}
+            except psycopg2.errors.QueryCanceled as e:
+                status, error = "timeout", str(e).strip() or type(e).__name__
+            except Exception as e:
+                status, error = "error", str(e).strip() or type(e).__name__
+            return None, {"status": status, "latency_s": time.perf_counter() - t0, "error": error}
+
+        frames = {}
+        report = {}
+        # Never more threads than pooled connections: getconn() fails rather than waits when exhausted
+        workers = max(1, min(len(queries), max_workers or self.pool_size, self.pool_size))
+        executor = ThreadPoolExecutor(max_workers=workers)
+        t0 = time.perf_counter()
+        futures = {executor.submit(run, name): name for name in queries}
+
+        # The server enforces the timeout; the client deadline only covers a hung connection
+        done, not_done = wait(futures, timeout=timeout * len(queries) / workers + 5 if timeout else None)
+        for future in done:
+            name = futures[future]
+            df, report[name] = future.result()
+            if df is not None:
+                frames[name] = df
+        for future in not_done:
+            report[futures[future]] = {
+                "status": "timeout",
+                "latency_s": time.perf_counter() - t0,
+                "error": "no response before the client deadline",
+            }
+        executor.shutdown(wait=False, cancel_futures=True)
+
+        if not_done:
+            # Stop the backends of queries still running; each worker then rolls back and returns
+            # its connection to the pool, so hung panels don't starve the next refresh
+            with inflight_lock:
+                for conn in inflight.values():
+                    try:
+                        conn.cancel()
+                    except psycopg2.Error:
+                        pass
+            _, stuck = wait(not_done, timeout=5)
+            if stuck:
+                print(f"⚠️  {len(stuck)} cancelled queries still hold a pooled connection")
+
+        report = {name: report[name] for name in queries}
+        self.query_report = report
+        return frames, report
+
+    def stream_query(self, query, params=None, chunk_rows=None, max_chunk_mb=None):
+        """Yield the result of query as DataFrames read through a server-side cursor.
+
+        At most chunk_rows rows are held per chunk; after each chunk the fetch size is lowered
+        if needed so a chunk's DataFrame stays under max_chunk_mb. The pooled connection is
+        returned when the generator is exhausted or closed.
+        """
+        chunk_rows = chunk_rows or self.chunk_rows
+        ceiling = (max_chunk_mb or self.max_chunk_mb) * 1024 * 1024
+
+        pool = self.get_pool()
+        if pool is None:
+            return
+
+        conn = pool.getconn()
+        broken = False
+        try:
+            cursor = conn.cursor(name=f"analyzer_stream_{next(self.cursor_ids)}")
+            cursor.itersize = chunk_rows
+            cursor.execute(query, params)
+
+            fetch = chunk_rows
+            while True:
+                rows = cursor.fetchmany(fetch)
+                if not rows:
+                    break
+                df = pd.DataFrame(rows, columns=[c.name for c in cursor.description])
+
+                row_bytes = df.memory_usage(deep=True).sum() / len(df)
+                fetch = max(1, min(chunk_rows, int(ceiling // max(row_bytes, 1))))
+                yield df
+
+            cursor.close()
+        except (psycopg2.OperationalError, psycopg2.InterfaceError):
+            broken = True
+            raise
+        finally:
+            if not broken:
+                conn.rollback()
+            pool.putconn(conn, close=broken)
+
+    def cached_query(self, query, window, params=None, overlap=timedelta(0)):
+        """Run a look-back query through the result cache.
+
+        query must filter with ``time > %(since)s``; window is a timedelta.
+        """
+        t0 = datetime.now()
+        df = self.cache.fetch(self.query_to_dataframe, query, window, params, overlap=overlap)
+        elapsed_ms = (datetime.now() - t0).total_seconds() * 1000
+        if df is not None:
+            print(f"🗄️  Cache: {len(df)} rows in window, refreshed in {elapsed_ms:.0f} ms")
+        return df
+
+    def invalidate_cache(self, query=None, window=None, params=None):
+        self.cache.invalidate(query, window, params)
+
+    def fold_query(self, query, fold, initial, params=None, chunk_rows=None, max_chunk_mb=None):
+        """Reduce a streamed result chunk by chunk: acc = fold(acc, df) for each chunk"""
+        acc = initial
+        for df in self.stream_query(query, params, chunk_rows, max_chunk_mb):
+            acc = fold(acc, df)
+        return acc
+
+    def stream_group_stats(self, query, by, value, params=None, chunk_rows=None, max_chunk_mb=None):
+        """count / mean / min / max of value per group, without holding the full result"""
+
+        def fold(acc, df):
+            part = df.groupby(by)[value].agg(["count", "sum", "min", "max"])
+            if acc is None:
+                return part
+            merged = acc.add(part[["count", "sum"]], fill_value=0)
+            merged["min"] = pd.concat([acc["min"], part["min"]], axis=1).min(axis=1)
+            merged["max"] = pd.concat([acc["max"], part["max"]], axis=1).max(axis=1)
+            return merged
+
+        stats = self.fold_query(query, fold, None, params, chunk_rows, max_chunk_mb)
+        if stats is None:
+            return None
+        stats["count"] = stats["count"].astype(int)
+        stats["mean"] = stats["sum"] / stats["count"]
+        return stats[["count", "mean", "min", "max"]]
+
+    def render(self, plot, payload, path):
+        """Draw a figure now (interactive) or queue it for flush_renders() (headless)"""
+        if self.headless:
+            self.pending_renders.append((plot, payload, path))
+            return
+
+        t0 = time.perf_counter()
+        plot(payload, path)
+        print(f"🖼️  Rendered {path} in {time.perf_counter() - t0:.2f} s")
+        plt.show()
 
+    def flush_renders(self):
+        """Render every queued figure in parallel worker processes"""
+        jobs, self.pending_renders = self.pending_renders, []
+        if not jobs:
+            return {}
+
+        # A 2-column figure 15 in wide gives each panel about 7.5 in of horizontal pixels
+        max_points = self.max_plot_points or int(7.5 * self.render_dpi)
+        timings = {}
+        t0 = time.perf_counter()
+        with ProcessPoolExecutor(max_workers=min(self.render_workers, len(jobs))) as pool:
+            futures = [
+                pool.submit(render_headless, plot, payload, path, self.render_dpi, max_points)
+                for plot, payload, path in jobs
+            ]
+            for future in futures:
+                try:
+                    path, seconds = future.result()
+                except Exception as e:
+                    print(f"❌ Render failed: {e}")
+                    continue
+                timings[path] = seconds
+                print(f"🖼️  Rendered {path} in {seconds:.2f} s")
+        print(f"🖼️  {len(timings)} figure(s) rendered in {time.perf_counter() - t0:.2f} s wall time")
+        return timings
+
+    def plot_bucket(self, window_seconds):
+        """time_bucket width that gives at most plot_points buckets over the window"""
+        return f"{max(1, -(-window_seconds // self.plot_points))} seconds"
+
+    def weather_summary_client(self):
+        """Fetch raw weather rows and summarise them in pandas"""
         query = """
             SELECT
                 time,
@@ -65,121 +717,141 @@ class TimescaleAnalyzer:
             ORDER BY time DESC, city
         """
 
-        df = self.query_to_dataframe(query)
+        if self.use_cache:
+            df = self.cached_query(
+                """
+                SELECT time, city, temperature, humidity, pressure, wind_speed
+                FROM weather_data
+                WHERE time > %(since)s
+                """,
+                timedelta(hours=24),
+            )
+            if df is not None:
+                df = df.sort_values(["time", "city"], ascending=[False, True]).reset_index(drop=True)
+                if self.typed:
+                    df = apply_types(df)
+        else:
+            df = self.query_to_dataframe(query)
         if df is None or df.empty:
-            print("❌ No weather data found")
             return None
 
-        print(f"📊 Found {len(df)} weather records")
-        print(f"🏙️  Cities: {', '.join(df['city'].unique())}")
-
-        df["time"] = pd.to_datetime(df["time"])
+        if not pd.api.types.is_datetime64_any_dtype(df["time"]):
+            df["time"] = pd.to_datetime(df["time"])
+        return {
+            "records": len(df),
+            "cities": list(df["city"].unique()),
+            "series": df,
+            "latest": df.groupby("city", observed=True).last()["temperature"],
+            "summary_stats": (
+                df.groupby("city", observed=True)
+                .agg(
+                    {
+                        "temperature": ["mean", "min", "max"],
+                        "humidity": "mean",
+                        "wind_speed": "mean",
+                    }
+                )
+                .pipe(widen_floats)
+                .round(2)
+            ),
+            "heatmap_data": df.groupby("city", observed=True)[["temperature", "humidity", "wind_speed"]].mean(),
+        }
 
-        fig, axes = plt.subplots(2, 2, figsize=(15, 12))
-        fig.suptitle("Weather Data Analysis", fontsize=16, fontweight="bold")
+    def weather_summary_server(self):
+        """Summarise weather in the database; only bucketed points come back for plotting"""
+        stats = self.query_to_dataframe(
+            """
+            SELECT
+                city,
+                COUNT(*) AS records,
+                MAX(time) AS latest_time,
+                -- groupby().last() over rows ordered newest-first picks the oldest non-null value
+                first(temperature, time) FILTER (WHERE temperature IS NOT NULL) AS bar_temperature,
+                AVG(temperature) AS temperature_mean,
+                MIN(temperature) AS temperature_min,
+                MAX(temperature) AS temperature_max,
+                AVG(humidity)::DOUBLE PRECISION AS humidity_mean,
+                AVG(wind_speed) AS wind_speed_mean
+            FROM weather_data
+            WHERE time >= NOW() - INTERVAL '24 hours'
+            GROUP BY city
+            ORDER BY city
+            """
+        )
+        if stats is None or stats.empty:
+            return None
 
-        # Temperature by city over time
-        for city in df["city"].unique():
-            city_data = df[df["city"] == city]
-            axes[0, 0].plot(
-                city_data["time"],
-                city_data["temperature"],
-                marker="o",
-                label=city,
-                linewidth=2,
-            )
+        series = self.query_to_dataframe(
+            """
+            SELECT
+                time_bucket(%s::interval, time) AS time,
+                city,
+                AVG(temperature) AS temperature,
+                AVG(humidity)::DOUBLE PRECISION AS humidity
+            FROM weather_data
+            WHERE time >= NOW() - INTERVAL '24 hours'
+            GROUP BY 1, city
+            ORDER BY 1 DESC, city
+            """,
+            (self.plot_bucket(24 * 3600),),
+        )
+        if series is None:
+            return None
+        series["time"] = pd.to_datetime(series["time"])
 
-        axes[0, 0].set_title("Temperature Over Time by City")
-        axes[0, 0].set_xlabel("Time")
-        axes[0, 0].set_ylabel("Temperature (°C)")
-        axes[0, 0].legend()
-        axes[0, 0].grid(True, alpha=0.3)
-        axes[0, 0].tick_params(axis="x", rotation=45)
+        # Cities in order of first appearance in the newest-first raw result
+        order = stats.sort_values(["latest_time", "city"], ascending=[False, True])
+        # Sorted here rather than by ORDER BY city: the database collation may order names
+        # differently from the codepoint order groupby() uses on the client path
+        stats = stats.set_index("city").sort_index()
+        value_columns = [c for c in stats.columns if c not in ("records", "latest_time")]
+        stats[value_columns] = stats[value_columns].astype(float)
 
-        # Current temperature comparison
-        latest_data = df.groupby("city").last()
-        bars = axes[0, 1].bar(latest_data.index, latest_data["temperature"])
-        axes[0, 1].set_title("Current Temperature by City")
-        axes[0, 1].set_ylabel("Temperature (°C)")
-        axes[0, 1].tick_params(axis="x", rotation=45)
-
-        for bar in bars:
-            height = bar.get_height()
-            axes[0, 1].text(
-                bar.get_x() + bar.get_width() / 2.0,
-                height,
-                f"{height:.1f}°C",
-                ha="center",
-                va="bottom",
-            )
+        summary_stats = pd.DataFrame(
+            {
+                ("temperature", "mean"): stats["temperature_mean"],
+                ("temperature", "min"): stats["temperature_min"],
+                ("temperature", "max"): stats["temperature_max"],
+                ("humidity", "mean"): stats["humidity_mean"],
+                ("wind_speed", "mean"): stats["wind_speed_mean"],
+            }
+        ).round(2)
+        heatmap_data = stats[["temperature_mean", "humidity_mean", "wind_speed_mean"]]
+        heatmap_data.columns = ["temperature", "humidity", "wind_speed"]
 
-        # Humidity vs Temperature scatter
-        colors = plt.cm.viridis(np.linspace(0, 1, len(df["city"].unique())))
-        for i, city in enumerate(df["city"].unique()):
-            city_data = df[df["city"] == city]
-            axes[1, 0].scatter(
-                city_data["temperature"],
-                city_data["humidity"],
-                label=city,
-                alpha=0.7,
-                s=60,
-                color=colors[i],
-            )
+        return {
+            "records": int(stats["records"].sum()),
+            "cities": list(order["city"]),
+            "series": series,
+            "latest": stats["bar_temperature"].rename("temperature"),
+            "summary_stats": summary_stats,
+            "heatmap_data": heatmap_data,
+        }
 
-        axes[1, 0].set_title("Humidity vs Temperature")
-        axes[1, 0].set_xlabel("Temperature (°C)")
-        axes[1, 0].set_ylabel("Humidity (%)")
-        axes[1, 0].legend()
-        axes[1, 0].grid(True, alpha=0.3)
+    def analyze_weather_data(self, server_side=None):
+        """Analyze weather data and create visualizations"""
+        print("🌤️  Analyzing weather data...")
 
-        # Weather summary statistics
-        summary_stats = (
-            df.groupby("city")
-            .agg(
-                {
-                    "temperature": ["mean", "min", "max"],
-                    "humidity": "mean",
-                    "wind_speed": "mean",
-                }
-            )
-            .round(2)
-        )
+        server_side = self.server_side if server_side is None else server_side
+        summary = self.weather_summary_server() if server_side else self.weather_summary_client()
+        if summary is None:
+            print("❌ No weather data found")
+            return None
 
-        # Heatmap of average values
-        heatmap_data = df.groupby("city")[["temperature", "humidity", "wind_speed"]].mean()
-        im = axes[1, 1].imshow(heatmap_data.T, cmap="YlOrRd", aspect="auto")
-        axes[1, 1].set_title("Average Weather Metrics Heatmap")
-        axes[1, 1].set_xticks(range(len(heatmap_data.index)))
-        axes[1, 1].set_xticklabels(heatmap_data.index, rotation=45)
-        axes[1, 1].set_yticks(range(len(heatmap_data.columns)))
-        axes[1, 1].set_yticklabels(heatmap_data.columns)
-
-        plt.colorbar(im, ax=axes[1, 1])
-
-        for i in range(len(heatmap_data.index)):
-            for j in range(len(heatmap_data.columns)):
-                axes[1, 1].text(
-                    i,
-                    j,
-                    f"{heatmap_data.iloc[i, j]:.1f}",
-                    ha="center",
-                    va="center",
-                    color="black",
-                )
+        df = summary["series"]
+        cities = summary["cities"]
+        print(f"📊 Found {summary['records']} weather records")
+        print(f"🏙️  Cities: {', '.join(cities)}")
 
-        plt.tight_layout()
-        plt.savefig("weather_analysis.png", dpi=300, bbox_inches="tight")
-        plt.show()
+        self.render(plot_weather, summary, "weather_analysis.png")
 
         print("\n📈 Weather Summary Statistics:")
-        print(summary_stats)
+        print(summary["summary_stats"])
 
         return df
 
-    def analyze_sensor_data(self):
-        """Analyze IoT sensor data"""
-        print("\n📡 Analyzing sensor data...")
-
+    def sensor_summary_client(self):
+        """Fetch raw sensor rows and summarise them in pandas"""
         query = """
             SELECT
                 time,
@@ -194,108 +866,132 @@ class TimescaleAnalyzer:
             ORDER BY time DESC
         """
 
-        df = self.query_to_dataframe(query)
+        if self.use_cache:
+            df = self.cached_query(
+                """
+                SELECT time, device_id, sensor_type, value, unit, location, metadata
+                FROM sensor_readings
+                WHERE time > %(since)s
+                """,
+                timedelta(hours=2),
+            )
+            if df is not None:
+                df = df.sort_values("time", ascending=False, kind="stable").reset_index(drop=True)
+                if self.typed:
+                    df = apply_types(df)
+        else:
+            df = self.query_to_dataframe(query)
         if df is None or df.empty:
-            print("❌ No sensor data found")
             return None
 
-        print(f"📊 Found {len(df)} sensor readings")
-        print(f"🏭 Locations: {', '.join(df['location'].unique())}")
-
-        df["time"] = pd.to_datetime(df["time"])
-
-        fig, axes = plt.subplots(2, 2, figsize=(15, 12))
-        fig.suptitle("IoT Sensor Data Analysis", fontsize=16, fontweight="bold")
-
-        # Temperature sensors over time
-        temp_data = df[df["sensor_type"] == "temperature"]
-        if not temp_data.empty:
-            for device in temp_data["device_id"].unique():
-                device_data = temp_data[temp_data["device_id"] == device]
-                axes[0, 0].plot(
-                    device_data["time"],
-                    device_data["value"],
-                    marker="o",
-                    label=device,
-                    linewidth=2,
-                )
-
-            axes[0, 0].set_title("Temperature Sensors Over Time")
-            axes[0, 0].set_xlabel("Time")
-            axes[0, 0].set_ylabel("Temperature (°C)")
-            axes[0, 0].legend()
-            axes[0, 0].grid(True, alpha=0.3)
-            axes[0, 0].tick_params(axis="x", rotation=45)
-
-        # Sensor type distribution
-        sensor_counts = df["sensor_type"].value_counts()
-        bars = axes[0, 1].bar(sensor_counts.index, sensor_counts.values)
-        axes[0, 1].set_title("Sensor Reading Count by Type")
-        axes[0, 1].set_ylabel("Number of Readings")
-        axes[0, 1].tick_params(axis="x", rotation=45)
-
-        for bar in bars:
-            height = bar.get_height()
-            axes[0, 1].text(
-                bar.get_x() + bar.get_width() / 2.0,
-                height,
-                f"{int(height)}",
-                ha="center",
-                va="bottom",
-            )
+        if not pd.api.types.is_datetime64_any_dtype(df["time"]):
+            df["time"] = pd.to_datetime(df["time"])
+        latest_readings = df.loc[df.groupby(["location", "sensor_type"], observed=True)["time"].idxmax()]
+        return {
+            "records": len(df),
+            "locations": list(df["location"].unique()),
+            "series": df,
+            "sensor_counts": df["sensor_type"].value_counts(),
+            "latest_readings": latest_readings,
+            "summary": (
+                df.groupby(["location", "sensor_type"], observed=True)
+                .agg({"value": ["count", "mean", "min", "max"]})
+                .pipe(widen_floats)
+                .round(2)
+            ),
+        }
 
-        # Humidity sensor readings
-        humidity_data = df[df["sensor_type"] == "humidity"]
-        if not humidity_data.empty:
-            axes[1, 0].plot(humidity_data["time"], humidity_data["value"], "g-o", linewidth=2)
-            axes[1, 0].set_title("Humidity Sensor Readings")
-            axes[1, 0].set_xlabel("Time")
-            axes[1, 0].set_ylabel("Humidity (%)")
-            axes[1, 0].grid(True, alpha=0.3)
-            axes[1, 0].tick_params(axis="x", rotation=45)
-        else:
-            axes[1, 0].text(
-                0.5,
-                0.5,
-                "No humidity data available",
-                ha="center",
-                va="center",
-                transform=axes[1, 0].transAxes,
-            )
+    def sensor_summary_server(self):
+        """Summarise sensor readings in the database; only bucketed points come back for plotting"""
+        stats = self.query_to_dataframe(
+            """
+            SELECT
+                location,
+                sensor_type,
+                COUNT(*) AS readings,
+                COUNT(value) AS value_count,
+                MAX(time) AS latest_time,
+                last(value, time) AS latest_value,
+                AVG(value) AS value_mean,
+                MIN(value) AS value_min,
+                MAX(value) AS value_max
+            FROM sensor_readings
+            WHERE time >= NOW() - INTERVAL '2 hours'
+            GROUP BY location, sensor_type
+            ORDER BY location, sensor_type
+            """
+        )
+        if stats is None or stats.empty:
+            return None
 
-        # Latest sensor values by location heatmap
-        latest_readings = df.loc[df.groupby(["location", "sensor_type"])["time"].idxmax()]
-        pivot_data = latest_readings.pivot_table(
-            index="location",
-            columns="sensor_type",
-            values="value",
-            aggfunc="mean",
+        series = self.query_to_dataframe(
+            """
+            SELECT
+                time_bucket(%s::interval, time) AS time,
+                device_id,
+                sensor_type,
+                AVG(value) AS value
+            FROM sensor_readings
+            WHERE time >= NOW() - INTERVAL '2 hours'
+              AND sensor_type IN ('temperature', 'humidity')
+            GROUP BY 1, device_id, sensor_type
+            ORDER BY 1 DESC, device_id
+            """,
+            (self.plot_bucket(2 * 3600),),
         )
+        if series is None:
+            return None
+        series["time"] = pd.to_datetime(series["time"])
 
-        if not pivot_data.empty:
-            sns.heatmap(pivot_data, annot=True, fmt=".1f", cmap="viridis", ax=axes[1, 1])
-            axes[1, 1].set_title("Latest Sensor Values by Location")
-        else:
-            axes[1, 1].text(
-                0.5,
-                0.5,
-                "Insufficient data for heatmap",
-                ha="center",
-                va="center",
-                transform=axes[1, 1].transAxes,
-            )
+        # Codepoint order, as groupby() gives the client path (ORDER BY follows the collation)
+        stats = stats.sort_values(["location", "sensor_type"]).reset_index(drop=True)
+        for column in ("latest_value", "value_mean", "value_min", "value_max"):
+            stats[column] = stats[column].astype(float)
 
-        plt.tight_layout()
-        plt.savefig("sensor_analysis.png", dpi=300, bbox_inches="tight")
-        plt.show()
+        # Orderings match first appearance in the newest-first raw result
+        locations = stats.groupby("location")["latest_time"].max().reset_index()
+        locations = locations.sort_values(["latest_time", "location"], ascending=[False, True])
+        by_type = stats.groupby("sensor_type").agg(readings=("readings", "sum"), latest_time=("latest_time", "max"))
+        by_type = by_type.sort_values(["readings", "latest_time"], ascending=[False, False])
+        sensor_counts = by_type["readings"].rename("count")
+
+        summary = pd.DataFrame(
+            {
+                ("value", "count"): stats["value_count"].values,
+                ("value", "mean"): stats["value_mean"].values,
+                ("value", "min"): stats["value_min"].values,
+                ("value", "max"): stats["value_max"].values,
+            },
+            index=pd.MultiIndex.from_frame(stats[["location", "sensor_type"]]),
+        ).round(2)
+
+        return {
+            "records": int(stats["readings"].sum()),
+            "locations": list(locations["location"]),
+            "series": series,
+            "sensor_counts": sensor_counts,
+            "latest_readings": stats.rename(columns={"latest_value": "value"}),
+            "summary": summary,
+        }
+
+    def analyze_sensor_data(self, server_side=None):
+        """Analyze IoT sensor data"""
+        print("\n📡 Analyzing sensor data...")
+
+        server_side = self.server_side if server_side is None else server_side
+        summary = self.sensor_summary_server() if server_side else self.sensor_summary_client()
+        if summary is None:
+            print("❌ No sensor data found")
+            return None
+
+        df = summary["series"]
+        print(f"📊 Found {summary['records']} sensor readings")
+        print(f"🏭 Locations: {', '.join(summary['locations'])}")
+
+        self.render(plot_sensors, summary, "sensor_analysis.png")
 
         print("\n📈 Sensor Summary Statistics:")
-        summary = (
-            df.groupby(["location", "sensor_type"])
-            .agg({"value": ["count", "mean", "min", "max"]})
-            .round(2)
-        )
-        print(summary)
+        print(summary["summary"])
 
         return df
 
@@ -329,10 +1025,23 @@ class TimescaleAnalyzer:
             """,
         }
 
+        t0 = time.perf_counter()
+        frames, report = self.run_queries(queries)
+        print(f"⏱️  {len(queries)} panel queries in {time.perf_counter() - t0:.2f} s")
+
         data = {}
-        for name, query in queries.items():
-            df = self.query_to_dataframe(query)
-            if df is not None and not df.empty:
+        for name in queries:
+            result = report[name]
+            if result["status"] != "ok":
+                print(
+                    f"⚠️  Panel {name} skipped ({result['status']} after {result['latency_s']:.2f} s): "
+                    f"{(result['error'].splitlines() or ['unknown error'])[0]}"
+                )
+                continue
+
+            print(f"  {name}: {result['rows']} rows in {result['latency_s'] * 1000:.0f} ms")
+            df = frames[name]
+            if not df.empty:
                 df["bucket"] = pd.to_datetime(df["bucket"])
                 data[name] = df
             else:
@@ -342,13 +1051,240 @@ class TimescaleAnalyzer:
             print("❌ No data available for dashboard")
             return None
 
-        # NOTE: Your PDF snippet stops here.
-        # Paste the next section (TSDB008 page 20+) and I’ll append/clean it too.
+        self.render(plot_dashboard, data, "combined_dashboard.png")
         return data
 
+    def export_query(self, cursor, table, since, until, per_device, stride, utc_timestamps):
+        """SELECT for one export, with the time range and per-device sampling applied"""
+        cursor.execute(f"SELECT * FROM {table} LIMIT 0")
+        columns = [(c.name, c.type_code) for c in cursor.description]
+
+        where = []
+        params = {}
+        if since is not None:
+            where.append("time >= %(since)s")
+            params["since"] = since
+        if until is not None:
+            where.append("time < %(until)s")
+            params["until"] = until
+        where_sql = f"WHERE {' AND '.join(where)}" if where else ""
+
+        select = ", ".join(
+            f"{name} AT TIME ZONE 'UTC' AS {name}" if utc_timestamps and oid == TIMESTAMPTZ_OID else name
+            for name, oid in columns
+        )
+        if per_device or stride > 1:
+            # Newest-first numbering per device: keep the latest per_device rows, every stride-th
+            keep = []
+            if per_device:
+                keep.append(f"rn <= {int(per_device)}")
+            if stride > 1:
+                keep.append(f"mod(rn - 1, {int(stride)}) = 0")
+            query = f"""
+                SELECT {select} FROM (
+                    SELECT *, row_number() OVER (PARTITION BY {EXPORT_TABLES[table]} ORDER BY time DESC) AS rn
+                    FROM {table} {where_sql}
+                ) sampled
+                WHERE {' AND '.join(keep)}
+            """
+        else:
+            query = f"SELECT {select} FROM {table} {where_sql}"
+
+        return cursor.mogrify(query, params).decode(), columns
+
+    def copy_to_file(self, cursor, query, path, fmt, compress):
+        opener = gzip.open if compress == "gzip" else open
+        with opener(path, "wb") as f:
+            sink = CountingWriter(f)
+            if fmt == "jsonl":
+                # CSV with a quote and delimiter that never occur in JSON passes the text through verbatim
+                cursor.copy_expert(
+                    f"COPY (SELECT row_to_json(r)::text FROM ({query}) r) TO STDOUT "
+                    f"WITH (FORMAT csv, QUOTE E'\\x01', DELIMITER E'\\x02')",
+                    sink,
+                )
+            else:
+                cursor.copy_expert(f"COPY ({query}) TO STDOUT WITH (FORMAT csv, HEADER)", sink)
+        # COPY reports its row count; counting newlines would also count those inside quoted fields
+        return cursor.rowcount, sink.bytes
+
+    def copy_to_parquet(self, cursor, query, columns, path, compress, chunk_bytes):
+        """Stream COPY CSV through a pipe into pyarrow, one Parquet row group per ~chunk_bytes"""
+        import pyarrow as pa
+        import pyarrow.csv as pacsv
+        import pyarrow.parquet as pq
+
+        names = [name for name, _ in columns]
+        types = {name: _arrow_type(oid) for name, oid in columns}
+        utc_columns = [name for name, oid in columns if oid == TIMESTAMPTZ_OID]
+        schema = pa.schema(
+            [pa.field(n, pa.timestamp("us", tz="UTC") if n in utc_columns else types[n]) for n in names]
+        )
+
+        read_fd, write_fd = os.pipe()
+        sink = CountingWriter(os.fdopen(write_fd, "wb"))
+        failure = []
+
+        def produce():
+            try:
+                cursor.copy_expert(f"COPY ({query}) TO STDOUT WITH (FORMAT csv)", sink)
+            except Exception as e:
+                failure.append(e)
+            finally:
+                try:
+                    sink.raw.close()
+                except OSError:
+                    pass
+
+        producer = threading.Thread(target=produce, daemon=True)
+        producer.start()
+
+        rows = 0
+        source = os.fdopen(read_fd, "rb")
+        try:
+            reader = pacsv.open_csv(
+                source,
+                read_options=pacsv.ReadOptions(column_names=names, block_size=chunk_bytes),
+                convert_options=pacsv.ConvertOptions(
+                    column_types=types,
+                    strings_can_be_null=True,
+                    true_values=["t"],
+                    false_values=["f"],
+                ),
+            )
+            with pq.ParquetWriter(path, schema, compression=compress or "snappy") as writer:
+                for batch in reader:
+                    table = pa.Table.from_batches([batch])
+                    for name in utc_columns:
+                        i = table.schema.get_field_index(name)
+                        table = table.set_column(i, name, table.column(name).cast(schema.field(name).type))
+                    writer.write_table(table)
+                    rows += table.num_rows
+        except pa.ArrowInvalid:
+            if failure:
+                pass
+            elif sink.bytes == 0:
+                pq.write_table(schema.empty_table(), path, compression=compress or "snappy")
+            else:
+                raise
+        finally:
+            # Unblocks the producer if the reader stopped early
+            source.close()
+            producer.join()
+
+        if failure:
+            raise failure[0]
+        return rows, sink.bytes
+
+    def export_data_samples(
+        self,
+        tables=None,
+        fmt="csv",
+        output_dir=".",
+        since=timedelta(hours=24),
+        until=None,
+        per_device=None,
+        stride=1,
+        compress=None,
+        chunk_mb=8,
+    ):
+        """Stream tables to files with COPY ... TO STDOUT, never holding a table in memory.
+
+        fmt is csv, jsonl or parquet. since/until take datetimes or timedeltas back from now
+        (since=None exports everything). per_device keeps the newest N rows per device/city and
+        stride keeps every N-th of those. compress is "gzip" for csv/jsonl, or a Parquet codec.
+        """
+        if fmt not in ("csv", "jsonl", "parquet"):
+            raise ValueError(f"unknown export format: {fmt}")
+        if compress and fmt != "parquet" and compress != "gzip":
+            raise ValueError(f"{fmt} exports only support gzip compression")
+
+        now = datetime.now().astimezone()
+        since = now - since if isinstance(since, timedelta) else since
+        until = now - until if isinstance(until, timedelta) else until
+
+        pool = self.get_pool()
+        if pool is None:
+            return None
+
+        os.makedirs(output_dir, exist_ok=True)
+        stamp = now.strftime("%Y%m%d_%H%M%S")
+        results = {}
+
+        print(f"\n💾 Exporting {', '.join(tables or EXPORT_TABLES)} as {fmt}...")
+        for table in tables or EXPORT_TABLES:
+            ext = fmt + (".gz" if compress == "gzip" and fmt != "parquet" else "")
+            path = os.path.join(output_dir, f"{table}_{stamp}.{ext}")
+
+            conn = pool.getconn()
+            broken = False
+            t0 = time.time()
+            try:
+                cursor = conn.cursor()
+                query, columns = self.export_query(
+                    cursor, table, since, until, per_device, stride, utc_timestamps=fmt == "parquet"
+                )
+                if fmt == "parquet":
+                    rows, sent = self.copy_to_parquet(cursor, query, columns, path, compress, int(chunk_mb * 1024 * 1024))
+                else:
+                    rows, sent = self.copy_to_file(cursor, query, path, fmt, compress)
+                cursor.close()
+            except Exception as e:
+                broken = isinstance(e, (psycopg2.OperationalError, psycopg2.InterfaceError))
+                print(f"❌ Export of {table} failed: {e}")
+                if os.path.exists(path):
+                    os.remove(path)
+                continue
+            finally:
+                if not broken:
+                    conn.rollback()
+                pool.putconn(conn, close=broken)
+
+            elapsed = max(time.time() - t0, 1e-9)
+            written = os.path.getsize(path)
+            results[table] = {"path": path, "rows": rows, "bytes_read": sent, "bytes_written": written, "elapsed_s": elapsed}
+            print(
+                f"✅ {table}: {rows} rows -> {path} in {elapsed:.2f} s "
+                f"({rows / elapsed:.0f} rows/s, {sent / 1e6 / elapsed:.2f} MB/s from server, "
+                f"{written / 1e6:.2f} MB on disk)"
+            )
+
+        return results
+
 
 if __name__ == "__main__":
-    analyzer = TimescaleAnalyzer()
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--server-side",
+        action="store_true",
+        help="aggregate in the database and fetch only plot-resolution points",
+    )
+    parser.add_argument(
+        "--cache",
+        action="store_true",
+        help="serve raw look-back queries from the local Parquet cache",
+    )
+    parser.add_argument("--invalidate-cache", action="store_true", help="clear the cache before running")
+    parser.add_argument(
+        "--headless",
+        action="store_true",
+        help="render figures off-screen in parallel with LTTB downsampling; no plt.show()",
+    )
+    parser.add_argument(
+        "--typed",
+        action="store_true",
+        help="load with categoricals, float32 and datetime64 (see bench_typed_load.py)",
+    )
+    args = parser.parse_args()
+
+    analyzer = TimescaleAnalyzer(
+        server_side=args.server_side,
+        use_cache=args.cache,
+        typed=args.typed,
+        headless=args.headless,
+    )
+    if args.invalidate_cache:
+        analyzer.invalidate_cache()
 
     print("🔍 Starting TimescaleDB Data Analysis")
     print("=" * 50)
@@ -357,7 +1293,10 @@ if __name__ == "__main__":
         analyzer.analyze_weather_data()
         analyzer.analyze_sensor_data()
         analyzer.create_combined_dashboard()
+        analyzer.flush_renders()
 
         print("\n✅ Analysis complete! Check the generated PNG files and exported data.")
     except Exception as e:
         print(f"❌ Analysis failed: {e}")
+    finally:
+        analyzer.close()
@@ -49,7 +49,12 @@ CREATE TABLE IF NOT EXISTS sensor_readings (
 SELECT create_hypertable('sensor_readings', 'time', if_not_exists => TRUE);
 
 -- Indexes for better query performance (idempotent)
-CREATE INDEX IF NOT EXISTS idx_weather_city_time
+-- One observation per city and timestamp; ingestion inserts with ON CONFLICT DO NOTHING.
+-- On an existing database, remove duplicates first:
+--   DELETE FROM weather_data a USING weather_data b
+--    WHERE a.city = b.city AND a.time = b.time AND a.ctid > b.ctid;
+--   DROP INDEX IF EXISTS idx_weather_city_time;
+CREATE UNIQUE INDEX IF NOT EXISTS idx_weather_city_time_unique
     ON weather_data (city, time DESC);
 
 CREATE INDEX IF NOT EXISTS idx_stock_symbol_time
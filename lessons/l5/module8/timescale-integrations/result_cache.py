@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+import hashlib
+import json
+import os
+import re
+import threading
+from datetime import datetime, timedelta, timezone
+
+import pandas as pd
+
+
+class ResultCache:
+    """Local Parquet cache of time-windowed query results, refreshed incrementally.
+
+    Each entry is keyed by the query text, look-back window and bound parameters. A refresh only asks the
+    database for rows newer than the entry's high-water mark (the query receives it as
+    ``%(since)s``), appends them, and drops rows that have fallen out of the window.
+    ``overlap`` re-reads that much of the tail on every refresh to pick up late rows.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "rows_fetched": 0, "rows_evicted": 0}
+
+    def key(self, query, window, params=None):
+        normalized = re.sub(r"\s+", " ", query).strip()
+        # "since" is the cache's own bound and changes on every refresh
+        bound = json.dumps(sorted((k, v) for k, v in (params or {}).items() if k != "since"), default=str)
+        return hashlib.sha1(f"{window.total_seconds()}|{normalized}|{bound}".encode()).hexdigest()[:16]
+
+    def _paths(self, key):
+        base = os.path.join(self.directory, key)
+        return base + ".parquet", base + ".json"
+
+    def load(self, key):
+        data_path, meta_path = self._paths(key)
+        try:
+            with open(meta_path) as f:
+                meta = json.load(f)
+            df = pd.read_parquet(data_path)
+        except (FileNotFoundError, ValueError, OSError):
+            return None, None
+
+        for column in meta.get("json_columns", []):
+            df[column] = df[column].map(lambda v: None if v is None else json.loads(v))
+        return df, meta
+
+    def store(self, key, df, meta):
+        os.makedirs(self.directory, exist_ok=True)
+        data_path, meta_path = self._paths(key)
+
+        # JSONB comes back as dicts, which Parquet can't hold as a column of mixed shapes
+        df = df.copy()
+        json_columns = [
+            c for c in df.columns
+            if df[c].dtype == object and df[c].map(lambda v: isinstance(v, (dict, list))).any()
+        ]
+        for column in json_columns:
+            df[column] = df[column].map(lambda v: None if v is None else json.dumps(v))
+        meta = dict(meta, json_columns=json_columns)
+
+        df.to_parquet(data_path + ".tmp", index=False)
+        os.replace(data_path + ".tmp", data_path)
+        with open(meta_path + ".tmp", "w") as f:
+            json.dump(meta, f)
+        os.replace(meta_path + ".tmp", meta_path)
+
+    def invalidate(self, query=None, window=None, params=None):
+        """Drop one entry (query, window and params given) or every entry"""
+        with self.lock:
+            if query is not None:
+                keys = [self.key(query, window, params)]
+            elif os.path.isdir(self.directory):
+                keys = {name.split(".")[0] for name in os.listdir(self.directory)}
+            else:
+                keys = []
+            for key in keys:
+                for path in self._paths(key):
+                    for p in (path, path + ".tmp"):
+                        if os.path.exists(p):
+                            os.remove(p)
+
+    def fetch(self, run_query, query, window, params=None, time_column="time", overlap=timedelta(0)):
+        """Rows of query within the last `window`, fetching only what is newer than the cache.
+
+        run_query(query, params) returns a DataFrame or None on failure; params gains "since".
+        If the refresh fails the cached rows still inside the window are returned.
+        """
+        key = self.key(query, window, params)
+        now = datetime.now(timezone.utc)
+        start = now - window
+
+        with self.lock:
+            cached, meta = self.load(key)
+
+        if cached is not None:
+            cached[time_column] = pd.to_datetime(cached[time_column], utc=True)
+            high_water = pd.Timestamp(meta["high_water"])
+            since = max(start, (high_water - overlap).to_pydatetime())
+            in_window = cached[cached[time_column] >= start].reset_index(drop=True)
+            self.stats["rows_evicted"] += len(cached) - len(in_window)
+            # The overlap tail is re-read, so only rows up to `since` are kept for the merge
+            kept = in_window[in_window[time_column] <= since]
+        else:
+            since = start
+            in_window = kept = None
+
+        new = run_query(query, dict(params or {}, since=since))
+        if new is None:
+            return in_window
+
+        new[time_column] = pd.to_datetime(new[time_column], utc=True)
+        self.stats["rows_fetched"] += len(new)
+        if kept is None:
+            self.stats["misses"] += 1
+            combined = new.reset_index(drop=True)
+        else:
+            self.stats["hits"] += 1
+            frames = [f for f in (kept, new) if not f.empty]
+            combined = pd.concat(frames, ignore_index=True) if frames else kept
+
+        high_water = combined[time_column].max() if not combined.empty else pd.Timestamp(since)
+        with self.lock:
+            self.store(
+                key,
+                combined,
+                {
+                    "query": query,
+                    "window_s": window.total_seconds(),
+                    "high_water": high_water.isoformat(),
+                    "refreshed_at": now.isoformat(),
+                },
+            )
+        return combined
@@ -183,8 +183,7 @@ def main() -> None:
     print(f"\n🎉 Pipeline execution completed at {datetime.now()}")
     print("📁 Check the current directory for generated files:")
     print("  - *.png (visualization files)")
-    print("  - *.csv (exported data)")
-    print("  - *.json (exported data)")
+    print("  - *.csv / *.jsonl / *.parquet (exported data)")
 
 
 if __name__ == "__main__":
@@ -1,18 +1,56 @@
 #!/usr/bin/env python3
 import psycopg2
+from psycopg2.extras import execute_values
+from psycopg2.pool import PoolError, ThreadedConnectionPool
 import random
 import time
 import json
 from datetime import datetime, timedelta
 from dotenv import load_dotenv
 import os
+import argparse
+import itertools
 import threading
+import sys
+
+# spool.py is shared with module9 and lives in lessons/l5/common
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "common"))
+from spool import WriteAheadSpool, spool_directory  # noqa: E402
 
 load_dotenv()
 
 
+READING_COLUMNS = ("time", "device_id", "sensor_type", "value", "unit", "location", "metadata")
+
+INSERT_READINGS_SQL = """
+    INSERT INTO sensor_readings
+        (time, device_id, sensor_type, value, unit, location, metadata)
+    VALUES %s
+"""
+
+
+class RateLimiter:
+    """Token bucket: acquire(n) blocks until n readings may be sent"""
+
+    def __init__(self, rate, burst_seconds=0.5):
+        self.rate = rate
+        self.capacity = max(1.0, rate * burst_seconds)
+        self.tokens = 0.0
+        self.last = time.monotonic()
+
+    def acquire(self, n=1):
+        while True:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.last) * self.rate)
+            self.last = now
+            if self.tokens >= n:
+                self.tokens -= n
+                return
+            time.sleep((n - self.tokens) / self.rate)
+
+
 class SensorIngestion:
-    def __init__(self):
+    def __init__(self, batch_size=200, flush_interval=2.0, pool_size=4):
         self.db_config = {
             "host": os.getenv("DB_HOST", "localhost"),
             "port": os.getenv("DB_PORT", 5432),
@@ -46,6 +84,29 @@ class SensorIngestion:
 
         self.running = False
 
+        # Shared connection pool and in-process buffer, flushed on size or time
+        self.pool_size = pool_size
+        self.pool = None
+        self.pool_lock = threading.Lock()
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.buffer = []
+        self.buffer_lock = threading.Lock()
+        self.flusher = None
+        self.flushing = threading.Event()
+        self.verbose = True
+
+        # Write statistics (used by the load test report)
+        self.stats_lock = threading.Lock()
+        self.stats = {"generated": 0, "written": 0, "rejected": 0, "lag_sum": 0.0, "lag_max": 0.0}
+
+        # Readings land here while the database is unreachable and are replayed on reconnect
+        self.spool = WriteAheadSpool(
+            spool_directory(__file__, self.db_config["database"], "sensor_readings"),
+            "sensor_readings",
+            READING_COLUMNS,
+        )
+
     def connect_db(self):
         """Connect to TimescaleDB"""
         try:
@@ -105,44 +166,191 @@ class SensorIngestion:
             "timestamp": datetime.now(),
         }
 
+    def get_pool(self):
+        """Create the shared connection pool on first use"""
+        with self.pool_lock:
+            if self.pool is None:
+                try:
+                    self.pool = ThreadedConnectionPool(1, self.pool_size, **self.db_config)
+                except Exception as e:
+                    print(f"❌ Database connection failed: {e}")
+            return self.pool
+
+    def close_pool(self):
+        with self.pool_lock:
+            if self.pool is not None:
+                self.pool.closeall()
+                self.pool = None
+
     def insert_sensor_reading(self, reading):
-        """Insert sensor reading into TimescaleDB"""
-        conn = self.connect_db()
-        if not conn:
-            return False
+        """Queue a sensor reading; the buffer is flushed on size or time"""
+        with self.buffer_lock:
+            self.buffer.append(reading)
+            full = len(self.buffer) >= self.batch_size
 
-        try:
-            cursor = conn.cursor()
-
-            insert_query = """
-                INSERT INTO sensor_readings
-                    (time, device_id, sensor_type, value, unit, location, metadata)
-                VALUES
-                    (%s, %s, %s, %s, %s, %s, %s)
-            """
-
-            cursor.execute(
-                insert_query,
-                (
-                    reading["timestamp"],
-                    reading["device_id"],
-                    reading["sensor_type"],
-                    reading["value"],
-                    reading["unit"],
-                    reading["location"],
-                    reading["metadata"],
-                ),
+        if self.verbose:
+            print(f"📡 {reading['device_id']}: {reading['value']} {reading['unit']}")
+
+        if full:
+            self.flush()
+        return True
+
+    def write_readings(self, readings):
+        """Insert a batch of readings as one multi-row INSERT on a pooled connection.
+
+        While the database is unreachable the batch goes to the spool instead. A batch the
+        database refuses is retried one row at a time, and rows refused again are set aside in
+        the spool's rejected file. Returns False only when no pooled connection was free; the
+        caller keeps the batch for a retry.
+        """
+        rows = [
+            (
+                r["timestamp"],
+                r["device_id"],
+                r["sensor_type"],
+                r["value"],
+                r["unit"],
+                r["location"],
+                r["metadata"],
             )
+            for r in readings
+        ]
 
-            conn.commit()
-            print(f"📡 {reading['device_id']}: {reading['value']} {reading['unit']}")
+        if self.spool.outage:
+            self.spool.append(rows)
             return True
 
-        except Exception as e:
-            print(f"❌ Failed to insert sensor reading: {e}")
+        pool = self.get_pool()
+        if pool is None:
+            self.spool.append(rows)
+            return True
+
+        conn = None
+        broken = False
+        try:
+            conn = pool.getconn()
+            try:
+                cursor = conn.cursor()
+                execute_values(cursor, INSERT_READINGS_SQL, rows, page_size=len(rows))
+                conn.commit()
+                cursor.close()
+                written = readings
+            except (psycopg2.OperationalError, psycopg2.InterfaceError):
+                raise
+            except Exception as e:
+                conn.rollback()
+                reason = (str(e).splitlines() or [type(e).__name__])[0]
+                print(f"⚠️  Batch of {len(readings)} sensor readings refused ({reason}), retrying row by row")
+                written, broken = self.write_rows_individually(conn, readings, rows)
+
+            # Insert lag: reading timestamp -> committed
+            if written:
+                now = datetime.now()
+                lags = [(now - r["timestamp"]).total_seconds() for r in written]
+                with self.stats_lock:
+                    self.stats["written"] += len(written)
+                    self.stats["lag_sum"] += sum(lags)
+                    self.stats["lag_max"] = max(self.stats["lag_max"], max(lags))
+            return True
+
+        except PoolError as e:
+            # Every pooled connection is busy: the database is fine, so retry rather than spool
+            print(f"❌ No free pooled connection for {len(readings)} sensor readings: {e}")
             return False
+
+        except (psycopg2.OperationalError, psycopg2.InterfaceError) as e:
+            print(f"❌ Lost database connection, spooling {len(rows)} sensor readings: {e}")
+            broken = True
+            self.spool.append(rows)
+            return True
+
         finally:
-            conn.close()
+            if conn is not None:
+                pool.putconn(conn, close=broken)
+
+    def write_rows_individually(self, conn, readings, rows):
+        """Retry a refused batch one row per transaction so one bad reading cannot block the rest.
+
+        Each row gets this single retry; rows that fail it go to the spool's rejected file and
+        the rejected counter. Returns (readings written, connection lost); on a lost connection
+        the rows not yet tried are spooled.
+        """
+        cursor = conn.cursor()
+        written = []
+        rejected = []
+        error = None
+        for i, (reading, row) in enumerate(zip(readings, rows)):
+            try:
+                execute_values(cursor, INSERT_READINGS_SQL, [row])
+                conn.commit()
+                written.append(reading)
+            except (psycopg2.OperationalError, psycopg2.InterfaceError) as e:
+                print(f"❌ Lost database connection, spooling {len(rows) - i} sensor readings: {e}")
+                self.spool.append(rows[i:])
+                break
+            except Exception as e:
+                conn.rollback()
+                rejected.append(row)
+                error = e
+        cursor.close()
+
+        if rejected:
+            self.spool.reject(rejected, error)
+            with self.stats_lock:
+                self.stats["rejected"] += len(rejected)
+        return written, len(written) + len(rejected) < len(rows)
+
+    def flush(self):
+        """Write out everything currently buffered"""
+        # Concurrent flushes each take their own slice of the buffer and pooled connection
+        with self.buffer_lock:
+            readings, self.buffer = self.buffer, []
+        if not readings:
+            return 0
+
+        if self.write_readings(readings):
+            if self.verbose:
+                print(f"💾 Flushed {len(readings)} sensor readings")
+            return len(readings)
+
+        # No pooled connection was free (outages are spooled and refused rows set aside):
+        # keep them for the next attempt rather than dropping them
+        with self.buffer_lock:
+            self.buffer = readings + self.buffer
+        return 0
+
+    def flush_periodically(self):
+        while not self.flushing.wait(self.flush_interval):
+            self.flush()
+
+    def start_flusher(self):
+        self.flushing.clear()
+        self.flusher = threading.Thread(target=self.flush_periodically, daemon=True)
+        self.flusher.start()
+        self.spool.start_replayer(lambda: psycopg2.connect(**self.db_config))
+
+    def stop_flusher(self):
+        """Stop the background flusher and write out whatever is left"""
+        self.flushing.set()
+        if self.flusher is not None:
+            self.flusher.join()
+            self.flusher = None
+        self.flush()
+        with self.buffer_lock:
+            remaining = len(self.buffer)
+        if remaining:
+            print(f"⚠️  {remaining} sensor readings could not be written")
+        self.spool.stop_replayer()
+        self.close_pool()
+
+        # One last attempt to drain the spool; anything left is replayed on the next start
+        if self.spool.depth > 0:
+            try:
+                self.spool.replay(lambda: psycopg2.connect(**self.db_config))
+            except Exception:
+                pass
+        if self.spool.depth > 0:
+            print(f"⚠️  {self.spool.depth} sensor readings left in spool at {self.spool.directory}")
 
     def simulate_location_sensors(self, location_name, location_config):
         """Simulate all sensors for a specific location"""
@@ -167,6 +375,7 @@ class SensorIngestion:
             print(f"  📍 {config['location']}: {', '.join(config['devices'])}")
 
         self.running = True
+        self.start_flusher()
         threads = []
 
         # Start a thread for each location
@@ -186,11 +395,155 @@ class SensorIngestion:
             print("\n🛑 Stopping sensor simulation...")
         finally:
             self.running = False
+            for thread in threads:
+                thread.join()
+            self.stop_flusher()
             print("✅ Sensor simulation stopped")
 
+    def build_load_fleet(self, locations, devices_per_location):
+        """Expand the sensor configs into locations x devices virtual sensors"""
+        templates = [
+            (device_id, sensor_config, config["location"])
+            for config in self.sensors.values()
+            for device_id, sensor_config in config["sensors"].items()
+        ]
+
+        fleet = []
+        for loc in range(locations):
+            for n in range(devices_per_location):
+                device_id, sensor_config, base_location = templates[n % len(templates)]
+                fleet.append(
+                    (
+                        f"{device_id}_L{loc:04d}_{n:04d}",
+                        sensor_config,
+                        f"{base_location} #{loc}",
+                    )
+                )
+        return fleet
+
+    def generate_load(self, fleet, rate):
+        """Generate readings round-robin over the fleet at a fixed rate"""
+        limiter = RateLimiter(rate)
+        chunk = max(1, min(100, int(rate // 100)))
+        devices = itertools.cycle(fleet)
+
+        while self.running:
+            limiter.acquire(chunk)
+            readings = [
+                self.generate_sensor_reading(device_id, sensor_config, location)
+                for device_id, sensor_config, location in itertools.islice(devices, chunk)
+            ]
+            for reading in readings:
+                self.insert_sensor_reading(reading)
+            with self.stats_lock:
+                self.stats["generated"] += len(readings)
+
+    def report_load(self, requested_rate, elapsed, prev=None, interval=None):
+        with self.stats_lock:
+            stats = dict(self.stats)
+        with self.buffer_lock:
+            buffered = len(self.buffer)
+        spool = self.spool.metrics()
+
+        if prev is not None:
+            generated = (stats["generated"] - prev["generated"]) / interval
+            written = (stats["written"] - prev["written"]) / interval
+        else:
+            generated = stats["generated"] / elapsed
+            written = stats["written"] / elapsed
+        lag_avg = stats["lag_sum"] / stats["written"] if stats["written"] else 0.0
+
+        print(
+            f"⚡ {elapsed:6.1f}s | requested {requested_rate:.0f}/s | generated {generated:.0f}/s "
+            f"| written {written:.0f}/s ({written / requested_rate:.0%}) | buffered {buffered} "
+            f"| lag avg {lag_avg * 1000:.0f} ms, max {stats['lag_max'] * 1000:.0f} ms "
+            f"| rejected {stats['rejected']} "
+            f"| spool depth {spool['depth']}, replay {spool['replay_rate']:.0f} rows/s"
+        )
+        return stats
+
+    def start_load_test(
+        self,
+        locations=10,
+        devices_per_location=100,
+        rate=5000,
+        duration_seconds=60,
+        generators=2,
+        report_interval=5,
+    ):
+        """Drive a large virtual fleet at a target aggregate rate (readings/s)"""
+        fleet = self.build_load_fleet(locations, devices_per_location)
+        print(
+            f"🏋️  Load test: {len(fleet)} virtual sensors ({locations} locations x "
+            f"{devices_per_location} devices) at {rate} readings/s for {duration_seconds} s"
+        )
+
+        # Each generator can flush on a full buffer while the flusher flushes on time
+        if self.pool_size < generators + 1:
+            print(f"🔧 Raising pool size from {self.pool_size} to {generators + 1} for {generators} generators")
+            self.close_pool()
+            self.pool_size = generators + 1
+
+        self.verbose = False
+        self.running = True
+        self.start_flusher()
+
+        threads = []
+        for g in range(generators):
+            thread = threading.Thread(
+                target=self.generate_load,
+                args=(fleet[g::generators], rate / generators),
+                daemon=True,
+            )
+            thread.start()
+            threads.append(thread)
+
+        t0 = last = time.monotonic()
+        prev = {"generated": 0, "written": 0}
+        try:
+            while last - t0 < duration_seconds:
+                time.sleep(min(report_interval, duration_seconds - (last - t0)))
+                now = time.monotonic()
+                prev = self.report_load(rate, now - t0, prev, now - last)
+                last = now
+        except KeyboardInterrupt:
+            print("\n🛑 Stopping load test...")
+        finally:
+            self.running = False
+            for thread in threads:
+                thread.join()
+            self.stop_flusher()
+
+            print("📊 Load test summary:")
+            self.report_load(rate, time.monotonic() - t0)
+
+
+def parse_args():
+    p = argparse.ArgumentParser()
+    p.add_argument("--minutes", type=float, default=2)
+    p.add_argument("--load", action="store_true", help="high-rate load mode")
+    p.add_argument("--locations", type=int, default=10)
+    p.add_argument("--devices", type=int, default=100, help="devices per location")
+    p.add_argument("--rate", type=float, default=5000, help="target readings/s")
+    p.add_argument("--seconds", type=int, default=60, help="load test duration")
+    p.add_argument("--generators", type=int, default=2)
+    p.add_argument("--batch-size", type=int, default=200)
+    p.add_argument("--pool-size", type=int, default=4)
+    return p.parse_args()
+
 
 if __name__ == "__main__":
-    simulation = SensorIngestion()
+    args = parse_args()
+    simulation = SensorIngestion(batch_size=args.batch_size, pool_size=args.pool_size)
 
-    print("🧪 Testing sensor ingestion...")
-    simulation.start_simulation(duration_minutes=2)  # Run for 2 minutes
\ No newline at end of file
+    if args.load:
+        simulation.start_load_test(
+            locations=args.locations,
+            devices_per_location=args.devices,
+            rate=args.rate,
+            duration_seconds=args.seconds,
+            generators=args.generators,
+        )
+    else:
+        print("🧪 Testing sensor ingestion...")
+        simulation.start_simulation(duration_minutes=args.minutes)
\ No newline at end of file
@@ -0,0 +1,171 @@
+from datetime import datetime, timedelta, timezone
+
+import pandas as pd
+import pytest
+
+import result_cache
+from result_cache import ResultCache
+
+QUERY = """
+    SELECT time, device_id, value, metadata FROM sensor_readings
+    WHERE time > %(since)s AND device_id = %(device)s
+"""
+WINDOW = timedelta(hours=1)
+T0 = datetime(2024, 1, 1, 12, 0, tzinfo=timezone.utc)
+
+
+class Clock(datetime):
+    """datetime whose now() is set by the test"""
+
+    current = T0
+
+    @classmethod
+    def now(cls, tz=None):
+        return cls.current
+
+
+class FakeDatabase:
+    """run_query stand-in over an in-memory table; records the params of every call"""
+
+    def __init__(self):
+        self.rows = []
+        self.calls = []
+        self.down = False
+
+    def add(self, minutes, device="dev-1", value=1.0):
+        self.rows.append(
+            {"time": T0 + timedelta(minutes=minutes), "device_id": device, "value": value, "metadata": {"n": minutes}}
+        )
+
+    def run_query(self, query, params):
+        self.calls.append(params)
+        if self.down:
+            return None
+        rows = [r for r in self.rows if r["time"] > params["since"] and r["device_id"] == params["device"]]
+        return pd.DataFrame(rows, columns=["time", "device_id", "value", "metadata"])
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    monkeypatch.setattr(result_cache, "datetime", Clock)
+    Clock.current = T0
+    return Clock
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return ResultCache(str(tmp_path / "cache"))
+
+
+def minutes(df):
+    return [int((t - T0).total_seconds() // 60) for t in df["time"]]
+
+
+def test_refresh_fetches_only_rows_after_the_high_water_mark(cache, clock):
+    db = FakeDatabase()
+    for m in (-50, -30, -10):
+        db.add(m)
+
+    first = cache.fetch(db.run_query, QUERY, WINDOW, {"device": "dev-1"})
+    assert minutes(first) == [-50, -30, -10]
+    assert db.calls[0]["since"] == T0 - WINDOW
+
+    db.add(5)
+    clock.current = T0 + timedelta(minutes=10)
+    second = cache.fetch(db.run_query, QUERY, WINDOW, {"device": "dev-1"})
+    assert minutes(second) == [-50, -30, -10, 5]
+    assert db.calls[1]["since"] == T0 - timedelta(minutes=10)
+    assert cache.stats == {"hits": 1, "misses": 1, "rows_fetched": 4, "rows_evicted": 0}
+
+
+def test_overlap_rereads_the_tail_without_duplicates(cache, clock):
+    db = FakeDatabase()
+    db.add(-20)
+    db.add(-10)
+    cache.fetch(db.run_query, QUERY, WINDOW, {"device": "dev-1"})
+
+    # A late row lands inside the overlap, behind the high-water mark
+    db.add(-12)
+    df = cache.fetch(db.run_query, QUERY, WINDOW, {"device": "dev-1"}, overlap=timedelta(minutes=15))
+    assert db.calls[1]["since"] == T0 - timedelta(minutes=25)
+    assert sorted(minutes(df)) == [-20, -12, -10]
+
+
+def test_rows_leaving_the_window_are_evicted(cache, clock):
+    db = FakeDatabase()
+    for m in (-50, -30, -10):
+        db.add(m)
+    cache.fetch(db.run_query, QUERY, WINDOW, {"device": "dev-1"})
+
+    clock.current = T0 + timedelta(minutes=40)
+    df = cache.fetch(db.run_query, QUERY, WINDOW, {"device": "dev-1"})
+    assert minutes(df) == [-10]
+    assert cache.stats["rows_evicted"] == 2
+
+
+def test_failed_refresh_returns_only_rows_in_the_window(cache, clock):
+    db = FakeDatabase()
+    for m in (-50, -30, -10):
+        db.add(m)
+    cache.fetch(db.run_query, QUERY, WINDOW, {"device": "dev-1"})
+
+    db.down = True
+    clock.current = T0 + timedelta(minutes=40)
+    df = cache.fetch(db.run_query, QUERY, WINDOW, {"device": "dev-1"})
+    assert minutes(df) == [-10]
+
+    # Nothing cached yet and the database is down: no result at all
+    assert cache.fetch(db.run_query, QUERY, WINDOW, {"device": "dev-2"}) is None
+
+
+def test_params_are_part_of_the_key(cache, clock):
+    db = FakeDatabase()
+    db.add(-30, device="dev-1", value=1.0)
+    db.add(-20, device="dev-2", value=2.0)
+
+    one = cache.fetch(db.run_query, QUERY, WINDOW, {"device": "dev-1"})
+    two = cache.fetch(db.run_query, QUERY, WINDOW, {"device": "dev-2"})
+    assert list(one["device_id"]) == ["dev-1"]
+    assert list(two["device_id"]) == ["dev-2"]
+    assert cache.stats["misses"] == 2
+
+    # Whitespace and the cache's own "since" do not split entries
+    assert cache.key(QUERY, WINDOW, {"device": "dev-1"}) == cache.key(
+        " ".join(QUERY.split()), WINDOW, {"device": "dev-1", "since": T0}
+    )
+    assert cache.key(QUERY, WINDOW, {"device": "dev-1"}) != cache.key(QUERY, WINDOW * 2, {"device": "dev-1"})
+
+
+def test_invalidate_one_entry_or_all(cache, clock):
+    db = FakeDatabase()
+    db.add(-30, device="dev-1")
+    db.add(-20, device="dev-2")
+    for device in ("dev-1", "dev-2"):
+        cache.fetch(db.run_query, QUERY, WINDOW, {"device": device})
+
+    cache.invalidate(QUERY, WINDOW, {"device": "dev-1"})
+    assert cache.load(cache.key(QUERY, WINDOW, {"device": "dev-1"})) == (None, None)
+    assert cache.load(cache.key(QUERY, WINDOW, {"device": "dev-2"}))[0] is not None
+
+    cache.invalidate()
+    assert cache.load(cache.key(QUERY, WINDOW, {"device": "dev-2"})) == (None, None)
+    cache.fetch(db.run_query, QUERY, WINDOW, {"device": "dev-2"})
+    assert db.calls[-1]["since"] == T0 - WINDOW
+
+
+def test_entries_reload_from_disk(cache, clock):
+    db = FakeDatabase()
+    db.add(-30)
+    db.add(-10)
+    cache.fetch(db.run_query, QUERY, WINDOW, {"device": "dev-1"})
+
+    # A new process over the same directory picks up the entry, JSON columns included
+    reopened = ResultCache(cache.directory)
+    df, meta = reopened.load(reopened.key(QUERY, WINDOW, {"device": "dev-1"}))
+    assert list(df["metadata"]) == [{"n": -30}, {"n": -10}]
+    assert meta["high_water"] == (T0 - timedelta(minutes=10)).isoformat()
+
+    db.down = True
+    df = reopened.fetch(db.run_query, QUERY, WINDOW, {"device": "dev-1"})
+    assert minutes(df) == [-30, -10]
+    assert db.calls[-1]["since"] == T0 - timedelta(minutes=10)
@@ -0,0 +1,161 @@
+import json
+import threading
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+import pytest
+
+from weather_ingestion import WeatherIngestion
+
+
+class ForecastStub(BaseHTTPRequestHandler):
+    """Answers like Open-Meteo: one object per comma-separated coordinate, a bare object for one"""
+
+    def do_GET(self):
+        query = parse_qs(urlsplit(self.path).query)
+        with self.server.lock:
+            self.server.requests.append(query)
+
+        lats = query["latitude"][0].split(",")
+        payloads = [
+            {
+                "latitude": float(lat),
+                "utc_offset_seconds": 0,
+                "current": {
+                    "time": self.server.observed,
+                    "interval": 900,
+                    "temperature_2m": float(lat),
+                    "relative_humidity_2m": 50,
+                    "surface_pressure": 1013.2,
+                    "wind_speed_10m": 3.4,
+                },
+            }
+            for lat in lats
+        ]
+        if self.server.drop_one and len(payloads) > 1:
+            payloads = payloads[:-1]
+        body = json.dumps(payloads if len(payloads) > 1 else payloads[0]).encode()
+
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def stub():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), ForecastStub)
+    server.lock = threading.Lock()
+    server.requests = []
+    server.drop_one = False
+    server.observed = "2024-01-01T12:00"
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def ingestion(stub, tmp_path, monkeypatch):
+    monkeypatch.setenv("SPOOL_DIR", str(tmp_path))
+    return lambda **kwargs: WeatherIngestion(base_url=f"http://127.0.0.1:{stub.server_address[1]}", **kwargs)
+
+
+def test_cities_are_fetched_in_one_grouped_request(stub, ingestion):
+    weather = ingestion()
+    results = weather.fetch_all()
+
+    assert len(stub.requests) == 1
+    query = stub.requests[0]
+    assert query["latitude"] == [",".join(str(c["lat"]) for c in weather.cities.values())]
+    assert query["longitude"] == [",".join(str(c["lon"]) for c in weather.cities.values())]
+    assert query["timezone"] == ["auto"]
+
+    # Each payload is parsed for the city at the same position in the request
+    assert [city for city, _ in results] == list(weather.cities)
+    for city, data in results:
+        assert data["temperature"] == weather.cities[city]["lat"]
+        assert data["timestamp"].isoformat() == "2024-01-01T12:00:00"
+
+
+def test_groups_are_split_by_locations_per_request(stub, ingestion):
+    weather = ingestion(locations_per_request=2)
+    results = weather.fetch_all()
+
+    assert sorted(len(q["latitude"][0].split(",")) for q in stub.requests) == [1, 2, 2]
+    assert [city for city, data in results if data is not None] == list(weather.cities)
+
+
+def test_short_grouped_response_falls_back_to_one_request_per_city(stub, ingestion, capsys):
+    stub.drop_one = True
+    weather = ingestion()
+    results = weather.fetch_all()
+
+    assert len(stub.requests) == 1 + len(weather.cities)
+    assert "fetching individually" in capsys.readouterr().out
+    assert [(city, data["temperature"]) for city, data in results] == [
+        (city, c["lat"]) for city, c in weather.cities.items()
+    ]
+
+
+class FakeInsert:
+    """Stands in for insert_weather_rows; fails (returns None) while `failing` is set"""
+
+    def __init__(self):
+        self.batches = []
+        self.failing = False
+
+    def __call__(self, rows):
+        self.batches.append([row[1] for row in rows])
+        return None if self.failing else len(rows)
+
+
+def test_fresh_observations_are_served_from_cache(stub, ingestion):
+    # Observed now with a 15 minute update interval: nothing new upstream until then
+    stub.observed = datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M")
+    weather = ingestion()
+    weather.insert_weather_rows = insert = FakeInsert()
+
+    assert weather.run_ingestion_cycle() == 5
+    assert weather.run_ingestion_cycle() == 0
+    assert len(stub.requests) == 1
+    assert insert.batches == [list(weather.cities), []]
+    assert weather.counters["cache_hits"] == 5
+    assert weather.counters["fetched"] == 5
+
+
+def test_unchanged_observation_is_skipped_as_duplicate(stub, ingestion):
+    # An old observation is always stale, so it is fetched again but not re-inserted
+    weather = ingestion()
+    weather.insert_weather_rows = insert = FakeInsert()
+
+    weather.run_ingestion_cycle()
+    weather.run_ingestion_cycle()
+    assert len(stub.requests) == 2
+    assert insert.batches == [list(weather.cities), []]
+    assert weather.counters["duplicates_skipped"] == 5
+    assert weather.counters["cache_hits"] == 0
+
+
+def test_failed_insert_is_not_cached(stub, ingestion):
+    stub.observed = datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M")
+    weather = ingestion()
+    weather.insert_weather_rows = insert = FakeInsert()
+
+    insert.failing = True
+    assert weather.run_ingestion_cycle() == 0
+    assert weather.cache == {}
+    assert weather.last_written == {}
+
+    # The next cycle fetches and writes the same observations instead of treating them as cache hits
+    insert.failing = False
+    assert weather.run_ingestion_cycle() == 5
+    assert len(stub.requests) == 2
+    assert insert.batches == [list(weather.cities)] * 2
+    assert weather.counters["cache_hits"] == 0
@@ -1,16 +1,39 @@
 #!/usr/bin/env python3
 import requests
+from requests.adapters import HTTPAdapter
 import psycopg2
+from psycopg2.extras import execute_values
+from psycopg2.pool import ThreadedConnectionPool
 import time
-from datetime import datetime
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
 from dotenv import load_dotenv
 import os
+import sys
+
+# spool.py is shared with module9 and lives in lessons/l5/common
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "common"))
+from spool import WriteAheadSpool, spool_directory  # noqa: E402
 
 load_dotenv()
 
+WEATHER_COLUMNS = ("time", "city", "temperature", "humidity", "pressure", "wind_speed", "description")
+
+CURRENT_FIELDS = "temperature_2m,relative_humidity_2m,surface_pressure,wind_speed_10m"
+
+INSERT_WEATHER_SQL = """
+    INSERT INTO weather_data
+        (time, city, temperature, humidity, pressure, wind_speed, description)
+    VALUES %s
+    ON CONFLICT DO NOTHING
+    RETURNING 1
+"""
+
 
 class WeatherIngestion:
-    def __init__(self):
+    def __init__(self, base_url=None, max_concurrency=8, locations_per_request=50, pool_size=2,
+                 cache_ttl=900):
         self.db_config = {
             "host": os.getenv("DB_HOST", "localhost"),
             "port": int(os.getenv("DB_PORT", 5432)),
@@ -19,8 +42,30 @@ class WeatherIngestion:
             "password": os.getenv("DB_PASSWORD", "admin123"),
         }
 
-        # Using free weather API (no key required)
-        self.base_url = "https://api.open-meteo.com/v1/forecast"
+        # Using free weather API (no key required); WEATHER_API_URL can point at a local stub
+        self.base_url = base_url or os.getenv("WEATHER_API_URL", "https://api.open-meteo.com/v1/forecast")
+
+        # One keep-alive session shared by all fetch threads; at most max_concurrency requests in
+        # flight. Open-Meteo takes comma-separated coordinates, so cities are fetched in groups of
+        # locations_per_request (1 = one request per city).
+        self.max_concurrency = max_concurrency
+        self.locations_per_request = max(1, locations_per_request)
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_concurrency)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+        self.pool_size = pool_size
+        self.pool = None
+        self.pool_lock = threading.Lock()
+
+        # Latest observation per location, reused until upstream publishes the next one (its
+        # time + update interval, or cache_ttl seconds if the response has no interval)
+        self.cache_ttl = cache_ttl
+        self.cache = {}
+        # Observation time last written per city, so unchanged observations are not re-inserted
+        self.last_written = {}
+        self.counters = {"fetched": 0, "cache_hits": 0, "duplicates_skipped": 0, "rows_written": 0, "rows_spooled": 0}
 
         # Cities to monitor
         self.cities = {
@@ -31,6 +76,14 @@ class WeatherIngestion:
             "Mumbai": {"lat": 19.0760, "lon": 72.8777},
         }
 
+        # Rows land here while the database is unreachable and are replayed on reconnect
+        self.spool = WriteAheadSpool(
+            spool_directory(__file__, self.db_config["database"], "weather_data"),
+            "weather_data",
+            WEATHER_COLUMNS,
+            skip_conflicts=True,
+        )
+
     def connect_db(self):
         """Connect to TimescaleDB"""
         try:
@@ -40,88 +93,236 @@ class WeatherIngestion:
             print(f"❌ Database connection failed: {e}")
             return None
 
+    def get_pool(self):
+        """Create the shared connection pool on first use"""
+        with self.pool_lock:
+            if self.pool is None:
+                try:
+                    self.pool = ThreadedConnectionPool(1, self.pool_size, **self.db_config)
+                except Exception as e:
+                    print(f"❌ Database connection failed: {e}")
+            return self.pool
+
+    def close_pool(self):
+        with self.pool_lock:
+            if self.pool is not None:
+                self.pool.closeall()
+                self.pool = None
+
+    def parse_current(self, data):
+        current = data["current"]
+        observed = datetime.fromisoformat(current["time"].replace("Z", "+00:00"))
+
+        # With timezone=auto the time is local; utc_offset_seconds turns it back into UTC
+        if observed.tzinfo is None:
+            observed_epoch = observed.replace(tzinfo=timezone.utc).timestamp() - data.get("utc_offset_seconds", 0)
+        else:
+            observed_epoch = observed.timestamp()
+        interval = current.get("interval")
+        expires_at = observed_epoch + interval if interval else time.time() + self.cache_ttl
+
+        return {
+            "temperature": current.get("temperature_2m"),
+            "humidity": current.get("relative_humidity_2m"),
+            "pressure": current.get("surface_pressure"),
+            "wind_speed": current.get("wind_speed_10m"),
+            "description": f"Temperature: {current.get('temperature_2m')}°C",
+            "timestamp": observed,
+            "expires_at": expires_at,
+        }
+
+    def request_current(self, group):
+        """GET current conditions for a list of (city, coordinates); returns one payload per city"""
+        params = {
+            "latitude": ",".join(str(c["lat"]) for _, c in group),
+            "longitude": ",".join(str(c["lon"]) for _, c in group),
+            "current": CURRENT_FIELDS,
+            "timezone": "auto",
+        }
+        response = self.session.get(self.base_url, params=params, timeout=10)
+        response.raise_for_status()
+
+        data = response.json()
+        # A single location comes back as an object, several as a list in request order
+        payloads = data if isinstance(data, list) else [data]
+        if len(payloads) != len(group):
+            raise ValueError(f"expected {len(group)} locations, got {len(payloads)}")
+        return payloads
+
     def fetch_weather_data(self, city, coordinates):
         """Fetch weather data from Open-Meteo API"""
         try:
-            params = {
-                "latitude": coordinates["lat"],
-                "longitude": coordinates["lon"],
-                "current": "temperature_2m,relative_humidity_2m,surface_pressure,wind_speed_10m",
-                "timezone": "auto",
-            }
-
-            response = requests.get(self.base_url, params=params, timeout=10)
-            response.raise_for_status()
-
-            data = response.json()
-            current = data["current"]
-
-            return {
-                "temperature": current.get("temperature_2m"),
-                "humidity": current.get("relative_humidity_2m"),
-                "pressure": current.get("surface_pressure"),
-                "wind_speed": current.get("wind_speed_10m"),
-                "description": f"Temperature: {current.get('temperature_2m')}°C",
-                "timestamp": datetime.fromisoformat(current["time"].replace("Z", "+00:00")),
-            }
-
+            return self.parse_current(self.request_current([(city, coordinates)])[0])
         except Exception as e:
             print(f"❌ Failed to fetch weather for {city}: {e}")
             return None
 
-    def insert_weather_data(self, city, weather_data):
-        """Insert weather data into TimescaleDB"""
-        conn = self.connect_db()
-        if not conn:
-            return False
+    def fetch_group(self, group):
+        """Fetch one group of cities in a single request, falling back to one request per city"""
+        if len(group) > 1:
+            try:
+                payloads = self.request_current(group)
+                return [(city, self.parse_current(p)) for (city, _), p in zip(group, payloads)]
+            except Exception as e:
+                print(f"⚠️  Multi-location request for {len(group)} cities failed ({e}), fetching individually")
+        return [(city, self.fetch_weather_data(city, coordinates)) for city, coordinates in group]
+
+    def fetch_all(self, cities=None):
+        """Fetch every city concurrently; returns [(city, weather_data or None)] in input order"""
+        items = list((self.cities if cities is None else cities).items())
+        n = self.locations_per_request
+        if n > 1:
+            groups = [items[i:i + n] for i in range(0, len(items), n)]
+        else:
+            groups = [[item] for item in items]
 
+        with ThreadPoolExecutor(max_workers=min(self.max_concurrency, len(groups) or 1)) as pool:
+            return [result for group in pool.map(self.fetch_group, groups) for result in group]
+
+    def cache_key(self, coordinates):
+        return (round(coordinates["lat"], 4), round(coordinates["lon"], 4))
+
+    def stale_cities(self):
+        """Cities whose cached observation has expired (or was never fetched)"""
+        now = time.time()
+        stale = {}
+        for city, coordinates in self.cities.items():
+            cached = self.cache.get(self.cache_key(coordinates))
+            if cached is not None and cached["expires_at"] > now:
+                self.counters["cache_hits"] += 1
+            else:
+                stale[city] = coordinates
+        return stale
+
+    def weather_row(self, city, weather_data):
+        return (
+            weather_data["timestamp"],
+            city,
+            weather_data["temperature"],
+            weather_data["humidity"],
+            weather_data["pressure"],
+            weather_data["wind_speed"],
+            weather_data["description"],
+        )
+
+    def spool_weather_rows(self, rows):
+        self.spool.append(rows)
+        self.counters["rows_spooled"] += len(rows)
+        print(f"💾 Spooled {len(rows)} weather rows (database unavailable, {self.spool.depth} pending)")
+        return len(rows)
+
+    def insert_weather_rows(self, rows):
+        """Insert rows as one multi-row INSERT on a pooled connection.
+
+        Returns the number of rows written (or spooled), or None if the insert failed; the
+        rows_written and rows_spooled counters tell the two apart.
+        """
+        if not rows:
+            return 0
+
+        # Don't hammer a database that is known to be down; the replayer probes for it
+        if self.spool.outage:
+            return self.spool_weather_rows(rows)
+
+        pool = self.get_pool()
+        if pool is None:
+            return self.spool_weather_rows(rows)
+
+        try:
+            conn = pool.getconn()
+        except psycopg2.Error as e:
+            print(f"❌ Database connection failed: {e}")
+            return self.spool_weather_rows(rows)
+
+        broken = False
         try:
             cursor = conn.cursor()
+            written = len(execute_values(cursor, INSERT_WEATHER_SQL, rows, page_size=len(rows), fetch=True))
+            conn.commit()
+            cursor.close()
 
-            insert_query = """
-                INSERT INTO weather_data
-                    (time, city, temperature, humidity, pressure, wind_speed, description)
-                VALUES
-                    (%s, %s, %s, %s, %s, %s, %s)
-            """
-
-            cursor.execute(
-                insert_query,
-                (
-                    weather_data["timestamp"],
-                    city,
-                    weather_data["temperature"],
-                    weather_data["humidity"],
-                    weather_data["pressure"],
-                    weather_data["wind_speed"],
-                    weather_data["description"],
-                ),
-            )
+            # Rows already in the table (same city and time) are skipped by ON CONFLICT
+            self.counters["rows_written"] += written
+            self.counters["duplicates_skipped"] += len(rows) - written
+            return written
 
-            conn.commit()
-            print(f"✅ Inserted weather data for {city}: {weather_data['temperature']}°C")
-            return True
+        except (psycopg2.OperationalError, psycopg2.InterfaceError):
+            broken = True
+            return self.spool_weather_rows(rows)
 
         except Exception as e:
-            print(f"❌ Failed to insert data for {city}: {e}")
-            return False
+            print(f"❌ Failed to insert {len(rows)} weather rows: {e}")
+            conn.rollback()
+            return None
         finally:
-            conn.close()
+            pool.putconn(conn, close=broken)
+
+    def insert_weather_data(self, city, weather_data):
+        """Insert weather data into TimescaleDB"""
+        spooled = self.counters["rows_spooled"]
+        if self.insert_weather_rows([self.weather_row(city, weather_data)]):
+            if self.counters["rows_spooled"] == spooled:
+                print(f"✅ Inserted weather data for {city}: {weather_data['temperature']}°C")
+            return True
+        return False
+
+    def replay_spool(self):
+        """Try once to drain spooled rows (used outside the background replayer)"""
+        if self.spool.depth <= 0:
+            return 0
+        try:
+            written = self.spool.replay(lambda: psycopg2.connect(**self.db_config))
+            print(f"♻️  Replayed {written} spooled weather rows")
+            return written
+        except Exception as e:
+            print(f"❌ Spool replay failed: {e}")
+            return 0
 
     def run_ingestion_cycle(self):
         """Run one complete ingestion cycle for all cities"""
         print(f"🌤️  Starting weather ingestion at {datetime.now()}")
 
-        success_count = 0
-        for city, coordinates in self.cities.items():
-            weather_data = self.fetch_weather_data(city, coordinates)
+        t0 = time.time()
+        stale = self.stale_cities()
+        fetched = []
+        for city, data in self.fetch_all(stale):
+            if not data:
+                continue
+            self.counters["fetched"] += 1
+            if self.last_written.get(city) == data["timestamp"]:
+                # Already in the database, so it can be served from cache until it expires
+                self.cache[self.cache_key(self.cities[city])] = data
+                self.counters["duplicates_skipped"] += 1
+                continue
+            fetched.append((city, data))
+        fetch_elapsed = time.time() - t0
 
-            if weather_data:
-                if self.insert_weather_data(city, weather_data):
-                    success_count += 1
-                time.sleep(1)  # Be nice to the API
+        before = self.counters["rows_spooled"]
+        written = self.insert_weather_rows([self.weather_row(city, data) for city, data in fetched])
+        spooled = self.counters["rows_spooled"] - before
+        success_count = (written or 0) - spooled
+        # Only cache observations that were written or spooled; a failed insert is retried next cycle
+        if written is not None:
+            for city, data in fetched:
+                self.last_written[city] = data["timestamp"]
+                self.cache[self.cache_key(self.cities[city])] = data
+                mark = "💾" if spooled else "✅"
+                print(f"{mark} {city}: {data['temperature']}°C")
 
-        print(f"📊 Ingestion complete: {success_count}/{len(self.cities)} cities updated")
+        c = self.counters
+        spooled_note = f", {spooled} spooled (not yet in the database)" if spooled else ""
+        print(
+            f"📊 Ingestion complete: {success_count} new rows{spooled_note}, {len(self.cities) - len(stale)} cached, "
+            f"{len(stale)} fetched (fetch {fetch_elapsed:.2f} s, total {time.time() - t0:.2f} s)"
+        )
+        print(
+            f"   totals: fetched {c['fetched']} | cache hits {c['cache_hits']} | "
+            f"duplicates skipped {c['duplicates_skipped']} | rows written {c['rows_written']} | "
+            f"rows spooled {c['rows_spooled']}"
+        )
+        if self.spool.depth > 0:
+            m = self.spool.metrics()
+            print(f"💾 Spool: {m['depth']} rows pending, last replay {m['replay_rate']:.0f} rows/s")
         return success_count
 
     def run_continuous(self, interval_minutes=15):
@@ -129,6 +330,7 @@ class WeatherIngestion:
         print(f"🔄 Starting continuous weather ingestion (every {interval_minutes} minutes)")
         print("Press Ctrl+C to stop")
 
+        self.spool.start_replayer(lambda: psycopg2.connect(**self.db_config))
         try:
             while True:
                 self.run_ingestion_cycle()
@@ -136,6 +338,9 @@ class WeatherIngestion:
                 time.sleep(interval_minutes * 60)
         except KeyboardInterrupt:
             print("\n🛑 Stopping weather ingestion")
+        finally:
+            self.spool.stop_replayer()
+            self.close_pool()
 
 
 if __name__ == "__main__":
@@ -143,6 +348,7 @@ if __name__ == "__main__":
 
     # Run a single cycle first
     print("🧪 Testing single ingestion cycle...")
+    ingestion.replay_spool()
     ingestion.run_ingestion_cycle()
 
     # Ask user if they want continuous ingestion
@@ -152,4 +358,5 @@ if __name__ == "__main__":
     if response == "y":
         ingestion.run_continuous(interval_minutes=1)  # Every 1 minute for demo
     else:
+        ingestion.close_pool()
         print("✅ Single ingestion complete!")
@@ -41,14 +41,14 @@ BEGIN
     IF NEW.temperature > 30.0 THEN 
         INSERT INTO temperature_alerts (device_id, temperature, threshold_exceeded, message) 
         VALUES (NEW.device_id, NEW.temperature, 30.0,  
-                format('High temperature alert: %.1f°C at %s', NEW.temperature, NEW.location)); 
+                format('High temperature alert: %s°C at %s', round(NEW.temperature::numeric, 1), NEW.location)); 
     END IF; 
      
     -- Alert if temperature < 15°C 
     IF NEW.temperature < 15.0 THEN 
         INSERT INTO temperature_alerts (device_id, temperature, threshold_exceeded, message) 
         VALUES (NEW.device_id, NEW.temperature, 15.0, 
-                format('Low temperature alert: %.1f°C at %s', NEW.temperature, NEW.location)); 
+                format('Low temperature alert: %s°C at %s', round(NEW.temperature::numeric, 1), NEW.location)); 
     END IF; 
      
     RETURN NEW; 
@@ -62,6 +62,52 @@ CREATE TRIGGER temperature_alert_trigger
     FOR EACH ROW 
     EXECUTE FUNCTION check_temperature_alert(); 
  
+-- Batch-friendly alerting: one statement per INSERT/COPY instead of one plpgsql call per row.
+-- The transition table holds every row the statement inserted, so all breaches are written
+-- with a single INSERT ... SELECT. Transition tables on hypertables need a TimescaleDB
+-- release that supports them (older releases reject the CREATE TRIGGER below).
+CREATE OR REPLACE FUNCTION check_temperature_alerts_batch()
+RETURNS TRIGGER AS $$
+BEGIN
+    INSERT INTO temperature_alerts (device_id, temperature, threshold_exceeded, message)
+    SELECT device_id, temperature, 30.0,
+           format('High temperature alert: %s°C at %s', round(temperature::numeric, 1), location)
+    FROM new_rows
+    WHERE temperature > 30.0
+    UNION ALL
+    SELECT device_id, temperature, 15.0,
+           format('Low temperature alert: %s°C at %s', round(temperature::numeric, 1), location)
+    FROM new_rows
+    WHERE temperature < 15.0;
+
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Switch alerting between 'row' (default), 'statement' and 'none'
+CREATE OR REPLACE FUNCTION set_temperature_alert_mode(mode TEXT)
+RETURNS VOID AS $$
+BEGIN
+    DROP TRIGGER IF EXISTS temperature_alert_trigger ON sensor_readings;
+    DROP TRIGGER IF EXISTS temperature_alert_batch_trigger ON sensor_readings;
+
+    IF mode = 'row' THEN
+        CREATE TRIGGER temperature_alert_trigger
+            AFTER INSERT ON sensor_readings
+            FOR EACH ROW
+            EXECUTE FUNCTION check_temperature_alert();
+    ELSIF mode = 'statement' THEN
+        CREATE TRIGGER temperature_alert_batch_trigger
+            AFTER INSERT ON sensor_readings
+            REFERENCING NEW TABLE AS new_rows
+            FOR EACH STATEMENT
+            EXECUTE FUNCTION check_temperature_alerts_batch();
+    ELSIF mode <> 'none' THEN
+        RAISE EXCEPTION 'unknown temperature alert mode: %', mode;
+    END IF;
+END;
+$$ LANGUAGE plpgsql;
+
 -- Create continuous aggregate for hourly averages 
 CREATE MATERIALIZED VIEW hourly_averages 
 WITH (timescaledb.continuous) AS 
@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+# alert_benchmark.py
+# Ingest throughput into sensor_readings with the per-row alert trigger, the statement-level
+# (transition table) trigger, and no trigger. Uses set_temperature_alert_mode() from
+# init-scripts/01-setup.sql; benchmark rows use BENCH_ device ids and are deleted afterwards.
+
+import argparse
+import io
+import random
+import statistics
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+
+import psycopg2
+from psycopg2.extras import execute_values
+
+MODES = ["none", "row", "statement"]
+TRIGGER_MODES = {
+    "temperature_alert_trigger": "row",
+    "temperature_alert_batch_trigger": "statement",
+}
+
+
+def parse_args():
+    p = argparse.ArgumentParser()
+    p.add_argument(
+        "--dsn",
+        default="dbname=iot_monitoring user=admin password=password123 host=localhost port=5555",
+    )
+    p.add_argument("--rows", type=int, default=200000)
+    p.add_argument("--batch", type=int, default=5000)
+    p.add_argument("--method", choices=["copy", "insert"], default="copy")
+    p.add_argument("--breach-ratio", type=float, default=0.05, help="share of rows outside 15-30°C")
+    p.add_argument("--repeat", type=int, default=3)
+    p.add_argument("--modes", default=",".join(MODES))
+    return p.parse_args()
+
+
+def make_rows(count, breach_ratio):
+    start = datetime.now(timezone.utc) - timedelta(seconds=count)
+    rows = []
+    for i in range(count):
+        if random.random() < breach_ratio:
+            temperature = random.choice([random.uniform(30.5, 40), random.uniform(10, 14.5)])
+        else:
+            temperature = random.uniform(15, 30)
+        rows.append(
+            (
+                start + timedelta(seconds=i),
+                f"BENCH_{i % 100:03d}",
+                "Benchmark",
+                round(temperature, 1),
+                random.randint(30, 70),
+                random.randint(80, 100),
+            )
+        )
+    return rows
+
+
+def load_copy(cur, rows):
+    buf = io.StringIO()
+    for r in rows:
+        buf.write(f"{r[0].isoformat()}\t{r[1]}\t{r[2]}\t{r[3]}\t{r[4]}\t{r[5]}\n")
+    buf.seek(0)
+    cur.copy_expert(
+        "COPY sensor_readings (time, device_id, location, temperature, humidity, battery_level) "
+        "FROM STDIN",
+        buf,
+    )
+
+
+def load_insert(cur, rows):
+    execute_values(
+        cur,
+        "INSERT INTO sensor_readings "
+        "(time, device_id, location, temperature, humidity, battery_level) VALUES %s",
+        rows,
+        page_size=len(rows),
+    )
+
+
+def current_mode(cur):
+    cur.execute(
+        "SELECT tgname FROM pg_trigger WHERE tgrelid = 'sensor_readings'::regclass AND NOT tgisinternal"
+    )
+    names = {r[0] for r in cur.fetchall()}
+    modes = [mode for name, mode in TRIGGER_MODES.items() if name in names]
+    return modes[0] if modes else "none"
+
+
+def cleanup(conn):
+    cur = conn.cursor()
+    cur.execute("DELETE FROM sensor_readings WHERE device_id LIKE 'BENCH\\_%'")
+    cur.execute("DELETE FROM temperature_alerts WHERE device_id LIKE 'BENCH\\_%'")
+    conn.commit()
+
+
+def run(conn, mode, rows, args):
+    cur = conn.cursor()
+    cur.execute("SELECT set_temperature_alert_mode(%s)", (mode,))
+    conn.commit()
+    cleanup(conn)
+
+    load = load_copy if args.method == "copy" else load_insert
+    t0 = time.time()
+    for i in range(0, len(rows), args.batch):
+        load(cur, rows[i:i + args.batch])
+        conn.commit()
+    elapsed = time.time() - t0
+
+    cur.execute("SELECT count(*) FROM temperature_alerts WHERE device_id LIKE 'BENCH\\_%'")
+    alerts = cur.fetchone()[0]
+    return len(rows) / elapsed, alerts
+
+
+def main():
+    args = parse_args()
+    modes = [m for m in args.modes.split(",") if m]
+
+    conn = psycopg2.connect(args.dsn)
+    cur = conn.cursor()
+    cur.execute("SELECT to_regprocedure('set_temperature_alert_mode(text)') IS NOT NULL")
+    if not cur.fetchone()[0]:
+        print(
+            "set_temperature_alert_mode() is missing; recreate the database so init-scripts/01-setup.sql "
+            "runs again: docker compose down -v && docker compose up -d"
+        )
+        return 1
+    original_mode = current_mode(cur)
+
+    rows = make_rows(args.rows, args.breach_ratio)
+    expected = sum(1 for r in rows if r[3] > 30.0 or r[3] < 15.0)
+    print(
+        f"Loading {args.rows} rows via {args.method} in batches of {args.batch} "
+        f"({expected} threshold breaches), {args.repeat} run(s) per mode"
+    )
+
+    results = {m: [] for m in modes}
+    alerts = {}
+    mismatches = {}
+    try:
+        for _ in range(args.repeat):
+            for mode in modes:
+                rate, alerts[mode] = run(conn, mode, rows, args)
+                results[mode].append(rate)
+                # A fast run means nothing if the trigger path didn't raise the right alerts
+                wanted = 0 if mode == "none" else expected
+                if alerts[mode] != wanted:
+                    mismatches[mode] = (wanted, alerts[mode])
+    finally:
+        conn.rollback()
+        cleanup(conn)
+        cur.execute("SELECT set_temperature_alert_mode(%s)", (original_mode,))
+        conn.commit()
+        conn.close()
+
+    print(f"\n{'mode':<10} {'median rows/s':>14} {'min':>12} {'max':>12} {'alerts':>8} {'expected':>9}")
+    for mode in modes:
+        rates = results[mode]
+        if not rates:
+            continue
+        print(
+            f"{mode:<10} {statistics.median(rates):>14.0f} {min(rates):>12.0f} "
+            f"{max(rates):>12.0f} {alerts[mode]:>8} {0 if mode == 'none' else expected:>9}"
+        )
+    print(f"\nAlert mode restored to '{original_mode}'")
+
+    for mode, (wanted, got) in mismatches.items():
+        print(f"❌ {mode}: expected {wanted} alerts, got {got}; its timings are not comparable")
+    return 1 if mismatches else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
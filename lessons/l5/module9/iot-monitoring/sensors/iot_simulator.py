@@ -1,16 +1,38 @@
 #!/usr/bin/env python3
 import psycopg2
+import argparse
+import asyncio
+import heapq
+import os
 import time
 import random
-from datetime import datetime
+from datetime import datetime, timezone
 import threading
+import numpy as np
+import sys
+from metrics import SimulatorMetrics
+
+# spool.py is shared with module8 and lives in lessons/l5/common
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "..", "common"))
+from spool import WriteAheadSpool, spool_directory  # noqa: E402
+
+READING_COLUMNS = ("time", "device_id", "location", "temperature", "humidity", "battery_level")
+
+# Templates for generated fleets: (location, base temperature)
+SENSOR_TEMPLATES = [
+    ("Office", 22.0),
+    ("Server Room", 26.0),
+    ("Warehouse", 18.0),
+    ("Kitchen", 24.0),
+]
 
 
 class IoTSensor:
-    def __init__(self, device_id, location, base_temp=22.0):
+    def __init__(self, device_id, location, base_temp=22.0, interval=2.0):
         self.device_id = device_id
         self.location = location
         self.base_temp = base_temp
+        self.interval = interval
         self.current_temp = base_temp
         self.battery = random.randint(80, 100)
         self.running = True
@@ -39,9 +61,255 @@ class IoTSensor:
             "timestamp": datetime.now(),
         }
 
+    def get_row(self, timestamp):
+        """Reading as a tuple in READING_COLUMNS order (no per-reading dict)"""
+        return (
+            timestamp,
+            self.device_id,
+            self.location,
+            self.generate_temperature(),
+            random.randint(30, 70),
+            self.battery,
+        )
+
+
+class SensorFleet:
+    """Fleet state held in NumPy arrays and advanced in one vectorized step per tick"""
+
+    def __init__(self, device_ids, locations, base_temps, interval=2.0, seed=None):
+        self.rng = np.random.default_rng(seed)
+        self.device_ids = list(device_ids)
+        self.locations = list(locations)
+        self.base_temp = np.asarray(base_temps, dtype=np.float64)
+        self.current_temp = self.base_temp.copy()
+        self.battery = self.rng.integers(80, 101, size=len(self.device_ids))
+        self.interval = interval
+
+    @classmethod
+    def from_templates(cls, count, interval=2.0, seed=None):
+        templates = [SENSOR_TEMPLATES[n % len(SENSOR_TEMPLATES)] for n in range(count)]
+        return cls(
+            [f"SENSOR_{n + 1:06d}" for n in range(count)],
+            [t[0] for t in templates],
+            [t[1] for t in templates],
+            interval,
+            seed,
+        )
+
+    def __len__(self):
+        return len(self.device_ids)
+
+    def step(self, idx=slice(None)):
+        """Advance the random walk for `idx` (default: whole fleet); returns (temperatures, humidity)"""
+        n = len(self.current_temp[idx])
+        temps = self.current_temp[idx] + self.rng.uniform(-0.5, 0.5, size=n)
+        # Keep within reasonable bounds
+        np.clip(temps, 10, 40, out=temps)
+        self.current_temp[idx] = temps
+
+        # Occasional battery drain (1% chance per reading)
+        drain = self.rng.random(n) < 0.01
+        self.battery[idx] = np.maximum(0, self.battery[idx] - drain)
+
+        return np.round(temps, 1), self.rng.integers(30, 71, size=n)
+
+    def records(self, timestamp):
+        """Advance the whole fleet and return its readings as tuples in READING_COLUMNS order"""
+        temps, humidity = self.step()
+        return list(
+            zip(
+                [timestamp] * len(self),
+                self.device_ids,
+                self.locations,
+                temps.tolist(),
+                humidity.tolist(),
+                self.battery.tolist(),
+            )
+        )
+
+    def sensor(self, index):
+        return FleetSensorView(self, index)
+
+
+class FleetSensorView(IoTSensor):
+    """IoTSensor interface over one device of a SensorFleet"""
+
+    def __init__(self, fleet, index):
+        self.fleet = fleet
+        self.index = index
+        self.running = True
+
+    @property
+    def device_id(self):
+        return self.fleet.device_ids[self.index]
+
+    @property
+    def location(self):
+        return self.fleet.locations[self.index]
+
+    @property
+    def interval(self):
+        return self.fleet.interval
+
+    @property
+    def base_temp(self):
+        return float(self.fleet.base_temp[self.index])
+
+    @property
+    def current_temp(self):
+        return float(self.fleet.current_temp[self.index])
+
+    @current_temp.setter
+    def current_temp(self, value):
+        self.fleet.current_temp[self.index] = value
+
+    @property
+    def battery(self):
+        return int(self.fleet.battery[self.index])
+
+    @battery.setter
+    def battery(self, value):
+        self.fleet.battery[self.index] = value
+
+    def generate_temperature(self):
+        temps, _ = self.fleet.step(slice(self.index, self.index + 1))
+        return float(temps[0])
+
+
+class AsyncEngine:
+    """Drive every sensor from one event loop and write batches over a small asyncpg pool"""
+
+    def __init__(self, simulator, pool_size=4, batch_size=2000, tick=0.05, queue_batches=16):
+        self.simulator = simulator
+        self.pool_size = pool_size
+        self.batch_size = batch_size
+        self.tick = tick
+        self.queue = None
+        self.queue_batches = queue_batches
+        self.running = False
+        self.generated = 0
+
+    async def schedule(self):
+        """Pop sensors off a deadline heap as their own interval comes due and batch the readings"""
+        loop = asyncio.get_running_loop()
+        sensors = self.simulator.sensors
+        start = loop.time()
+        # Spread first readings over each sensor's interval so load is even
+        heap = [(start + random.uniform(0, s.interval), i) for i, s in enumerate(sensors)]
+        heapq.heapify(heap)
+
+        batch = []
+        while self.running:
+            now = loop.time()
+            ts = datetime.now(timezone.utc)
+            while heap and heap[0][0] <= now:
+                due, i = heapq.heappop(heap)
+                sensor = sensors[i]
+                batch.append(sensor.get_row(ts))
+                heapq.heappush(heap, (due + sensor.interval, i))
+                if len(batch) >= self.batch_size:
+                    await self.queue.put(batch)
+                    self.generated += len(batch)
+                    batch = []
+            if batch:
+                await self.queue.put(batch)
+                self.generated += len(batch)
+                batch = []
+
+            wait = heap[0][0] - loop.time() if heap else self.tick
+            await asyncio.sleep(max(self.tick, wait))
+
+    async def schedule_fleet(self):
+        """Advance the whole SensorFleet once per interval and queue its records in batches"""
+        loop = asyncio.get_running_loop()
+        fleet = self.simulator.fleet
+        due = loop.time()
+
+        while self.running:
+            records = fleet.records(datetime.now(timezone.utc))
+            for i in range(0, len(records), self.batch_size):
+                await self.queue.put(records[i:i + self.batch_size])
+            self.generated += len(records)
+
+            due += fleet.interval
+            await asyncio.sleep(max(0, due - loop.time()))
+
+    async def write(self, pool, name):
+        import asyncpg
+
+        loop = asyncio.get_running_loop()
+        metrics = self.simulator.metrics.worker(name)
+        while True:
+            batch = await self.queue.get()
+            if batch is None:
+                return
+            if self.simulator.spool.outage:
+                await loop.run_in_executor(None, self.simulator.spool.append, batch)
+                continue
+            # A refused batch is retried once (deadlocks and the like are transient); if it
+            # fails again it is set aside in the spool's rejected file rather than lost
+            for attempt in range(2):
+                t0 = time.perf_counter()
+                try:
+                    async with pool.acquire() as conn:
+                        await conn.copy_records_to_table(
+                            "sensor_readings", records=batch, columns=READING_COLUMNS
+                        )
+                    # Latency here is per COPY batch, not per reading
+                    metrics.success(time.perf_counter() - t0, len(batch))
+                    break
+                except (OSError, asyncpg.PostgresConnectionError, asyncpg.InterfaceError) as e:
+                    metrics.error(len(batch))
+                    await loop.run_in_executor(None, self.simulator.spool.append, batch)
+                    print(f"Database unavailable, spooling readings ({self.simulator.spool.depth} pending): {e}")
+                    break
+                except Exception as e:
+                    if attempt == 0:
+                        print(f"Database error, retrying batch of {len(batch)} readings: {e}")
+                        continue
+                    metrics.error(len(batch))
+                    await loop.run_in_executor(None, self.simulator.spool.reject, batch, e)
+
+    async def report(self, interval=10):
+        while self.running:
+            await asyncio.sleep(interval)
+            self.simulator.report_metrics({"queue_batches": self.queue.qsize()})
+
+    async def run(self, duration=None):
+        import asyncpg
+
+        pool = await asyncpg.create_pool(
+            # min_size=0: start even if the database is down; writers spool until it is back
+            min_size=0, max_size=self.pool_size, **self.simulator.db_config
+        )
+        self.queue = asyncio.Queue(maxsize=self.queue_batches)
+        self.running = True
+
+        writers = [
+            asyncio.create_task(self.write(pool, f"writer-{n}")) for n in range(self.pool_size)
+        ]
+        if self.simulator.fleet is not None:
+            scheduler = asyncio.create_task(self.schedule_fleet())
+        else:
+            scheduler = asyncio.create_task(self.schedule())
+        reporter = asyncio.create_task(self.report())
+        try:
+            if duration is None:
+                await scheduler
+            else:
+                await asyncio.sleep(duration)
+        finally:
+            self.running = False
+            reporter.cancel()
+            await asyncio.gather(scheduler, return_exceptions=True)
+            for _ in writers:
+                await self.queue.put(None)
+            await asyncio.gather(*writers)
+            await pool.close()
+
 
 class IoTSimulator:
-    def __init__(self):
+    def __init__(self, metrics_file=None):
         self.db_config = {
             "host": "localhost",
             "port": 5555,
@@ -59,12 +327,73 @@ class IoTSimulator:
         ]
 
         self.running = True
-        self.total_readings = 0
+
+        # Optional array-backed fleet for the async engine (see build_fleet)
+        self.fleet = None
+
+        # Per-worker counters and insert latency, merged for each report
+        self.metrics = SimulatorMetrics(metrics_file)
+
+        # Readings land here while the database is unreachable and are replayed on reconnect
+        self.spool = WriteAheadSpool(
+            spool_directory(__file__, self.db_config["database"], "sensor_readings"),
+            "sensor_readings",
+            READING_COLUMNS,
+        )
+
+    def build_sensors(self, count, interval=2.0):
+        """Replace the demo sensors with a generated fleet of `count` sensors"""
+        self.sensors = [
+            IoTSensor(
+                f"SENSOR_{n + 1:06d}",
+                SENSOR_TEMPLATES[n % len(SENSOR_TEMPLATES)][0],
+                SENSOR_TEMPLATES[n % len(SENSOR_TEMPLATES)][1],
+                interval,
+            )
+            for n in range(count)
+        ]
+
+    def build_fleet(self, count, interval=2.0):
+        """Use an array-backed SensorFleet; self.sensors become per-device views onto it"""
+        self.fleet = SensorFleet.from_templates(count, interval)
+        self.sensors = [self.fleet.sensor(i) for i in range(count)]
+
+    @property
+    def total_readings(self):
+        return self.metrics.total_readings
+
+    def report_metrics(self, extra=None):
+        spool = self.spool.metrics()
+        record = self.metrics.report(
+            dict(extra or {}, spool_depth=spool["depth"], spool_replayed=spool["replayed_total"])
+        )
+        if spool["depth"] or spool["replayed_total"]:
+            print(
+                f"Spool depth: {spool['depth']}, replayed: {spool['replayed_total']} "
+                f"({spool['replay_rate']:.0f} rows/s)"
+            )
+        return record
 
     def connect_db(self):
         return psycopg2.connect(**self.db_config)
 
     def insert_reading(self, reading):
+        row = (
+            reading["timestamp"],
+            reading["device_id"],
+            reading["location"],
+            reading["temperature"],
+            reading["humidity"],
+            reading["battery_level"],
+        )
+
+        # Don't reconnect per reading while the database is known to be down
+        if self.spool.outage:
+            self.spool.append([row])
+            return True
+
+        metrics = self.metrics.worker()
+        t0 = time.perf_counter()
         try:
             conn = self.connect_db()
             cursor = conn.cursor()
@@ -76,24 +405,24 @@ class IoTSimulator:
                 )
                 VALUES (%s, %s, %s, %s, %s, %s)
                 """,
-                (
-                    reading["timestamp"],
-                    reading["device_id"],
-                    reading["location"],
-                    reading["temperature"],
-                    reading["humidity"],
-                    reading["battery_level"],
-                ),
+                row,
             )
 
             conn.commit()
             cursor.close()
             conn.close()
 
-            self.total_readings += 1
+            metrics.success(time.perf_counter() - t0)
+            return True
+
+        except (psycopg2.OperationalError, psycopg2.InterfaceError) as e:
+            metrics.error()
+            self.spool.append([row])
+            print(f"Database unavailable, spooling readings ({self.spool.depth} pending): {e}")
             return True
 
         except Exception as e:
+            metrics.error()
             print(f"Database error: {e}")
             return False
 
@@ -105,12 +434,14 @@ class IoTSimulator:
             if success:
                 print(f"{sensor.device_id}: {reading['temperature']}°C at {sensor.location}")
 
-            time.sleep(2)  # Send data every 2 seconds
+            time.sleep(sensor.interval)  # Send data every 2 seconds by default
 
     def start_simulation(self):
         print("Starting IoT Sensor Simulation")
         print(f"Monitoring {len(self.sensors)} sensors...")
 
+        self.spool.start_replayer(self.connect_db)
+
         # Start threads for each sensor
         threads = []
         for sensor in self.sensors:
@@ -122,12 +453,57 @@ class IoTSimulator:
         try:
             while True:
                 time.sleep(10)
-                print(f"Total readings sent: {self.total_readings}")
+                self.report_metrics()
+        except KeyboardInterrupt:
+            print("\nStopping simulation...")
+            self.running = False
+            self.spool.stop_replayer()
+
+    def start_async_simulation(self, pool_size=4, batch_size=2000, duration=None):
+        try:
+            import asyncpg  # noqa: F401
+        except ImportError:
+            print("The async engine needs asyncpg: pip install asyncpg")
+            return
+
+        print("Starting IoT Sensor Simulation (asyncio engine)")
+        kind = "fleet sensors" if self.fleet is not None else "sensors"
+        print(f"Monitoring {len(self.sensors)} {kind} with {pool_size} connections...")
+
+        self.spool.start_replayer(self.connect_db)
+        engine = AsyncEngine(self, pool_size=pool_size, batch_size=batch_size)
+        try:
+            asyncio.run(engine.run(duration))
         except KeyboardInterrupt:
             print("\nStopping simulation...")
+        finally:
             self.running = False
+            self.spool.stop_replayer()
+            print(f"Total readings sent: {self.total_readings}")
+
+
+def parse_args():
+    p = argparse.ArgumentParser()
+    p.add_argument("--engine", choices=["threads", "async"], default="threads")
+    p.add_argument("--sensors", type=int, default=None, help="generate N sensors instead of the 4 demo ones")
+    p.add_argument("--interval", type=float, default=2.0, help="seconds between readings per sensor")
+    p.add_argument("--fleet", action="store_true", help="vectorized SensorFleet state (async engine)")
+    p.add_argument("--pool-size", type=int, default=4)
+    p.add_argument("--batch-size", type=int, default=2000)
+    p.add_argument("--duration", type=float, default=None, help="seconds to run (async engine)")
+    p.add_argument("--metrics-file", default=None, help="append each report as a JSON line")
+    return p.parse_args()
 
 
 if __name__ == "__main__":
-    simulator = IoTSimulator()
-    simulator.start_simulation()
+    args = parse_args()
+    simulator = IoTSimulator(metrics_file=args.metrics_file)
+    if args.sensors and args.fleet:
+        simulator.build_fleet(args.sensors, args.interval)
+    elif args.sensors:
+        simulator.build_sensors(args.sensors, args.interval)
+
+    if args.engine == "async":
+        simulator.start_async_simulation(args.pool_size, args.batch_size, args.duration)
+    else:
+        simulator.start_simulation()
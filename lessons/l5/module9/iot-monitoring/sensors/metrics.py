@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+import json
+import math
+import threading
+import time
+
+# Log-linear buckets: exact below 2 * SUB_BUCKETS us, then SUB_BUCKETS buckets per power of two
+# (about 1.6% relative error), the same layout an HDR histogram with 2 significant digits uses.
+SUB_BITS = 6
+SUB_BUCKETS = 1 << SUB_BITS
+LINEAR_LIMIT = 2 * SUB_BUCKETS
+MAX_SHIFT = 40
+
+
+def bucket_index(value_us):
+    if value_us < LINEAR_LIMIT:
+        return value_us
+    shift = min(value_us.bit_length() - SUB_BITS - 1, MAX_SHIFT)
+    return LINEAR_LIMIT + (shift - 1) * SUB_BUCKETS + (min(value_us >> shift, 2 * SUB_BUCKETS - 1) - SUB_BUCKETS)
+
+
+def bucket_upper(index):
+    """Highest value (us) that falls in a bucket"""
+    if index < LINEAR_LIMIT:
+        return index
+    shift = (index - LINEAR_LIMIT) // SUB_BUCKETS + 1
+    mantissa = (index - LINEAR_LIMIT) % SUB_BUCKETS + SUB_BUCKETS
+    return ((mantissa + 1) << shift) - 1
+
+
+BUCKETS = LINEAR_LIMIT + MAX_SHIFT * SUB_BUCKETS
+
+
+class LatencyHistogram:
+    """Fixed-size log-linear latency histogram in microseconds"""
+
+    def __init__(self):
+        self.counts = [0] * BUCKETS
+        self.count = 0
+        self.max_us = 0
+
+    def record(self, seconds):
+        value_us = max(0, int(seconds * 1_000_000))
+        self.counts[bucket_index(value_us)] += 1
+        self.count += 1
+        if value_us > self.max_us:
+            self.max_us = value_us
+
+    def merge(self, other):
+        for i, c in enumerate(other.counts):
+            if c:
+                self.counts[i] += c
+        self.count += other.count
+        self.max_us = max(self.max_us, other.max_us)
+
+    def copy(self):
+        h = LatencyHistogram()
+        h.merge(self)
+        return h
+
+    def since(self, earlier):
+        """Histogram of what was recorded after `earlier` (a previous copy of this one)"""
+        h = LatencyHistogram()
+        h.counts = [a - b for a, b in zip(self.counts, earlier.counts)]
+        h.count = self.count - earlier.count
+        top = max((i for i, c in enumerate(h.counts) if c), default=0)
+        h.max_us = min(bucket_upper(top), self.max_us)
+        return h
+
+    def percentile(self, pct):
+        """Latency in seconds at or below which `pct` percent of samples fall"""
+        if not self.count:
+            return 0.0
+        rank = max(1, math.ceil(pct / 100 * self.count))
+        seen = 0
+        for i, c in enumerate(self.counts):
+            seen += c
+            if seen >= rank:
+                return min(bucket_upper(i), self.max_us) / 1_000_000
+        return self.max_us / 1_000_000
+
+
+class WorkerMetrics:
+    """Counters owned by a single worker; only that worker writes them, so no lock is needed"""
+
+    def __init__(self):
+        self.readings = 0
+        self.errors = 0
+        self.latency = LatencyHistogram()
+
+    def success(self, seconds, readings=1):
+        self.readings += readings
+        self.latency.record(seconds)
+
+    def error(self, readings=1):
+        self.errors += readings
+
+
+class SimulatorMetrics:
+    """Per-worker counters merged on demand, with periodic reports and JSON-lines export"""
+
+    def __init__(self, jsonl_path=None):
+        self.lock = threading.Lock()
+        self.workers = {}
+        self.jsonl_path = jsonl_path
+        self.started = time.monotonic()
+        self.last = (self.started, 0, 0, LatencyHistogram())
+
+    def worker(self, key=None):
+        """Counters for the calling thread (or an explicit key, e.g. an asyncio task name)"""
+        key = threading.get_ident() if key is None else key
+        w = self.workers.get(key)
+        if w is None:
+            # Registration is the only write that needs the lock
+            with self.lock:
+                w = self.workers.setdefault(key, WorkerMetrics())
+        return w
+
+    def totals(self):
+        with self.lock:
+            workers = list(self.workers.values())
+        readings = errors = 0
+        latency = LatencyHistogram()
+        for w in workers:
+            readings += w.readings
+            errors += w.errors
+            latency.merge(w.latency)
+        return readings, errors, latency
+
+    @property
+    def total_readings(self):
+        return sum(w.readings for w in list(self.workers.values()))
+
+    def report(self, extra=None):
+        """Print and export the interval since the previous report"""
+        now = time.monotonic()
+        readings, errors, latency = self.totals()
+        last_time, last_readings, last_errors, last_latency = self.last
+        self.last = (now, readings, errors, latency)
+
+        interval = now - last_time
+        window = latency.since(last_latency)
+        n = readings - last_readings
+        e = errors - last_errors
+        record = {
+            "ts": time.time(),
+            "interval_s": round(interval, 3),
+            "readings": n,
+            "readings_per_s": round(n / interval, 2) if interval else 0.0,
+            "errors": e,
+            "error_rate": round(e / (n + e), 4) if n + e else 0.0,
+            "p50_ms": round(window.percentile(50) * 1000, 3),
+            "p95_ms": round(window.percentile(95) * 1000, 3),
+            "p99_ms": round(window.percentile(99) * 1000, 3),
+            "max_ms": round(window.max_us / 1000, 3),
+            "total_readings": readings,
+        }
+        if extra:
+            record.update(extra)
+
+        print(
+            f"Total readings sent: {readings} | {record['readings_per_s']:.0f}/s | "
+            f"insert p50 {record['p50_ms']:.1f} ms, p95 {record['p95_ms']:.1f} ms, "
+            f"p99 {record['p99_ms']:.1f} ms, max {record['max_ms']:.1f} ms | "
+            f"errors {record['error_rate']:.2%}"
+        )
+        if self.jsonl_path:
+            with open(self.jsonl_path, "a") as f:
+                f.write(json.dumps(record) + "\n")
+        return record
@@ -0,0 +1,155 @@
+import asyncio
+import json
+import os
+import re
+from datetime import datetime, timezone
+
+import asyncpg
+import numpy as np
+import pytest
+
+from iot_simulator import READING_COLUMNS, SENSOR_TEMPLATES, AsyncEngine, IoTSimulator, SensorFleet
+
+SETUP_SQL = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "init-scripts", "01-setup.sql")
+
+
+@pytest.fixture
+def simulator(tmp_path, monkeypatch):
+    monkeypatch.setenv("SPOOL_DIR", str(tmp_path))
+    return IoTSimulator()
+
+
+class FakePool:
+    """asyncpg pool stand-in; copy_records_to_table raises the queued errors in order, then succeeds"""
+
+    def __init__(self, errors=()):
+        self.errors = list(errors)
+        self.copies = []
+
+    def acquire(self):
+        return self
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        pass
+
+    async def copy_records_to_table(self, table, records, columns):
+        self.copies.append(len(records))
+        if self.errors:
+            raise self.errors.pop(0)
+
+
+def run_writer(simulator, pool, batches):
+    async def main():
+        engine = AsyncEngine(simulator)
+        engine.queue = asyncio.Queue()
+        for batch in batches + [None]:
+            await engine.queue.put(batch)
+        await engine.write(pool, "writer-0")
+
+    asyncio.run(main())
+    readings, errors, _ = simulator.metrics.totals()
+    return readings, errors
+
+
+def make_batch(size):
+    ts = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    return [(ts, f"SENSOR_{i:06d}", "Room", 22.5, 45.0, 90) for i in range(size)]
+
+
+def test_refused_batch_is_retried_once(simulator):
+    pool = FakePool([asyncpg.DeadlockDetectedError("deadlock detected")])
+    assert run_writer(simulator, pool, [make_batch(3)]) == (3, 0)
+    assert pool.copies == [3, 3]
+    assert simulator.spool.metrics()["rejected_total"] == 0
+
+
+def test_batch_refused_twice_is_counted_and_set_aside(simulator):
+    pool = FakePool([asyncpg.DataError("bad value")] * 2)
+    assert run_writer(simulator, pool, [make_batch(3), make_batch(2)]) == (2, 3)
+    assert pool.copies == [3, 3, 2]
+
+    assert simulator.spool.metrics()["rejected_total"] == 3
+    with open(simulator.spool.rejected_path) as f:
+        rejected = [json.loads(line) for line in f]
+    assert [r["row"][1] for r in rejected] == ["SENSOR_000000", "SENSOR_000001", "SENSOR_000002"]
+    assert simulator.spool.depth == 0
+
+
+def test_lost_connection_spools_the_batch(simulator):
+    pool = FakePool([ConnectionRefusedError("connection refused")])
+    assert run_writer(simulator, pool, [make_batch(4)]) == (0, 4)
+    assert pool.copies == [4]
+    assert simulator.spool.depth == 4
+    assert simulator.spool.outage
+
+
+def test_fleet_step_keeps_values_in_range_and_never_charges_batteries():
+    fleet = SensorFleet.from_templates(500, seed=42)
+    assert fleet.battery.min() >= 80 and fleet.battery.max() <= 100
+
+    # Start some sensors at the bounds so the clamp is exercised from the first step
+    fleet.current_temp[:10] = 10.0
+    fleet.current_temp[10:20] = 40.0
+    battery = fleet.battery.copy()
+    drained = 0
+    for _ in range(300):
+        temps, humidity = fleet.step()
+        assert temps.min() >= 10 and temps.max() <= 40
+        assert np.all((fleet.current_temp >= 10) & (fleet.current_temp <= 40))
+        assert humidity.min() >= 30 and humidity.max() <= 70
+        assert np.all(fleet.battery <= battery)
+        assert np.all(battery - fleet.battery <= 1)  # at most one point per step
+        drained += int((battery - fleet.battery).sum())
+        battery = fleet.battery.copy()
+
+    assert fleet.battery.min() >= 0
+    # ~1% of 500 sensors x 300 steps
+    assert 1000 < drained < 2000
+
+
+def test_fleet_step_on_a_slice_leaves_the_rest_alone():
+    fleet = SensorFleet.from_templates(8, seed=1)
+    before = fleet.current_temp.copy()
+    temps, humidity = fleet.step(slice(2, 4))
+    assert len(temps) == len(humidity) == 2
+    assert np.array_equal(fleet.current_temp[:2], before[:2])
+    assert np.array_equal(fleet.current_temp[4:], before[4:])
+    assert np.array_equal(np.round(fleet.current_temp[2:4], 1), temps)
+
+
+def test_same_seed_gives_the_same_readings():
+    ts = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    assert SensorFleet.from_templates(50, seed=7).records(ts) == SensorFleet.from_templates(50, seed=7).records(ts)
+    assert SensorFleet.from_templates(50, seed=7).records(ts) != SensorFleet.from_templates(50, seed=8).records(ts)
+
+
+def setup_columns():
+    """(name, type) of sensor_readings as created by init-scripts/01-setup.sql"""
+    with open(SETUP_SQL) as f:
+        body = re.search(r"CREATE TABLE sensor_readings \((.*?)\);", f.read(), re.S).group(1)
+    columns = [line.strip().rstrip(",").split() for line in body.splitlines() if line.strip()]
+    return [(c[0], " ".join(c[1:]).split(" NOT NULL")[0].split(" DEFAULT")[0]) for c in columns]
+
+
+def test_records_match_the_copy_column_order_and_types():
+    ts = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    fleet = SensorFleet.from_templates(6, seed=3)
+    records = fleet.records(ts)
+
+    columns = setup_columns()
+    assert READING_COLUMNS == tuple(name for name, _ in columns)
+
+    # copy_records_to_table encodes by column type, so the tuples must hold plain Python values
+    python_types = {"TIMESTAMPTZ": datetime, "TEXT": str, "DOUBLE PRECISION": float, "INTEGER": int}
+    for record in records:
+        assert len(record) == len(READING_COLUMNS)
+        for value, (name, sql_type) in zip(record, columns):
+            assert type(value) is python_types[sql_type], name
+
+    assert [r[0] for r in records] == [ts] * 6
+    assert [r[1] for r in records] == [f"SENSOR_{n:06d}" for n in range(1, 7)]
+    assert [r[2] for r in records] == [SENSOR_TEMPLATES[n % 4][0] for n in range(6)]
+    assert [r[5] for r in records] == fleet.battery.tolist()
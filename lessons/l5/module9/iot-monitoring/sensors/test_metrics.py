@@ -0,0 +1,155 @@
+import json
+
+import pytest
+
+from metrics import (
+    BUCKETS,
+    LINEAR_LIMIT,
+    MAX_SHIFT,
+    SUB_BITS,
+    SUB_BUCKETS,
+    LatencyHistogram,
+    SimulatorMetrics,
+    bucket_index,
+    bucket_upper,
+)
+
+
+def histogram(values_us):
+    h = LatencyHistogram()
+    for v in values_us:
+        h.record(v / 1_000_000)
+    return h
+
+
+def test_buckets_are_contiguous_and_contain_their_values():
+    previous = -1
+    for value in range(1 << 16):
+        index = bucket_index(value)
+        assert index - previous in (0, 1)
+        assert bucket_upper(index) >= value
+        assert index == 0 or bucket_upper(index - 1) < value
+        previous = index
+
+
+def test_linear_range_ends_at_the_sub_bits_boundary():
+    assert LINEAR_LIMIT == 2 << SUB_BITS
+    # Below the limit every microsecond has its own bucket
+    for value in range(LINEAR_LIMIT):
+        assert bucket_index(value) == value
+        assert bucket_upper(value) == value
+
+    # Above it each bucket is two microseconds wide, then four, ...
+    assert bucket_index(LINEAR_LIMIT) == LINEAR_LIMIT
+    assert bucket_index(LINEAR_LIMIT + 1) == LINEAR_LIMIT
+    assert bucket_index(LINEAR_LIMIT + 2) == LINEAR_LIMIT + 1
+    assert bucket_upper(LINEAR_LIMIT) == LINEAR_LIMIT + 1
+
+
+@pytest.mark.parametrize("power", range(SUB_BITS + 1, SUB_BITS + MAX_SHIFT + 1))
+def test_bucket_edges_around_powers_of_two(power):
+    edge = 1 << power
+    below, at = bucket_index(edge - 1), bucket_index(edge)
+    assert at == below + 1
+    assert bucket_upper(below) == edge - 1
+    # A new power of two starts a new run of SUB_BUCKETS buckets, each twice as wide
+    width = bucket_upper(at) - bucket_upper(below)
+    assert width == 1 << (power - SUB_BITS)
+    assert bucket_index(edge + width - 1) == at
+    assert bucket_index(edge + width) == at + 1
+
+
+def test_relative_error_is_bounded():
+    for value in [LINEAR_LIMIT, 1000, 12345, 999_999, 3_600_000_000, (1 << 40) + 12345]:
+        upper = bucket_upper(bucket_index(value))
+        assert 0 <= upper - value <= value / SUB_BUCKETS
+
+
+def test_values_past_the_top_bucket_are_clamped():
+    top = (1 << (SUB_BITS + MAX_SHIFT + 1)) - 1
+    assert bucket_index(top) == BUCKETS - 1
+    assert bucket_upper(BUCKETS - 1) == top
+    assert bucket_index(10**18) == BUCKETS - 1
+
+    h = LatencyHistogram()
+    h.record(10**9)  # ~31 years, still lands in a bucket
+    assert h.counts[-1] == 1
+
+
+def test_percentiles_of_a_known_distribution():
+    # 1..100 us sits in the exact range: the percentiles are the values themselves
+    h = histogram(range(1, 101))
+    assert h.percentile(50) == pytest.approx(50e-6)
+    assert h.percentile(95) == pytest.approx(95e-6)
+    assert h.percentile(99) == pytest.approx(99e-6)
+    assert h.percentile(100) == pytest.approx(100e-6)
+
+    # Nearest rank: the median of five samples is the third
+    assert histogram([10, 20, 30, 40, 50]).percentile(50) == pytest.approx(30e-6)
+
+    # 1..100000 us: within one bucket's error of the exact value, never past the max
+    h = histogram(range(1, 100_001))
+    for pct in (50, 90, 99, 99.9):
+        exact = pct / 100 * 100_000 / 1_000_000
+        assert exact <= h.percentile(pct) <= exact * (1 + 1 / SUB_BUCKETS)
+    assert h.percentile(100) == pytest.approx(0.1)
+
+    assert LatencyHistogram().percentile(99) == 0.0
+
+
+def test_merge_adds_counts_and_keeps_the_max():
+    a = histogram([5, 500, 5000])
+    b = histogram([7, 70_000])
+    a.merge(b)
+
+    assert a.count == 5
+    assert a.max_us == 70_000
+    assert sum(a.counts) == 5
+    assert a.counts[bucket_index(5)] == 1
+    assert a.counts[bucket_index(70_000)] == 1
+    assert a.percentile(100) == pytest.approx(0.07)
+    # merge leaves the other histogram alone
+    assert b.count == 2
+
+
+def test_since_holds_only_later_samples():
+    h = histogram([100_000, 200_000])
+    earlier = h.copy()
+    for v in (10, 20, 30):
+        h.record(v / 1_000_000)
+
+    window = h.since(earlier)
+    assert window.count == 3
+    assert window.max_us == 30
+    assert window.percentile(100) == pytest.approx(30e-6)
+    # The copy is independent of the live histogram
+    assert earlier.count == 2
+
+
+def test_simulator_report_covers_the_interval_since_the_last_one(tmp_path, capsys):
+    metrics = SimulatorMetrics(str(tmp_path / "metrics.jsonl"))
+    fast, slow = metrics.worker("fast"), metrics.worker("slow")
+    for _ in range(9):
+        fast.success(0.001)
+    slow.success(0.1)
+    slow.error(2)
+
+    first = metrics.report()
+    assert first["readings"] == 10
+    assert first["errors"] == 2
+    assert first["error_rate"] == pytest.approx(2 / 12, abs=1e-4)
+    assert first["p50_ms"] == pytest.approx(1.0, rel=1 / SUB_BUCKETS)
+    assert first["max_ms"] == pytest.approx(100.0)
+
+    fast.success(0.002, readings=5)
+    second = metrics.report(extra={"queue_batches": 3})
+    assert second["readings"] == 5
+    assert second["errors"] == 0
+    assert second["max_ms"] == pytest.approx(2.0, rel=1 / SUB_BUCKETS)
+    assert second["total_readings"] == 15
+    assert second["queue_batches"] == 3
+    capsys.readouterr()
+
+    with open(tmp_path / "metrics.jsonl") as f:
+        exported = [json.loads(line) for line in f]
+    assert [r["readings"] for r in exported] == [10, 5]